@@ -0,0 +1,193 @@
+import os
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, func, insert, literal, or_, select, update
+
+from metrics import ALERTS_ARCHIVED, ALERTS_RESOLVED
+from models import AlertArchive, AlertData, SolarInstallation, TelemetryData
+
+# An open alert resolves itself once its condition has not fired for this long
+# while the installation kept reporting
+AUTO_RESOLVE_MINUTES = int(os.getenv('ALERT_AUTO_RESOLVE_MINUTES', '120'))
+
+# Anomaly alerts repeat at most once per detector cooldown (~1 day), so their
+# silence only means the condition cleared after longer than that
+AUTO_RESOLVE_DEFAULTS = {
+    'INVERTER_DRIFT': 26 * 60,
+    'PERFORMANCE_ANOMALY': 26 * 60,
+    'PERFORMANCE_DEGRADATION': 26 * 60
+}
+
+# Resolved alerts older than this move to alert_archive
+ARCHIVE_AFTER_DAYS = int(os.getenv('ALERT_ARCHIVE_DAYS', '30'))
+
+# Alerts moved per archival transaction
+ARCHIVE_CHUNK_ROWS = 5000
+
+# Installations / (installation, type) groups per IN or OR clause
+GROUP_CHUNK_SIZE = 500
+
+# Filters accepted by the bulk acknowledge / resolve endpoints
+FILTERS = ('ids', 'installation_id', 'alert_type', 'severity', 'before')
+
+_COLUMNS = ['id', 'installation_id', 'telemetry_id', 'timestamp', 'created_at', 'alert_type', 'severity', 'message',
+            'resolved', 'acknowledged_at', 'resolved_at', 'resolution']
+
+
+def auto_resolve_periods():
+    """Minutes of silence before auto-resolution, per alert type.
+
+    ``ALERT_AUTO_RESOLVE_OVERRIDES`` adds or replaces entries, e.g.
+    ``DUST_ACCUMULATION=1440,LOW_POWER=60``.
+    """
+    periods = dict(AUTO_RESOLVE_DEFAULTS)
+    for item in os.getenv('ALERT_AUTO_RESOLVE_OVERRIDES', '').split(','):
+        if '=' in item:
+            alert_type, minutes = item.split('=', 1)
+            periods[alert_type.strip()] = int(minutes)
+    return periods
+
+
+def serialize(alert):
+    return {
+        'id': alert.id,
+        'installation_id': alert.installation_id,
+        'timestamp': alert.timestamp.isoformat() if alert.timestamp else None,
+        'alert_type': alert.alert_type,
+        'severity': alert.severity,
+        'message': alert.message,
+        'acknowledged_at': alert.acknowledged_at.isoformat() if alert.acknowledged_at else None,
+        'resolved': bool(alert.resolved),
+        'resolved_at': alert.resolved_at.isoformat() if alert.resolved_at else None,
+        'resolution': alert.resolution
+    }
+
+
+def parse_filters(data, tenant_id=None):
+    """SQL conditions on AlertData from a bulk request body.
+
+    Accepts ``ids`` (list), ``installation_id``, ``alert_type``,
+    ``severity`` and ``before`` (ISO 8601); at least one is required so a
+    bare request cannot touch the whole fleet. With ``tenant_id`` only that
+    tenant's installations match. Raises ValueError.
+    """
+    if not isinstance(data, dict):
+        raise ValueError('expected a JSON object of filters')
+    unknown = sorted(set(data) - set(FILTERS))
+    if unknown:
+        raise ValueError(f"unknown filters: {', '.join(unknown)} (use {', '.join(FILTERS)})")
+    conditions = []
+    if data.get('ids') is not None:
+        ids = data['ids']
+        if not isinstance(ids, list) or not all(isinstance(i, int) and not isinstance(i, bool) for i in ids):
+            raise ValueError('ids must be a list of integers')
+        conditions.append(AlertData.id.in_(ids))
+    for name in ('installation_id', 'alert_type', 'severity'):
+        if data.get(name) is not None:
+            conditions.append(getattr(AlertData, name) == str(data[name]))
+    if data.get('before') is not None:
+        try:
+            conditions.append(AlertData.timestamp < datetime.fromisoformat(str(data['before'])))
+        except ValueError:
+            raise ValueError('before must be an ISO 8601 timestamp')
+    if not conditions:
+        raise ValueError(f"at least one filter is required ({', '.join(FILTERS)})")
+    if tenant_id is not None:
+        conditions.append(AlertData.installation_id.in_(
+            select(SolarInstallation.id).where(SolarInstallation.tenant_id == tenant_id)))
+    return conditions
+
+
+def acknowledge(session, conditions, now=None):
+    """Acknowledge the open, unacknowledged alerts matching ``conditions``; returns the count"""
+    result = session.execute(
+        update(AlertData).where(*conditions, AlertData.resolved.is_(False), AlertData.acknowledged_at.is_(None))
+        .values(acknowledged_at=now or datetime.utcnow()).execution_options(synchronize_session=False))
+    session.commit()
+    return result.rowcount
+
+
+def resolve(session, conditions, resolution='manual', now=None):
+    """Resolve the open alerts matching ``conditions``; returns the count"""
+    result = session.execute(
+        update(AlertData).where(*conditions, AlertData.resolved.is_(False))
+        .values(resolved=True, resolved_at=now or datetime.utcnow(), resolution=resolution)
+        .execution_options(synchronize_session=False))
+    session.commit()
+    if result.rowcount:
+        ALERTS_RESOLVED.inc(result.rowcount, resolution=resolution)
+    return result.rowcount
+
+
+def auto_resolve(session, now=None):
+    """Resolve open alerts whose condition has cleared.
+
+    An installation's open alerts of one type are resolved together once
+    the newest of them is older than the type's period and a reading
+    arrived at least one period after it, so a site that simply stopped
+    reporting keeps its alerts. Two grouped queries over the open-alert
+    index and the telemetry (installation, timestamp) index decide it.
+    Returns the number of alerts resolved.
+    """
+    now = now or datetime.utcnow()
+    periods = auto_resolve_periods()
+    open_groups = session.execute(
+        select(AlertData.installation_id, AlertData.alert_type, func.max(AlertData.timestamp))
+        .where(AlertData.resolved.is_(False))
+        .group_by(AlertData.installation_id, AlertData.alert_type)
+    ).all()
+    candidates = []
+    for installation_id, alert_type, last in open_groups:
+        clear_after = last + timedelta(minutes=periods.get(alert_type, AUTO_RESOLVE_MINUTES)) if last else None
+        if clear_after is not None and clear_after <= now:
+            candidates.append((installation_id, alert_type, last, clear_after))
+    if not candidates:
+        return 0
+
+    installation_ids = sorted({candidate[0] for candidate in candidates})
+    latest = {}
+    for start in range(0, len(installation_ids), GROUP_CHUNK_SIZE):
+        latest.update(session.execute(
+            select(TelemetryData.installation_id, func.max(TelemetryData.timestamp))
+            .where(TelemetryData.installation_id.in_(installation_ids[start:start + GROUP_CHUNK_SIZE]))
+            .group_by(TelemetryData.installation_id)
+        ).all())
+
+    cleared = [(installation_id, alert_type, last) for installation_id, alert_type, last, clear_after in candidates
+               if latest.get(installation_id) is not None and latest[installation_id] >= clear_after]
+    total = 0
+    for start in range(0, len(cleared), GROUP_CHUNK_SIZE):
+        # Bounded by the newest alert seen, so one raised meanwhile stays open
+        groups = [and_(AlertData.installation_id == installation_id, AlertData.alert_type == alert_type,
+                       AlertData.timestamp <= last)
+                  for installation_id, alert_type, last in cleared[start:start + GROUP_CHUNK_SIZE]]
+        total += resolve(session, [or_(*groups)], 'auto', now)
+    return total
+
+
+def archive_resolved(session, older_than_days=None, now=None):
+    """Move alerts resolved more than ``older_than_days`` ago to alert_archive; returns the count.
+
+    Each chunk is copied with ``INSERT ... SELECT`` and deleted in one
+    transaction, so an interrupted run loses nothing.
+    """
+    now = now or datetime.utcnow()
+    days = ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = now - timedelta(days=days)
+    # Alerts resolved before resolved_at existed only have their own timestamp
+    due = and_(AlertData.resolved.is_(True),
+               or_(AlertData.resolved_at < cutoff, and_(AlertData.resolved_at.is_(None), AlertData.timestamp < cutoff)))
+    total = 0
+    while True:
+        ids = session.execute(select(AlertData.id).where(due).order_by(AlertData.id).limit(ARCHIVE_CHUNK_ROWS)
+                              ).scalars().all()
+        if not ids:
+            return total
+        session.execute(insert(AlertArchive).from_select(
+            _COLUMNS + ['archived_at'],
+            select(*(getattr(AlertData, name) for name in _COLUMNS), literal(now, AlertArchive.archived_at.type))
+            .where(AlertData.id.in_(ids))))
+        session.execute(delete(AlertData).where(AlertData.id.in_(ids)))
+        session.commit()
+        ALERTS_ARCHIVED.inc(len(ids))
+        total += len(ids)
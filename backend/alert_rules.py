@@ -0,0 +1,94 @@
+import os
+
+import numpy as np
+
+# Below ~10 degrees of solar elevation incidence-angle losses make the flat
+# 0.85 derating meaningless, so low-power alerts wait for a higher sun
+LOW_SUN_COS_ZENITH = 0.17
+
+# LOW_POWER compares actual output with the model's P10 ('p10'), scaled by a
+# margin, or with 70% of the irradiance-based estimate ('factor'). Without a
+# prediction interval the factor rule is used.
+LOW_POWER_ALERT_RULE = os.getenv('LOW_POWER_ALERT_RULE', 'p10')
+LOW_POWER_P10_MARGIN = float(os.getenv('LOW_POWER_P10_MARGIN', '0.9'))
+LOW_POWER_FACTOR = 0.7
+
+# Same derating as the feature store's theoretical output
+PERFORMANCE_FACTOR = 0.85
+
+HIGH_TEMPERATURE_C = 80
+DUST_ALERT_LEVEL = 0.8
+INVERTER_ALERT_EFFICIENCY = 90
+MAINTENANCE_ALERT_SCORE = 70
+
+# TelemetryData columns the rules read
+READING_COLUMNS = ['pv_power_kw', 'irradiation_wm2', 'module_temp_c', 'dust_level', 'inverter_efficiency']
+
+# Alert types produced by evaluate(); the anomaly detector adds its own
+RULE_ALERT_TYPES = ('LOW_POWER', 'HIGH_TEMPERATURE', 'DUST_ACCUMULATION', 'INVERTER_ISSUE', 'MAINTENANCE_REQUIRED')
+
+
+def maintenance_scores(dust_level, module_temp_c, efficiency, inverter_efficiency):
+    """Maintenance scores (0-100, higher means more maintenance needed) for arrays of readings"""
+    dust_level, module_temp_c, efficiency, inverter_efficiency = (
+        np.asarray(values, dtype=float) for values in (dust_level, module_temp_c, efficiency, inverter_efficiency))
+    score = np.where(dust_level > 0.7, 30, np.where(dust_level > 0.5, 15, 0))
+    score += np.where(module_temp_c > 75, 25, np.where(module_temp_c > 65, 10, 0))
+    score += np.where(efficiency < 0.8, 35, np.where(efficiency < 0.9, 15, 0))
+    score += np.where(inverter_efficiency < 90, 20, np.where(inverter_efficiency < 95, 10, 0))
+    return np.minimum(100, score)
+
+
+def evaluate(readings, predicted, cos_zenith, installation):
+    """Threshold alerts for a block of readings of one installation.
+
+    ``readings`` maps ``READING_COLUMNS`` to arrays; ``predicted``
+    maps ``p10`` / ``p50`` / ``maintenance`` to arrays (NaN where a reading
+    has no prediction) or is None. Returns ``(row index, alert dict)``
+    pairs, the dicts in the shape ``AlertSystem`` stores. Masks are
+    vectorized; messages are only formatted for rows that fire.
+    """
+    power = np.asarray(readings['pv_power_kw'], dtype=float)
+    irradiation = np.asarray(readings['irradiation_wm2'], dtype=float)
+    module_temp = np.asarray(readings['module_temp_c'], dtype=float)
+    dust = np.asarray(readings['dust_level'], dtype=float)
+    inverter = np.asarray(readings['inverter_efficiency'], dtype=float)
+    sun_up = np.asarray(cos_zenith, dtype=float) >= LOW_SUN_COS_ZENITH
+    nan = np.full(len(power), np.nan)
+    p10 = np.asarray(predicted['p10'], dtype=float) if predicted else nan
+    p50 = np.asarray(predicted['p50'], dtype=float) if predicted else nan
+    maintenance = np.asarray(predicted['maintenance'], dtype=float) if predicted else nan
+
+    alerts = []
+
+    def add(mask, alert_type, severity, message):
+        for row in np.flatnonzero(mask):
+            alerts.append((int(row), {'type': alert_type, 'severity': severity, 'message': message(int(row))}))
+
+    # Low power generation alert
+    has_interval = ~np.isnan(p10) if LOW_POWER_ALERT_RULE == 'p10' else np.zeros(len(power), dtype=bool)
+    expected = irradiation / 1000 * installation.capacity_kw * PERFORMANCE_FACTOR
+    add(sun_up & has_interval & (power < p10 * LOW_POWER_P10_MARGIN), 'LOW_POWER', 'HIGH',
+        lambda i: f'Power generation {power[i]:.2f}kW is below the predicted P10 of {p10[i]:.2f}kW '
+                  f'(P50 {p50[i]:.2f}kW)')
+    add(sun_up & ~has_interval & (power < expected * LOW_POWER_FACTOR), 'LOW_POWER', 'HIGH',
+        lambda i: f'Power generation {power[i]:.2f}kW is significantly below expected {expected[i]:.2f}kW')
+
+    # High temperature alert
+    add(module_temp > HIGH_TEMPERATURE_C, 'HIGH_TEMPERATURE', 'MEDIUM',
+        lambda i: f'Module temperature {float(module_temp[i])}°C exceeds safe operating range')
+
+    # Dust accumulation alert
+    add(dust > DUST_ALERT_LEVEL, 'DUST_ACCUMULATION', 'MEDIUM',
+        lambda i: f'High dust level detected ({dust[i]:.1%}). Panel cleaning recommended')
+
+    # Inverter efficiency alert
+    add(inverter < INVERTER_ALERT_EFFICIENCY, 'INVERTER_ISSUE', 'HIGH',
+        lambda i: f'Inverter efficiency dropped to {float(inverter[i])}%. Maintenance required')
+
+    # Maintenance alert based on ML prediction
+    add(maintenance > MAINTENANCE_ALERT_SCORE, 'MAINTENANCE_REQUIRED', 'MEDIUM',
+        lambda i: f'Maintenance score: {maintenance[i]:.0f}/100. Schedule preventive maintenance')
+
+    alerts.sort(key=lambda alert: alert[0])
+    return alerts
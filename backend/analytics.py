@@ -0,0 +1,157 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import DateTime, String, bindparam, text
+
+# Same derating used by the alert system's theoretical power formula
+PERFORMANCE_FACTOR = 0.85
+
+# Readings below this irradiation are treated as night / no-sun samples
+DAYLIGHT_IRRADIATION_WM2 = 50
+
+# One grouped pass over telemetry (and predictions) for the whole fleet.
+# Installations without readings in the window still get a row via LEFT JOIN;
+# :tenant limits it to one tenant's installations (NULL for the whole fleet).
+FLEET_AGGREGATE_SQL = text("""
+    SELECT
+        i.id AS installation_id,
+        i.name AS name,
+        i.climatic_zone AS climatic_zone,
+        i.capacity_kw AS capacity_kw,
+        COUNT(t.id) AS reading_count,
+        AVG(t.pv_power_kw) AS avg_power_kw,
+        MAX(t.pv_power_kw) AS peak_power_kw,
+        SUM(t.pv_power_kw) AS sum_power_kw,
+        SUM(t.irradiation_wm2) AS sum_irradiation_wm2,
+        SUM(CASE WHEN t.irradiation_wm2 > :daylight THEN 1 ELSE 0 END) AS daylight_count,
+        SUM(CASE WHEN t.irradiation_wm2 > :daylight AND t.pv_power_kw > 0 THEN 1 ELSE 0 END) AS producing_count,
+        MIN(t.timestamp) AS first_reading,
+        MAX(t.timestamp) AS last_reading,
+        MAX(p.avg_maintenance_score) AS avg_maintenance_score
+    FROM solar_installations i
+    LEFT JOIN telemetry_data t
+        ON t.installation_id = i.id AND t.timestamp >= :since
+    LEFT JOIN (
+        SELECT installation_id, AVG(maintenance_score) AS avg_maintenance_score
+        FROM prediction_data
+        WHERE timestamp >= :since
+        GROUP BY installation_id
+    ) p ON p.installation_id = i.id
+    WHERE :tenant IS NULL OR i.tenant_id = :tenant
+    GROUP BY i.id, i.name, i.climatic_zone, i.capacity_kw
+""").bindparams(bindparam('since', type_=DateTime), bindparam('tenant', type_=String))
+
+
+def fleet_aggregates(session, since, tenant_id=None):
+    """Run the grouped fleet query and return one row per installation as a DataFrame"""
+    result = session.execute(FLEET_AGGREGATE_SQL, {
+        'since': since,
+        'tenant': tenant_id,
+        'daylight': DAYLIGHT_IRRADIATION_WM2
+    })
+    return pd.DataFrame(result.fetchall(), columns=list(result.keys()))
+
+
+def derive_kpis(df, window_hours):
+    """Add energy, performance ratio, capacity factor and availability columns.
+
+    Every KPI is computed on whole columns; there is no per-installation loop.
+    """
+    df = df.copy()
+    numeric = ['capacity_kw', 'reading_count', 'avg_power_kw', 'peak_power_kw', 'sum_power_kw',
+               'sum_irradiation_wm2', 'daylight_count', 'producing_count', 'avg_maintenance_score']
+    df[numeric] = df[numeric].apply(pd.to_numeric, errors='coerce').astype(float)
+    df['first_reading'] = pd.to_datetime(df['first_reading'])
+    df['last_reading'] = pd.to_datetime(df['last_reading'])
+
+    count = df['reading_count'].to_numpy()
+    span_hours = ((df['last_reading'] - df['first_reading']).dt.total_seconds() / 3600).to_numpy()
+
+    # Readings are point samples of power: treat each one as covering the mean
+    # sampling interval, so n samples cover span * n / (n - 1) hours.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covered_hours = np.where(count > 1, span_hours * count / (count - 1), 0.0)
+        covered_hours = np.minimum(covered_hours, window_hours)
+        energy_kwh = np.nan_to_num(df['avg_power_kw'].to_numpy() * covered_hours)
+
+        capacity = df['capacity_kw'].to_numpy()
+        theoretical_kw = df['sum_irradiation_wm2'].to_numpy() / 1000 * capacity * PERFORMANCE_FACTOR
+        performance_ratio = np.where(theoretical_kw > 0, df['sum_power_kw'].to_numpy() / theoretical_kw, np.nan)
+        capacity_factor = np.where(capacity > 0, energy_kwh / (capacity * window_hours), np.nan)
+        daylight = df['daylight_count'].to_numpy()
+        availability = np.where(daylight > 0, df['producing_count'].to_numpy() / daylight, np.nan)
+
+    df['energy_kwh'] = energy_kwh
+    df['theoretical_sum_kw'] = theoretical_kw
+    df['performance_ratio'] = performance_ratio
+    df['capacity_factor'] = capacity_factor
+    df['availability'] = availability
+    return df
+
+
+def summarize_zones(df):
+    """Aggregate per-installation KPIs up to climatic zones"""
+    zones = df.groupby('climatic_zone', sort=True).agg(
+        installation_count=('installation_id', 'size'),
+        capacity_kw=('capacity_kw', 'sum'),
+        energy_kwh=('energy_kwh', 'sum'),
+        sum_power_kw=('sum_power_kw', 'sum'),
+        theoretical_sum_kw=('theoretical_sum_kw', 'sum'),
+        daylight_count=('daylight_count', 'sum'),
+        producing_count=('producing_count', 'sum'),
+    ).reset_index()
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zones['performance_ratio'] = np.where(
+            zones['theoretical_sum_kw'] > 0, zones['sum_power_kw'] / zones['theoretical_sum_kw'], np.nan)
+        zones['availability'] = np.where(
+            zones['daylight_count'] > 0, zones['producing_count'] / zones['daylight_count'], np.nan)
+
+    return zones[['climatic_zone', 'installation_count', 'capacity_kw', 'energy_kwh',
+                  'performance_ratio', 'availability']]
+
+
+def _records(df):
+    """Convert a DataFrame to JSON-safe records (NaN/NaT become None)"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def compute_fleet_analytics(session, hours=24, top_n=10, now=None, tenant_id=None):
+    """Compute fleet KPIs for the last ``hours`` hours (of one tenant's installations with ``tenant_id``)"""
+    now = now or datetime.utcnow()
+    since = now - timedelta(hours=hours)
+
+    df = derive_kpis(fleet_aggregates(session, since, tenant_id), hours)
+
+    installation_columns = ['installation_id', 'name', 'climatic_zone', 'capacity_kw', 'reading_count',
+                            'avg_power_kw', 'peak_power_kw', 'energy_kwh', 'performance_ratio',
+                            'capacity_factor', 'availability', 'avg_maintenance_score', 'last_reading']
+    installations = df[installation_columns].copy()
+    installations['reading_count'] = installations['reading_count'].astype(int)
+    installations['last_reading'] = installations['last_reading'].map(
+        lambda ts: ts.isoformat() if pd.notna(ts) else None)
+
+    underperformers = installations[installations['performance_ratio'].notna()].nsmallest(
+        top_n, 'performance_ratio')
+
+    total_capacity = float(df['capacity_kw'].sum())
+    total_theoretical = float(df['theoretical_sum_kw'].sum())
+    total_daylight = float(df['daylight_count'].sum())
+
+    return {
+        'window_hours': hours,
+        'generated_at': now.isoformat(),
+        'fleet': {
+            'installation_count': int(len(df)),
+            'reporting_count': int((df['reading_count'] > 0).sum()),
+            'capacity_kw': total_capacity,
+            'energy_kwh': float(df['energy_kwh'].sum()),
+            'performance_ratio': float(df['sum_power_kw'].sum()) / total_theoretical if total_theoretical > 0 else None,
+            'capacity_factor': float(df['energy_kwh'].sum()) / (total_capacity * hours) if total_capacity > 0 else None,
+            'availability': float(df['producing_count'].sum()) / total_daylight if total_daylight > 0 else None
+        },
+        'installations': _records(installations),
+        'zones': _records(summarize_zones(df)),
+        'underperformers': _records(underperformers)
+    }
@@ -0,0 +1,309 @@
+import json
+import logging
+import math
+import threading
+from datetime import datetime
+
+from sqlalchemy import select, update
+
+from models import AnomalyState
+from solar_geometry import apparent_solar_hour
+
+logger = logging.getLogger(__name__)
+
+# Same derating as the alert system's expected-power formula
+PERFORMANCE_FACTOR = 0.85
+
+# Readings below this irradiation say nothing about panel performance
+DAYLIGHT_IRRADIATION_WM2 = 50
+
+HOURS = 24
+
+
+class SlowBaseline:
+    """Long-memory estimate of a signal's normal level.
+
+    A plain average over the first ``warmup`` samples, then an EWMA with a
+    small weight so the baseline follows seasons but not faults.
+    """
+
+    __slots__ = ('value', 'count')
+
+    def __init__(self):
+        self.value = 0.0
+        self.count = 0
+
+    def to_list(self):
+        return [self.value, self.count]
+
+    @classmethod
+    def from_list(cls, values):
+        baseline = cls()
+        baseline.value, baseline.count = values
+        return baseline
+
+    def update(self, value, alpha, warmup):
+        weight = 1 / (self.count + 1) if self.count < warmup else alpha
+        self.value += weight * (value - self.value)
+        self.count += 1
+
+
+class ResidualMonitor:
+    """EWMA / EW variance of a residual plus a one-sided (downward) CUSUM.
+
+    Residuals are deviations from a baseline, so zero means normal. ``update``
+    returns the residual in standard deviations. The CUSUM accumulates
+    residuals below ``-slack`` standard deviations: a small persistent drop
+    adds up over time while noise around zero does not. Nothing is scored
+    until ``warmup`` residuals have settled the variance estimate.
+    """
+
+    __slots__ = ('alpha', 'slack', 'warmup', 'mean', 'var', 'count', 'cusum')
+
+    def __init__(self, alpha, slack, warmup):
+        self.alpha = alpha
+        self.slack = slack
+        self.warmup = warmup
+        self.mean = 0.0
+        self.var = 0.0
+        self.count = 0
+        self.cusum = 0.0
+
+    def to_list(self):
+        """The running statistics; alpha, slack and warmup come from the detector config"""
+        return [self.mean, self.var, self.count, self.cusum]
+
+    @classmethod
+    def from_list(cls, values, alpha, slack, warmup):
+        monitor = cls(alpha, slack, warmup)
+        monitor.mean, monitor.var, monitor.count, monitor.cusum = values
+        return monitor
+
+    @property
+    def ready(self):
+        return self.count >= self.warmup
+
+    def update(self, residual, track=True):
+        z = 0.0
+        std = math.sqrt(self.var)
+        if self.ready and std > 1e-9:
+            z = residual / std
+            self.cusum = max(0.0, self.cusum - z - self.slack)
+        if track or not self.ready:
+            delta = residual - self.mean
+            self.mean += self.alpha * delta
+            self.var = (1 - self.alpha) * (self.var + self.alpha * delta * delta)
+            self.count += 1
+        return z
+
+
+class InstallationDetector:
+    """Constant-size anomaly state for one installation.
+
+    Performance ratio (actual / expected power) is compared against one
+    baseline per hour of solar time, so morning shading or evening losses
+    are not mistaken for faults. Inverter efficiency has a single baseline.
+    Each residual feeds its own ``ResidualMonitor``.
+    """
+
+    __slots__ = ('hour_baselines', 'performance', 'inverter_baseline', 'inverter', 'cooldown', 'last_timestamp')
+
+    def __init__(self, config):
+        self.hour_baselines = [SlowBaseline() for _ in range(HOURS)]
+        self.performance = ResidualMonitor(config['alpha'], config['cusum_slack'], config['monitor_warmup'])
+        self.inverter_baseline = SlowBaseline()
+        self.inverter = ResidualMonitor(config['alpha'], config['cusum_slack'], config['monitor_warmup'])
+        self.cooldown = {}
+        self.last_timestamp = None
+
+    def to_bytes(self):
+        """JSON encoding of the state, as stored in ``anomaly_states`` and reprocess checkpoints"""
+        return json.dumps({
+            'hour_baselines': [baseline.to_list() for baseline in self.hour_baselines],
+            'performance': self.performance.to_list(),
+            'inverter_baseline': self.inverter_baseline.to_list(),
+            'inverter': self.inverter.to_list(),
+            'cooldown': self.cooldown,
+            'last_timestamp': self.last_timestamp.isoformat() if self.last_timestamp else None
+        }).encode()
+
+    @classmethod
+    def from_bytes(cls, data, config):
+        """Decode ``to_bytes`` output; None for anything else (states pickled by older versions)"""
+        try:
+            state = json.loads(data)
+        except ValueError:
+            return None
+        monitor_config = (config['alpha'], config['cusum_slack'], config['monitor_warmup'])
+        detector = cls.__new__(cls)
+        detector.hour_baselines = [SlowBaseline.from_list(values) for values in state['hour_baselines']]
+        detector.performance = ResidualMonitor.from_list(state['performance'], *monitor_config)
+        detector.inverter_baseline = SlowBaseline.from_list(state['inverter_baseline'])
+        detector.inverter = ResidualMonitor.from_list(state['inverter'], *monitor_config)
+        detector.cooldown = state['cooldown']
+        detector.last_timestamp = (datetime.fromisoformat(state['last_timestamp'])
+                                   if state['last_timestamp'] else None)
+        return detector
+
+
+class AnomalyDetector:
+    """Online per-installation anomaly detection with O(1) work and memory per reading.
+
+    Each reading updates running statistics and, when one crosses a
+    threshold, returns alert dicts in the shape ``AlertSystem`` stores.
+    ``update`` keeps the state in this process (the reprocessing job's
+    private replay); live ingest uses ``update_stored``, which keeps it in
+    ``anomaly_states`` so every WSGI worker sees all of an installation's
+    readings, whichever worker received them.
+    """
+
+    DEFAULTS = {
+        'alpha': 0.02,             # EWMA weight of the residual mean / variance
+        'baseline_alpha': 0.005,   # weight of the slow baselines (~50 days per hour bucket at 15 min)
+        'baseline_warmup': 24,     # samples averaged before a baseline is used (6 days per hour bucket)
+        'monitor_warmup': 48,      # residuals before a monitor's variance is trusted
+        'spike_z': 5.0,            # sudden drop threshold, in standard deviations
+        'cusum_slack': 0.5,        # CUSUM allowance k, in standard deviations
+        'cusum_threshold': 12.0,   # CUSUM decision interval h
+        'cooldown_readings': 96    # readings between repeats of the same alert (~1 day at 15 min)
+    }
+
+    def __init__(self, **config):
+        self.config = dict(self.DEFAULTS, **config)
+        self._detectors = {}
+        self._lock = threading.Lock()
+
+    def reset(self, installation_id=None):
+        with self._lock:
+            if installation_id is None:
+                self._detectors.clear()
+            else:
+                self._detectors.pop(installation_id, None)
+
+    def state(self, installation_id):
+        """The installation's detector state (``InstallationDetector.to_bytes`` serializes it), or None"""
+        with self._lock:
+            return self._detectors.get(installation_id)
+
+    def restore(self, installation_id, state):
+        with self._lock:
+            self._detectors[installation_id] = state
+
+    @staticmethod
+    def solar_hour(timestamp, longitude):
+        """Hour of day in apparent solar time (timestamps are UTC), so buckets follow the
+        sun through the equation of time instead of drifting by up to 16 minutes"""
+        return int(apparent_solar_hour(timestamp, longitude)) % HOURS
+
+    def _alert(self, detector, alert_type, severity, message):
+        if detector.cooldown.get(alert_type, 0) > 0:
+            return None
+        detector.cooldown[alert_type] = self.config['cooldown_readings']
+        return {'type': alert_type, 'severity': severity, 'message': message}
+
+    def _observe(self, baseline, monitor, value, warmup):
+        """Score ``value`` against ``baseline``; the baseline is frozen while a drift builds up"""
+        cfg = self.config
+        if baseline.count < warmup:
+            baseline.update(value, cfg['baseline_alpha'], warmup)
+            return 0.0
+        drifting = monitor.cusum > cfg['cusum_threshold'] / 2
+        z = monitor.update(value - baseline.value, track=not drifting)
+        if not drifting and z > -cfg['spike_z']:
+            baseline.update(value, cfg['baseline_alpha'], warmup)
+        return z
+
+    def update(self, installation, telemetry):
+        """Fold one reading into the installation's state and return any new alerts.
+
+        ``installation`` needs ``id``, ``capacity_kw`` and ``longitude``;
+        ``telemetry`` the TelemetryData fields. Readings older than the last
+        one seen are ignored: the running statistics assume time order, and
+        late data is scored by ``flask reprocess`` instead.
+        """
+        with self._lock:
+            detector = self._detectors.get(installation.id)
+            if detector is None:
+                detector = self._detectors[installation.id] = InstallationDetector(self.config)
+            return self._fold(detector, installation, telemetry)
+
+    def update_stored(self, session, installation, telemetry):
+        """``update`` against the installation's state row in ``anomaly_states``.
+
+        The row is locked (``SELECT ... FOR UPDATE``; SQLite serializes
+        writers anyway) until the caller commits, so readings of one
+        installation handled by different workers are folded in one at a
+        time. The state write joins the caller's transaction.
+        """
+        self._ensure_state_row(session, installation.id)
+        state = session.execute(select(AnomalyState.state).where(
+            AnomalyState.installation_id == installation.id).with_for_update()).scalar()
+        detector = InstallationDetector.from_bytes(state, self.config) if state else None
+        if detector is None:
+            if state:
+                logger.warning(f"Discarding unreadable anomaly state of {installation.id}; it warms up again")
+            detector = InstallationDetector(self.config)
+        alerts = self._fold(detector, installation, telemetry)
+        session.execute(update(AnomalyState).where(AnomalyState.installation_id == installation.id).values(
+            state=detector.to_bytes(), updated_at=datetime.utcnow()))
+        return alerts
+
+    @staticmethod
+    def _ensure_state_row(session, installation_id):
+        """Create the installation's (empty) state row unless a worker already has"""
+        dialect = session.get_bind().dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            session.execute(insert(AnomalyState.__table__).values(installation_id=installation_id)
+                            .on_conflict_do_nothing(index_elements=['installation_id']))
+        elif session.get(AnomalyState, installation_id) is None:
+            session.add(AnomalyState(installation_id=installation_id))
+            session.flush()
+
+    def _fold(self, detector, installation, telemetry):
+        cfg = self.config
+        alerts = []
+        last = detector.last_timestamp
+        if telemetry.timestamp is not None:
+            if last is not None and telemetry.timestamp < last:
+                return []
+            detector.last_timestamp = telemetry.timestamp
+        for alert_type in detector.cooldown:
+            detector.cooldown[alert_type] -= 1
+
+        if telemetry.inverter_efficiency is not None:
+            self._observe(detector.inverter_baseline, detector.inverter,
+                          telemetry.inverter_efficiency, cfg['baseline_warmup'])
+            if detector.inverter.cusum > cfg['cusum_threshold']:
+                alerts.append(self._alert(
+                    detector, 'INVERTER_DRIFT', 'MEDIUM',
+                    f'Inverter efficiency is drifting down ({telemetry.inverter_efficiency:.1f}% vs '
+                    f'typical {detector.inverter_baseline.value:.1f}%). Inspect the inverter'))
+                detector.inverter.cusum = 0.0
+
+        irradiation = telemetry.irradiation_wm2 or 0.0
+        expected = irradiation / 1000 * installation.capacity_kw * PERFORMANCE_FACTOR
+        if irradiation >= DAYLIGHT_IRRADIATION_WM2 and expected > 0:
+            ratio = telemetry.pv_power_kw / expected
+            baseline = detector.hour_baselines[self.solar_hour(telemetry.timestamp, installation.longitude)]
+            z = self._observe(baseline, detector.performance, ratio, cfg['baseline_warmup'])
+
+            if z < -cfg['spike_z']:
+                alerts.append(self._alert(
+                    detector, 'PERFORMANCE_ANOMALY', 'HIGH',
+                    f'Performance ratio {ratio:.2f} is {abs(z):.1f} standard deviations below the '
+                    f'usual {baseline.value:.2f} for this time of day'))
+            if detector.performance.cusum > cfg['cusum_threshold']:
+                alerts.append(self._alert(
+                    detector, 'PERFORMANCE_DEGRADATION', 'MEDIUM',
+                    f'Output has been falling below its time-of-day baseline (current ratio '
+                    f'{ratio:.2f} vs {baseline.value:.2f}). Check for soiling or string faults'))
+                detector.performance.cusum = 0.0
+
+        return [alert for alert in alerts if alert]
+
+
+anomaly_detector = AnomalyDetector()
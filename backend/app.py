@@ -1,328 +1,89 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Blueprint, current_app, request, jsonify, Response
 from flask_cors import CORS
-from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime, timedelta
 import os
+import time
 from dotenv import load_dotenv
-import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import StandardScaler
-import requests
-import openai
 import json
-from apscheduler.schedulers.background import BackgroundScheduler
 import logging
+from sqlalchemy import func, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import Engine
+from metrics import (REGISTRY, FUNCTION_SECONDS, SCHEDULER_JOB_SECONDS, TELEMETRY_ROWS_INGESTED,
+                     ALERTS_GENERATED, MODEL_CACHE_REQUESTS, MODEL_TRAINING_RUNS, RATE_LIMITED, timed, instrument_app,
+                     instrument_engine)
+from profiling import RequestProfiler
+from db_config import configure_engine, engine_options
+# Heavy dependencies (scikit-learn, openai, requests, pandas, apscheduler) are
+# imported by these subsystems on first use, not at startup
+from models import db, SolarInstallation, TelemetryData, PredictionData, AlertData, SoilingEstimate
+from ml import ModelCache
+from registry import haversine_km, installation_registry
+from tenancy import can_access, request_tenant, tenant_of
+from ratelimit import rate_limiter, retry_after_header
+from anomaly import anomaly_detector
+import alert_rules
+import alert_lifecycle
+from solar_geometry import solar_tables
+from feature_store import feature_store
+from bulk_load import (LOOKUP_CHUNK_ROWS, MEASUREMENT_COLUMNS, TELEMETRY_COLUMNS, column_count, deduplicate_telemetry,
+                       load_telemetry, read_csv_readings, rows_to_columns, take_columns, telemetry_row, telemetry_rows,
+                       upsert_telemetry)
+import wire
+from installations import (DEFAULT_CLIMATIC_ZONE, MAX_PAGE_SIZE, bulk_upsert, filtered_query, load_file,
+                           page_args, parse_records, serialize, validate_installation)
+from weather import WeatherService
+from reports import generate_ai_report
 
 load_dotenv()
 
-app = Flask(__name__)
-CORS(app)
-
-# Database Configuration (using SQLite for quick demo)
-app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///solar_energy.db')
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
-
-db = SQLAlchemy(app)
-
-# OpenAI Configuration
-openai.api_key = os.getenv('OPENAI_API_KEY', 'demo-key-for-testing')
-
-# Weather API Configuration
-WEATHER_API_KEY = os.getenv('WEATHER_API_KEY')
-WEATHER_BASE_URL = "http://api.openweathermap.org/data/2.5"
+api = Blueprint('api', __name__)
 
 # Logging Configuration
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Database Models
-class SolarInstallation(db.Model):
-    __tablename__ = 'solar_installations'
-    
-    id = db.Column(db.String(50), primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
-    location = db.Column(db.String(100), nullable=False)
-    latitude = db.Column(db.Float, nullable=False)
-    longitude = db.Column(db.Float, nullable=False)
-    capacity_kw = db.Column(db.Float, nullable=False)
-    panel_count = db.Column(db.Integer, nullable=False)
-    installation_date = db.Column(db.DateTime, default=datetime.utcnow)
-    climatic_zone = db.Column(db.String(50), nullable=False)
-    
-class TelemetryData(db.Model):
-    __tablename__ = 'telemetry_data'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    installation_id = db.Column(db.String(50), db.ForeignKey('solar_installations.id'), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    pv_power_kw = db.Column(db.Float, nullable=False)
-    irradiation_wm2 = db.Column(db.Float, nullable=False)
-    module_temp_c = db.Column(db.Float, nullable=False)
-    ambient_temp_c = db.Column(db.Float, nullable=False)
-    wind_speed_ms = db.Column(db.Float, default=0)
-    humidity_percent = db.Column(db.Float, default=0)
-    dust_level = db.Column(db.Float, default=0)
-    inverter_efficiency = db.Column(db.Float, default=95.0)
-
-class PredictionData(db.Model):
-    __tablename__ = 'prediction_data'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    installation_id = db.Column(db.String(50), db.ForeignKey('solar_installations.id'), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    predicted_power_kw = db.Column(db.Float, nullable=False)
-    actual_power_kw = db.Column(db.Float)
-    efficiency_score = db.Column(db.Float, nullable=False)
-    maintenance_score = db.Column(db.Float, nullable=False)
-
-class AlertData(db.Model):
-    __tablename__ = 'alert_data'
-    
-    id = db.Column(db.Integer, primary_key=True)
-    installation_id = db.Column(db.String(50), db.ForeignKey('solar_installations.id'), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    alert_type = db.Column(db.String(50), nullable=False)
-    severity = db.Column(db.String(20), nullable=False)
-    message = db.Column(db.Text, nullable=False)
-    resolved = db.Column(db.Boolean, default=False)
-
-# ML Model Class
-class SolarPredictionModel:
-    def __init__(self):
-        self.power_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        self.efficiency_model = RandomForestRegressor(n_estimators=100, random_state=42)
-        self.scaler = StandardScaler()
-        self.is_trained = False
-    
-    def prepare_features(self, data):
-        """Prepare features for ML model"""
-        features = []
-        for row in data:
-            feature_row = [
-                row.irradiation_wm2,
-                row.module_temp_c,
-                row.ambient_temp_c,
-                row.wind_speed_ms,
-                row.humidity_percent,
-                row.dust_level,
-                row.inverter_efficiency,
-                row.timestamp.hour,
-                row.timestamp.month,
-                row.timestamp.weekday()
-            ]
-            features.append(feature_row)
-        return np.array(features)
-    
-    def train_model(self, installation_id):
-        """Train ML model with historical data"""
-        try:
-            # Get historical data
-            historical_data = TelemetryData.query.filter_by(
-                installation_id=installation_id
-            ).order_by(TelemetryData.timestamp.desc()).limit(1000).all()
-            
-            if len(historical_data) < 50:
-                logger.warning(f"Insufficient data for training: {len(historical_data)} records")
-                return False
-            
-            # Prepare features and targets
-            X = self.prepare_features(historical_data)
-            y_power = [row.pv_power_kw for row in historical_data]
-            
-            # Calculate efficiency scores
-            installation = SolarInstallation.query.get(installation_id)
-            theoretical_power = []
-            for row in historical_data:
-                # Simplified theoretical power calculation
-                theoretical = (row.irradiation_wm2 / 1000) * installation.capacity_kw * 0.85
-                theoretical_power.append(theoretical)
-            
-            y_efficiency = [actual/theoretical if theoretical > 0 else 0 
-                          for actual, theoretical in zip(y_power, theoretical_power)]
-            
-            # Scale features
-            X_scaled = self.scaler.fit_transform(X)
-            
-            # Train models
-            self.power_model.fit(X_scaled, y_power)
-            self.efficiency_model.fit(X_scaled, y_efficiency)
-            
-            self.is_trained = True
-            logger.info(f"Model trained successfully for installation {installation_id}")
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error training model: {str(e)}")
-            return False
-    
-    def predict(self, telemetry_data):
-        """Make predictions based on current telemetry"""
-        if not self.is_trained:
-            return None
-        
-        try:
-            X = self.prepare_features([telemetry_data])
-            X_scaled = self.scaler.transform(X)
-            
-            predicted_power = self.power_model.predict(X_scaled)[0]
-            predicted_efficiency = self.efficiency_model.predict(X_scaled)[0]
-            
-            # Calculate maintenance score based on efficiency and environmental factors
-            maintenance_score = self.calculate_maintenance_score(telemetry_data, predicted_efficiency)
-            
-            return {
-                'predicted_power_kw': max(0, predicted_power),
-                'efficiency_score': max(0, min(1, predicted_efficiency)),
-                'maintenance_score': maintenance_score
-            }
-            
-        except Exception as e:
-            logger.error(f"Error making prediction: {str(e)}")
-            return None
-    
-    def calculate_maintenance_score(self, telemetry, efficiency):
-        """Calculate maintenance score (0-100, higher means more maintenance needed)"""
-        score = 0
-        
-        # Dust accumulation factor
-        if telemetry.dust_level > 0.7:
-            score += 30
-        elif telemetry.dust_level > 0.5:
-            score += 15
-        
-        # Temperature stress factor
-        if telemetry.module_temp_c > 75:
-            score += 25
-        elif telemetry.module_temp_c > 65:
-            score += 10
-        
-        # Efficiency degradation factor
-        if efficiency < 0.8:
-            score += 35
-        elif efficiency < 0.9:
-            score += 15
-        
-        # Inverter efficiency factor
-        if telemetry.inverter_efficiency < 90:
-            score += 20
-        elif telemetry.inverter_efficiency < 95:
-            score += 10
-        
-        return min(100, score)
-
-# Initialize ML model
-ml_model = SolarPredictionModel()
-
-# Weather Service
-class WeatherService:
-    @staticmethod
-    def get_weather_data(lat, lon):
-        """Get current weather data from OpenWeatherMap"""
-        try:
-            url = f"{WEATHER_BASE_URL}/weather"
-            params = {
-                'lat': lat,
-                'lon': lon,
-                'appid': WEATHER_API_KEY,
-                'units': 'metric'
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            data = response.json()
-            
-            return {
-                'temperature': data['main']['temp'],
-                'humidity': data['main']['humidity'],
-                'wind_speed': data['wind']['speed'],
-                'irradiation': data.get('uvi', 5) * 100,  # Simplified irradiation calculation
-                'weather_condition': data['weather'][0]['main']
-            }
-            
-        except Exception as e:
-            logger.error(f"Error fetching weather data: {str(e)}")
-            return None
-    
-    @staticmethod
-    def get_forecast_data(lat, lon, days=5):
-        """Get weather forecast data"""
-        try:
-            url = f"{WEATHER_BASE_URL}/forecast"
-            params = {
-                'lat': lat,
-                'lon': lon,
-                'appid': WEATHER_API_KEY,
-                'units': 'metric',
-                'cnt': days * 8  # 8 forecasts per day (3-hour intervals)
-            }
-            
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            
-            return response.json()
-            
-        except Exception as e:
-            logger.error(f"Error fetching forecast data: {str(e)}")
-            return None
+# Trained models, one per installation
+model_cache = ModelCache()
 
 # Alert System
 class AlertSystem:
     @staticmethod
+    @timed(FUNCTION_SECONDS, function='check_performance_alerts')
     def check_performance_alerts(installation_id, telemetry, prediction):
         """Check for performance-related alerts"""
         alerts = []
         
         try:
-            installation = SolarInstallation.query.get(installation_id)
-            
-            # Low power generation alert
-            expected_power = (telemetry.irradiation_wm2 / 1000) * installation.capacity_kw * 0.85
-            if telemetry.pv_power_kw < expected_power * 0.7:
-                alerts.append({
-                    'type': 'LOW_POWER',
-                    'severity': 'HIGH',
-                    'message': f'Power generation {telemetry.pv_power_kw:.2f}kW is significantly below expected {expected_power:.2f}kW'
-                })
+            installation = installation_registry.get(installation_id)
             
-            # High temperature alert
-            if telemetry.module_temp_c > 80:
-                alerts.append({
-                    'type': 'HIGH_TEMPERATURE',
-                    'severity': 'MEDIUM',
-                    'message': f'Module temperature {telemetry.module_temp_c}°C exceeds safe operating range'
-                })
+            # Threshold rules (shared with the reprocessing job, see alert_rules.py)
+            cos_zenith, _ = solar_tables.at(installation.latitude, installation.longitude,
+                                            telemetry.timestamp or datetime.utcnow())
+            readings = {name: [getattr(telemetry, name)] for name in alert_rules.READING_COLUMNS}
+            predicted = {
+                'p10': [prediction.get('predicted_power_p10_kw', np.nan)],
+                'p50': [prediction['predicted_power_kw']],
+                'maintenance': [prediction['maintenance_score']]
+            } if prediction else None
+            alerts.extend(alert for _, alert in alert_rules.evaluate(readings, predicted, [cos_zenith], installation))
             
-            # Dust accumulation alert
-            if telemetry.dust_level > 0.8:
-                alerts.append({
-                    'type': 'DUST_ACCUMULATION',
-                    'severity': 'MEDIUM',
-                    'message': f'High dust level detected ({telemetry.dust_level:.1%}). Panel cleaning recommended'
-                })
-            
-            # Inverter efficiency alert
-            if telemetry.inverter_efficiency < 90:
-                alerts.append({
-                    'type': 'INVERTER_ISSUE',
-                    'severity': 'HIGH',
-                    'message': f'Inverter efficiency dropped to {telemetry.inverter_efficiency}%. Maintenance required'
-                })
-            
-            # Maintenance alert based on ML prediction
-            if prediction and prediction['maintenance_score'] > 70:
-                alerts.append({
-                    'type': 'MAINTENANCE_REQUIRED',
-                    'severity': 'MEDIUM',
-                    'message': f'Maintenance score: {prediction["maintenance_score"]:.0f}/100. Schedule preventive maintenance'
-                })
+            # Online anomaly detection: EWMA / CUSUM against time-of-day baselines, with the
+            # state in the database so every worker process folds into the same statistics.
+            # A savepoint keeps a failure here from aborting the caller's prediction write.
+            try:
+                with db.session.begin_nested():
+                    alerts.extend(anomaly_detector.update_stored(db.session, installation, telemetry))
+            except Exception as e:
+                logger.error(f"Error updating anomaly state for installation {installation_id}: {str(e)}")
             
             # Save alerts to database
             for alert in alerts:
                 alert_record = AlertData(
                     installation_id=installation_id,
+                    telemetry_id=telemetry.id,
+                    timestamp=telemetry.timestamp,
                     alert_type=alert['type'],
                     severity=alert['severity'],
                     message=alert['message']
@@ -331,6 +92,8 @@ class AlertSystem:
             
             if alerts:
                 db.session.commit()
+                for alert in alerts:
+                    ALERTS_GENERATED.inc(alert_type=alert['type'], severity=alert['severity'])
                 logger.info(f"Generated {len(alerts)} alerts for installation {installation_id}")
             
             return alerts
@@ -339,82 +102,281 @@ class AlertSystem:
             logger.error(f"Error checking alerts: {str(e)}")
             return []
 
+def rate_limited(decision, endpoint):
+    """429 with Retry-After for a rejected request (413 if it can never fit in the bucket)"""
+    RATE_LIMITED.inc(endpoint=endpoint, scope=decision.scope)
+    if decision.retry_after is None:
+        return jsonify({'error': f'Request exceeds the {decision.scope} rate limit burst; split it into smaller batches',
+                        'scope': decision.scope}), 413
+    return (jsonify({'error': 'Rate limit exceeded', 'scope': decision.scope,
+                     'retry_after': round(decision.retry_after, 3)}),
+            429, {'Retry-After': retry_after_header(decision)})
+
 # API Routes
-@app.route('/api/installations', methods=['GET'])
+@api.route('/api/installations', methods=['GET'])
 def get_installations():
-    """Get all solar installations"""
+    """List solar installations, paginated and filtered by tenant, zone, capacity range or bounding box"""
     try:
-        installations = SolarInstallation.query.all()
-        return jsonify([{
-            'id': inst.id,
-            'name': inst.name,
-            'location': inst.location,
-            'capacity_kw': inst.capacity_kw,
-            'panel_count': inst.panel_count,
-            'climatic_zone': inst.climatic_zone
-        } for inst in installations])
+        page, per_page = page_args(request.args)
+        query = filtered_query(SolarInstallation.query, request.args, tenant_id=request_tenant())
+        total = query.count()
+        installations = query.order_by(SolarInstallation.id).offset((page - 1) * per_page).limit(per_page).all()
+        
+        response = jsonify([serialize(inst) for inst in installations])
+        response.headers['X-Total-Count'] = str(total)
+        response.headers['X-Page'] = str(page)
+        response.headers['X-Per-Page'] = str(per_page)
+        return response
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/installations', methods=['POST'])
+@api.route('/api/installations/nearest', methods=['GET'])
+def get_nearest_installations():
+    """Installations closest to ?lat=&lon= (up to k, optionally within max_km)"""
+    try:
+        lat = request.args.get('lat', type=float)
+        lon = request.args.get('lon', type=float)
+        k = request.args.get('k', 5, type=int)
+        max_km = request.args.get('max_km', type=float)
+        if lat is None or lon is None or not -90 <= lat <= 90 or not -180 <= lon <= 180:
+            return jsonify({'error': 'lat and lon are required and must be valid coordinates'}), 400
+        if k < 1:
+            return jsonify({'error': 'k must be positive'}), 400
+        
+        snapshot = installation_registry.snapshot()
+        tenant = request_tenant()
+        if tenant is None:
+            rows, distances = snapshot.grid.nearest(lat, lon, k=min(k, MAX_PAGE_SIZE), max_km=max_km)
+        else:
+            # The grid spans every tenant; a tenant's own sites are few enough to scan
+            rows = np.flatnonzero(snapshot.tenant_ids == tenant)
+            distances = haversine_km(lat, lon, snapshot.latitude[rows], snapshot.longitude[rows])
+            order = np.argsort(distances, kind='stable')
+            if max_km is not None:
+                order = order[distances[order] <= max_km]
+            order = order[:min(k, MAX_PAGE_SIZE)]
+            rows, distances = rows[order], distances[order]
+        return jsonify([dict(snapshot.by_id[snapshot.ids[row]]._asdict(), distance_km=round(float(distance), 3))
+                        for row, distance in zip(rows, distances)])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/installations', methods=['POST'])
 def create_installation():
     """Create new solar installation"""
     try:
-        data = request.get_json()
-        
-        installation = SolarInstallation(
-            id=data['id'],
-            name=data['name'],
-            location=data['location'],
-            latitude=data['latitude'],
-            longitude=data['longitude'],
-            capacity_kw=data['capacity_kw'],
-            panel_count=data['panel_count'],
-            climatic_zone=data.get('climatic_zone', 'tropical')
-        )
+        data = request.get_json(silent=True)
+        fields, errors = validate_installation(data)
+        if errors:
+            return jsonify({'error': 'Invalid installation', 'details': errors}), 400
+        tenant = request_tenant()
+        if tenant is not None and fields.setdefault('tenant_id', tenant) != tenant:
+            return jsonify({'error': f'tenant_id must be {tenant}'}), 400
+        if db.session.get(SolarInstallation, fields['id']) is not None:
+            return jsonify({'error': f"Installation {fields['id']} already exists"}), 409
+        
+        fields.setdefault('climatic_zone', DEFAULT_CLIMATIC_ZONE)
+        installation = SolarInstallation(**fields)
         
         db.session.add(installation)
         db.session.commit()
+        installation_registry.invalidate()
         
         return jsonify({'message': 'Installation created successfully'}), 201
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/telemetry', methods=['POST'])
+@api.route('/api/installations/bulk', methods=['POST'])
+def bulk_import_installations():
+    """Insert or update many installations (JSON list or CSV body) in one transaction"""
+    try:
+        upload = request.files.get('file')
+        if upload is not None:
+            content_type = 'text/csv' if upload.filename.lower().endswith('.csv') else 'application/json'
+            payload = upload.read().decode('utf-8-sig')
+        else:
+            content_type = request.content_type or ''
+            payload = request.get_data(as_text=True)
+        try:
+            records = parse_records(payload, content_type)
+        except ValueError as e:
+            return jsonify({'error': f"Could not parse installations: {str(e)}"}), 400
+        
+        summary = bulk_upsert(db.session, records,
+                              atomic=request.args.get('atomic', 'false').lower() == 'true',
+                              dry_run=request.args.get('dry_run', 'false').lower() == 'true',
+                              tenant_id=request_tenant())
+        if summary['committed']:
+            installation_registry.invalidate()
+        
+        status = 200 if summary['committed'] or not summary['failed'] else 400
+        return jsonify(summary), status
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/installations/<installation_id>', methods=['PATCH'])
+def update_installation(installation_id):
+    """Update an existing solar installation"""
+    try:
+        installation = SolarInstallation.query.get(installation_id)
+        tenant = request_tenant()
+        if not installation or tenant not in (None, installation.tenant_id):
+            return jsonify({'error': 'Installation not found'}), 404
+        
+        fields, errors = validate_installation(request.get_json(silent=True), partial=True,
+                                              current_id=installation_id)
+        if errors:
+            return jsonify({'error': 'Invalid installation', 'details': errors}), 400
+        if tenant is not None and fields.get('tenant_id', tenant) != tenant:
+            return jsonify({'error': 'Only operator requests can move an installation to another tenant'}), 400
+        for field, value in fields.items():
+            setattr(installation, field, value)
+        
+        db.session.commit()
+        installation_registry.invalidate()
+        
+        return jsonify({'message': 'Installation updated successfully'})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/telemetry', methods=['POST'])
 def ingest_telemetry():
-    """Ingest real-time telemetry data"""
+    """Ingest real-time telemetry data.
+    
+    The device ``timestamp`` (server time if absent) identifies the reading: a retry is
+    acknowledged without writing, and changed values for a stored reading correct it.
+    """
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True)
+        if not isinstance(data, dict):
+            return jsonify({'error': 'expected a JSON reading'}), 400
+        try:
+            row = telemetry_row(data)
+        except KeyError as e:
+            return jsonify({'error': f"missing field {e.args[0]}"}), 400
+        except (TypeError, ValueError, AttributeError) as e:
+            return jsonify({'error': str(e)}), 400
+        installation_id, timestamp = row[0], row[1]
+        # Unknown ids are refused before they can take a rate limit bucket or store an orphan reading
+        if installation_registry.get(installation_id) is None or not can_access(installation_id):
+            return jsonify({'error': 'Installation not found'}), 404
+        decision = rate_limiter.check_ingest({tenant_of(installation_id): 1}, {installation_id: 1})
+        if not decision.allowed:
+            return rate_limited(decision, 'telemetry')
         
-        # Create telemetry record
-        telemetry = TelemetryData(
-            installation_id=data['installation_id'],
-            pv_power_kw=data['pv_power_kw'],
-            irradiation_wm2=data['irradiation_wm2'],
-            module_temp_c=data['module_temp_c'],
-            ambient_temp_c=data['ambient_temp_c'],
-            wind_speed_ms=data.get('wind_speed_ms', 0),
-            humidity_percent=data.get('humidity_percent', 0),
-            dust_level=data.get('dust_level', 0),
-            inverter_efficiency=data.get('inverter_efficiency', 95.0)
-        )
+        telemetry = TelemetryData.query.filter_by(installation_id=installation_id, timestamp=timestamp).first()
+        if telemetry is not None:
+            if tuple(getattr(telemetry, name) for name in MEASUREMENT_COLUMNS) == row[2:]:
+                return jsonify({'message': 'Telemetry data already ingested', 'duplicate': True}), 200
+            for name, value in zip(MEASUREMENT_COLUMNS, row[2:]):
+                setattr(telemetry, name, value)
+            db.session.commit()
+            rescore_telemetry(telemetry)
+            return jsonify({'message': 'Telemetry data corrected', 'corrected': True}), 200
         
+        # Create telemetry record
+        telemetry = TelemetryData(**dict(zip(TELEMETRY_COLUMNS, row)))
         db.session.add(telemetry)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # A concurrent retry of the same reading won the insert
+            db.session.rollback()
+            return jsonify({'message': 'Telemetry data already ingested', 'duplicate': True}), 200
+        TELEMETRY_ROWS_INGESTED.inc()
         
         # Process data synchronously for demo (in production, use Celery)
-        process_telemetry_data(data['installation_id'], telemetry.id)
+        process_telemetry_data(installation_id, telemetry.id)
         
         return jsonify({'message': 'Telemetry data ingested successfully'}), 201
         
     except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/telemetry/batch', methods=['POST'])
+def ingest_telemetry_batch():
+    """Bulk load readings (backfills, gateway uploads) without the per-reading prediction pipeline.
+    
+    Accepts a JSON list or the compact binary format (see wire.py), either optionally gzip-compressed.
+    Readings of unknown installations are skipped and listed in ``unknown_installations``.
+    """
+    try:
+        try:
+            body = wire.decompress(request.get_data(), request.headers.get('Content-Encoding'))
+            if request.mimetype == wire.CONTENT_TYPE:
+                columns, errors = wire.telemetry_columns(*wire.decode(body))
+            else:
+                data = json.loads(body) if body else None
+                readings = data.get('readings') if isinstance(data, dict) else data
+                if not isinstance(readings, list):
+                    return jsonify({'error': 'expected a list of readings'}), 400
+                rows, errors = telemetry_rows(readings)
+                columns = rows_to_columns(rows)
+        except ValueError as e:
+            return jsonify({'error': f"Could not parse readings: {str(e)}"}), 400
+        
+        if errors:
+            return jsonify({'error': 'Invalid readings', 'details': errors[:100], 'failed': len(errors)}), 400
+        
+        # Readings of unknown installations are reported and skipped, so one misconfigured
+        # site does not hold back the rest of a gateway's batch
+        tenant = request_tenant()
+        installation_ids, counts = np.unique(columns['installation_id'].astype(str), return_counts=True)
+        known = {installation_id for installation_id in installation_ids.tolist()
+                 if installation_registry.get(installation_id) is not None and can_access(installation_id, tenant)}
+        unknown = sorted(set(installation_ids.tolist()) - known)
+        if unknown and not known:
+            details = [{'row': index, 'error': f"unknown installation {installation_id}"}
+                       for index, installation_id in enumerate(columns['installation_id'][:100])]
+            return jsonify({'error': 'Invalid readings', 'failed': column_count(columns),
+                            'unknown_installations': unknown, 'details': details}), 400
+        skipped = 0
+        if unknown:
+            kept = np.isin(columns['installation_id'].astype(str), list(known))
+            skipped, columns = int((~kept).sum()), take_columns(columns, kept)
+        
+        # Every reading counts against its installation's and its tenant's bucket
+        per_installation = {installation_id: int(count) for installation_id, count
+                            in zip(installation_ids.tolist(), counts) if installation_id in known}
+        per_tenant = {}
+        for installation_id, count in per_installation.items():
+            owner = tenant_of(installation_id)
+            per_tenant[owner] = per_tenant.get(owner, 0) + count
+        decision = rate_limiter.check_ingest(per_tenant, per_installation)
+        if not decision.allowed:
+            return rate_limited(decision, 'telemetry_batch')
+        
+        # Retried readings are skipped and corrected ones updated in place (see bulk_load.upsert_telemetry)
+        summary = upsert_telemetry(db.session, columns)
+        db.session.commit()
+        TELEMETRY_ROWS_INGESTED.inc(summary['inserted'] + summary['updated'])
+        for installation_id, since in summary['revised'].items():
+            feature_store.rewind(installation_id, since)
+        
+        rescored = rescore_corrected(summary['corrected'])
+        
+        return jsonify({'message': 'Telemetry batch ingested successfully', 'inserted': summary['inserted'],
+                        'updated': summary['updated'], 'duplicates': summary['duplicates'],
+                        'rescored': rescored, 'skipped': skipped, 'unknown_installations': unknown,
+                        'method': summary['method']}), 201
+        
+    except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/latest/<installation_id>', methods=['GET'])
+@api.route('/api/latest/<installation_id>', methods=['GET'])
 def get_latest_telemetry(installation_id):
     """Get latest telemetry data for installation"""
     try:
+        if not can_access(installation_id):
+            return jsonify({'error': 'Installation not found'}), 404
+        
         telemetry = TelemetryData.query.filter_by(
             installation_id=installation_id
         ).order_by(TelemetryData.timestamp.desc()).limit(50).all()
@@ -432,10 +394,13 @@ def get_latest_telemetry(installation_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/predictions/<installation_id>', methods=['GET'])
+@api.route('/api/predictions/<installation_id>', methods=['GET'])
 def get_predictions(installation_id):
     """Get latest predictions for installation"""
     try:
+        if not can_access(installation_id):
+            return jsonify({'error': 'Installation not found'}), 404
+        
         predictions = PredictionData.query.filter_by(
             installation_id=installation_id
         ).order_by(PredictionData.timestamp.desc()).limit(10).all()
@@ -443,6 +408,8 @@ def get_predictions(installation_id):
         return jsonify([{
             'timestamp': p.timestamp.isoformat(),
             'predicted_power_kw': p.predicted_power_kw,
+            'predicted_power_p10_kw': p.predicted_power_p10_kw,
+            'predicted_power_p90_kw': p.predicted_power_p90_kw,
             'actual_power_kw': p.actual_power_kw,
             'efficiency_score': p.efficiency_score,
             'maintenance_score': p.maintenance_score
@@ -451,34 +418,146 @@ def get_predictions(installation_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/alerts/<installation_id>', methods=['GET'])
+@api.route('/api/alerts/<installation_id>', methods=['GET'])
 def get_alerts(installation_id):
-    """Get alerts for installation"""
+    """Get open alerts for installation (newest first; served from the open-alert index)"""
     try:
+        if not can_access(installation_id):
+            return jsonify({'error': 'Installation not found'}), 404
+        
         alerts = AlertData.query.filter_by(
             installation_id=installation_id,
             resolved=False
         ).order_by(AlertData.timestamp.desc()).limit(20).all()
         
-        return jsonify([{
-            'id': a.id,
-            'timestamp': a.timestamp.isoformat(),
-            'alert_type': a.alert_type,
-            'severity': a.severity,
-            'message': a.message
-        } for a in alerts])
+        return jsonify([alert_lifecycle.serialize(a) for a in alerts])
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@app.route('/api/report/<installation_id>', methods=['GET'])
+@api.route('/api/alerts/<int:alert_id>/acknowledge', methods=['POST'])
+def acknowledge_alert(alert_id):
+    """Mark one open alert as seen by an operator"""
+    try:
+        alert = db.session.get(AlertData, alert_id)
+        if not alert or not can_access(alert.installation_id):
+            return jsonify({'error': 'Alert not found'}), 404
+        if alert.resolved:
+            return jsonify({'error': 'Alert is already resolved'}), 409
+        if alert.acknowledged_at is None:
+            alert_lifecycle.acknowledge(db.session, [AlertData.id == alert_id])
+            db.session.refresh(alert)
+        return jsonify(alert_lifecycle.serialize(alert))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/alerts/<int:alert_id>/resolve', methods=['POST'])
+def resolve_alert(alert_id):
+    """Resolve one open alert"""
+    try:
+        alert = db.session.get(AlertData, alert_id)
+        if not alert or not can_access(alert.installation_id):
+            return jsonify({'error': 'Alert not found'}), 404
+        if alert.resolved:
+            return jsonify({'error': 'Alert is already resolved'}), 409
+        alert_lifecycle.resolve(db.session, [AlertData.id == alert_id])
+        db.session.refresh(alert)
+        return jsonify(alert_lifecycle.serialize(alert))
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/alerts/acknowledge', methods=['POST'])
+def acknowledge_alerts():
+    """Acknowledge every open alert matching the filters in the body (ids, installation_id, alert_type, severity, before)"""
+    try:
+        conditions = alert_lifecycle.parse_filters(request.get_json(silent=True), tenant_id=request_tenant())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify({'acknowledged': alert_lifecycle.acknowledge(db.session, conditions)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/alerts/resolve', methods=['POST'])
+def resolve_alerts():
+    """Resolve every open alert matching the filters in the body (ids, installation_id, alert_type, severity, before)"""
+    try:
+        conditions = alert_lifecycle.parse_filters(request.get_json(silent=True), tenant_id=request_tenant())
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        return jsonify({'resolved': alert_lifecycle.resolve(db.session, conditions)})
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/analytics', methods=['GET'])
+def get_fleet_analytics():
+    """Get fleet KPIs aggregated per installation and climatic zone"""
+    try:
+        hours = request.args.get('hours', 24, type=int)
+        top_n = request.args.get('top_n', 10, type=int)
+        
+        if hours <= 0 or top_n <= 0:
+            return jsonify({'error': 'hours and top_n must be positive'}), 400
+        
+        # pandas is only needed here; import on first use
+        from analytics import compute_fleet_analytics
+        
+        return jsonify(compute_fleet_analytics(db.session, hours=hours, top_n=top_n, tenant_id=request_tenant()))
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/soiling', methods=['GET'])
+def get_soiling_estimates():
+    """Fleet soiling rates and cleaning schedule, soonest cleaning first"""
+    try:
+        query = SoilingEstimate.query
+        tenant = request_tenant()
+        if tenant is not None:
+            query = query.join(SolarInstallation, SolarInstallation.id == SoilingEstimate.installation_id
+                               ).filter(SolarInstallation.tenant_id == tenant)
+        due_within_days = request.args.get('due_within_days', type=int)
+        if due_within_days is not None:
+            query = query.filter(SoilingEstimate.next_cleaning_date <= datetime.utcnow().date() + timedelta(days=due_within_days))
+        estimates = query.order_by(SoilingEstimate.next_cleaning_date.is_(None),
+                                   SoilingEstimate.next_cleaning_date,
+                                   SoilingEstimate.soiling_rate_per_day.desc()).all()
+        
+        # pandas is only needed for the batch fit; serialization is plain Python
+        from soiling import serialize
+        return jsonify([serialize(estimate) for estimate in estimates])
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/soiling/<installation_id>', methods=['GET'])
+def get_soiling_estimate(installation_id):
+    """Soiling rate and next cleaning date for one installation"""
+    try:
+        estimate = db.session.get(SoilingEstimate, installation_id) if can_access(installation_id) else None
+        if not estimate:
+            return jsonify({'error': 'No soiling estimate for this installation yet'}), 404
+        
+        from soiling import serialize
+        return jsonify(serialize(estimate))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/api/report/<installation_id>', methods=['GET'])
 def generate_report(installation_id):
     """Generate AI-powered performance report"""
     try:
         # Get installation data
-        installation = SolarInstallation.query.get(installation_id)
-        if not installation:
+        installation = installation_registry.get(installation_id)
+        if not installation or not can_access(installation_id):
             return jsonify({'error': 'Installation not found'}), 404
+        decision = rate_limiter.check_report(installation.tenant_id)
+        if not decision.allowed:
+            return rate_limited(decision, 'report')
         
         # Get recent telemetry and predictions
         telemetry = TelemetryData.query.filter_by(
@@ -489,10 +568,12 @@ def generate_report(installation_id):
             installation_id=installation_id
         ).order_by(PredictionData.timestamp.desc()).limit(50).all()
         
-        alerts = AlertData.query.filter_by(
-            installation_id=installation_id,
-            resolved=False
-        ).all()
+        # Only the count and a few recent messages are used; never load every open alert
+        open_alerts = AlertData.query.filter_by(installation_id=installation_id, resolved=False)
+        alerts_count = open_alerts.count()
+        alerts = open_alerts.order_by(AlertData.timestamp.desc()).limit(5).all()
+        
+        soiling = db.session.get(SoilingEstimate, installation_id)
         
         # Prepare data for GPT
         report_data = {
@@ -507,8 +588,16 @@ def generate_report(installation_id):
                 'avg_efficiency': np.mean([p.efficiency_score for p in predictions]) if predictions else 0,
                 'maintenance_score': np.mean([p.maintenance_score for p in predictions]) if predictions else 0
             },
-            'alerts_count': len(alerts),
-            'recent_issues': [a.message for a in alerts[:5]]
+            'alerts_count': alerts_count,
+            'recent_issues': [a.message for a in alerts],
+            'soiling': {
+                'soiling_rate_per_day': soiling.soiling_rate_per_day,
+                'last_cleaning_date': soiling.last_cleaning_date.isoformat() if soiling.last_cleaning_date else None,
+                'days_since_cleaning': soiling.days_since_cleaning,
+                'current_loss_kwh_per_day': soiling.current_loss_kwh_per_day,
+                'optimal_interval_days': soiling.optimal_interval_days,
+                'next_cleaning_date': soiling.next_cleaning_date.isoformat() if soiling.next_cleaning_date else None
+            } if soiling else None
         }
         
         # Generate report using GPT
@@ -519,136 +608,274 @@ def generate_report(installation_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-def generate_ai_report(data):
-    """Generate AI-powered report using OpenAI GPT"""
+# Background Tasks (using Celery would be better for production)
+def process_telemetry_data(installation_id, telemetry_id):
+    """Process telemetry data and generate predictions (runs inside the request's app context)"""
+    try:
+        telemetry = TelemetryData.query.get(telemetry_id)
+        if not telemetry:
+            return
+        
+        # Train the installation's model if it is not cached
+        model = model_cache.get(installation_id)
+        if model:
+            MODEL_CACHE_REQUESTS.inc(result='hit')
+        else:
+            MODEL_CACHE_REQUESTS.inc(result='miss')
+            model = model_cache.train(installation_id)
+        
+        # Make prediction
+        prediction = model.predict(telemetry) if model else None
+        if prediction:
+            # Save prediction
+            pred_record = PredictionData(
+                installation_id=installation_id,
+                telemetry_id=telemetry.id,
+                timestamp=telemetry.timestamp,
+                predicted_power_kw=prediction['predicted_power_kw'],
+                predicted_power_p10_kw=prediction['predicted_power_p10_kw'],
+                predicted_power_p90_kw=prediction['predicted_power_p90_kw'],
+                actual_power_kw=telemetry.pv_power_kw,
+                efficiency_score=prediction['efficiency_score'],
+                maintenance_score=prediction['maintenance_score']
+            )
+            db.session.add(pred_record)
+        
+            # Check for alerts
+            AlertSystem.check_performance_alerts(installation_id, telemetry, prediction)
+        
+            db.session.commit()
+
+    except Exception as e:
+        logger.error(f"Error processing telemetry data: {str(e)}")
+
+def rescore_telemetry(telemetry):
+    """Re-score a corrected reading: its prediction and threshold alerts are replaced"""
     try:
-        prompt = f"""
-        Generate a comprehensive solar energy performance report for the following installation:
-        
-        Installation: {data['installation']['name']}
-        Location: {data['installation']['location']}
-        Capacity: {data['installation']['capacity_kw']} kW
-        Panel Count: {data['installation']['panel_count']}
-        
-        Performance Summary:
-        - Average Power Generation: {data['performance_summary']['avg_power_kw']:.2f} kW
-        - Average Efficiency: {data['performance_summary']['avg_efficiency']:.1%}
-        - Maintenance Score: {data['performance_summary']['maintenance_score']:.0f}/100
-        
-        Active Alerts: {data['alerts_count']}
-        Recent Issues: {', '.join(data['recent_issues'])}
-        
-        Please provide:
-        1. Performance Analysis
-        2. Maintenance Recommendations
-        3. Optimization Suggestions
-        4. ROI Impact Assessment
-        5. Next Steps
-        
-        Keep the report professional and actionable.
-        """
-        
-        from openai import OpenAI
-        client = OpenAI(api_key=openai.api_key)
-        
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",
-            messages=[
-                {"role": "system", "content": "You are a solar energy expert providing technical analysis and recommendations."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=1500,
-            temperature=0.7
-        )
-        
-        return response.choices[0].message.content
+        installation = installation_registry.get(telemetry.installation_id)
+        model = model_cache.get(telemetry.installation_id) or model_cache.train(telemetry.installation_id)
+        feature_store.rewind(telemetry.installation_id, telemetry.timestamp)
+        if installation is None or model is None:
+            return
+        
+        from reprocess import rescore
+        rescore(db.session, installation, model, telemetry)
+        db.session.commit()
         
     except Exception as e:
-        logger.error(f"Error generating AI report: {str(e)}")
-        return "Report generation failed. Please check API configuration."
+        db.session.rollback()
+        logger.error(f"Error rescoring corrected telemetry: {str(e)}")
 
-# Background Tasks (using Celery would be better for production)
-def process_telemetry_data(installation_id, telemetry_id):
-    """Process telemetry data and generate predictions"""
+def rescore_corrected(telemetry_ids):
+    """Re-score the corrected readings that were already scored, as the single-reading path does.
+    
+    Returns how many were re-scored.
+    """
+    rescored = 0
+    for start in range(0, len(telemetry_ids), LOOKUP_CHUNK_ROWS):
+        scored = TelemetryData.query.join(PredictionData, PredictionData.telemetry_id == TelemetryData.id).filter(
+            TelemetryData.id.in_(telemetry_ids[start:start + LOOKUP_CHUNK_ROWS])
+        ).order_by(TelemetryData.timestamp).all()
+        for telemetry in scored:
+            rescore_telemetry(telemetry)
+        rescored += len(scored)
+    return rescored
+
+# Periodic tasks (run by create_scheduler inside an app context)
+@timed(SCHEDULER_JOB_SECONDS, job='model_training')
+def retrain_models(workers=None, on_result=None):
+    """Retrain every installation's model in parallel worker processes"""
+    from training import train_all
+    
+    def record(result):
+        MODEL_TRAINING_RUNS.inc(result='ok' if result['ok'] else 'failed')
+        if not result['ok']:
+            logger.warning(f"Training failed for {result['installation_id']}: {result['error']}")
+        if on_result:
+            on_result(result)
+    
+    start = time.perf_counter()
+    snapshot = installation_registry.snapshot()
+    config = {'SQLALCHEMY_DATABASE_URI': current_app.config['SQLALCHEMY_DATABASE_URI']}
+    results = train_all(snapshot.ids.tolist(), config, workers=workers, on_result=record)
+    trained = sum(result['ok'] for result in results)
+    logger.info(f"Retrained {trained}/{len(results)} models in {time.perf_counter() - start:.1f}s")
+    return results
+
+def reprocess_history(since=None, until=None, job=None, anomalies=True, workers=None, batch_rows=None,
+                      on_result=None):
+    """Re-score stored telemetry and re-evaluate alerts for every installation, in parallel"""
+    from reprocess import reprocess_all
+    
+    start = time.perf_counter()
+    snapshot = installation_registry.snapshot()
+    config = {'SQLALCHEMY_DATABASE_URI': current_app.config['SQLALCHEMY_DATABASE_URI']}
+    results = reprocess_all(snapshot.ids.tolist(), config, since=since, until=until, job=job, anomalies=anomalies,
+                            workers=workers, batch_rows=batch_rows, on_result=on_result)
+    rows = sum(result.get('rows', 0) for result in results)
+    logger.info(f"Reprocessed {rows} readings of {len(results)} installations in {time.perf_counter() - start:.1f}s")
+    return results
+
+@timed(SCHEDULER_JOB_SECONDS, job='alert_auto_resolve')
+def auto_resolve_alerts():
+    """Resolve open alerts whose triggering condition has cleared"""
     try:
-        with app.app_context():
-            telemetry = TelemetryData.query.get(telemetry_id)
-            if not telemetry:
-                return
-            
-            # Train model if not trained
-            if not ml_model.is_trained:
-                ml_model.train_model(installation_id)
-            
-            # Make prediction
-            prediction = ml_model.predict(telemetry)
-            if prediction:
-                # Save prediction
-                pred_record = PredictionData(
-                    installation_id=installation_id,
-                    predicted_power_kw=prediction['predicted_power_kw'],
-                    actual_power_kw=telemetry.pv_power_kw,
-                    efficiency_score=prediction['efficiency_score'],
-                    maintenance_score=prediction['maintenance_score']
-                )
-                db.session.add(pred_record)
-                
-                # Check for alerts
-                AlertSystem.check_performance_alerts(installation_id, telemetry, prediction)
-                
-                db.session.commit()
-                
+        count = alert_lifecycle.auto_resolve(db.session)
+        if count:
+            logger.info(f"Auto-resolved {count} alerts")
+        return count
     except Exception as e:
-        logger.error(f"Error processing telemetry data: {str(e)}")
+        db.session.rollback()
+        logger.error(f"Error auto-resolving alerts: {str(e)}")
+        return 0
 
-# Scheduler for periodic tasks
-scheduler = BackgroundScheduler()
+@timed(SCHEDULER_JOB_SECONDS, job='alert_archive')
+def archive_alerts(older_than_days=None):
+    """Move long-resolved alerts from alert_data to alert_archive"""
+    try:
+        count = alert_lifecycle.archive_resolved(db.session, older_than_days)
+        logger.info(f"Archived {count} resolved alerts")
+        return count
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error archiving alerts: {str(e)}")
+        return 0
+
+@timed(SCHEDULER_JOB_SECONDS, job='notifications')
+def send_notifications():
+    """Queue new alerts into recipients' digests and deliver the digests that are due"""
+    try:
+        import notifications
+        
+        read, sent, failed = notifications.run_once(db.session)
+        if sent or failed:
+            logger.info(f"Notifications: {read} alerts read, {sent} digests sent, {failed} failed")
+        return read, sent, failed
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error sending notifications: {str(e)}")
+        return 0, 0, 0
 
+@timed(SCHEDULER_JOB_SECONDS, job='weather_update')
 def update_weather_data():
     """Update weather data for all installations"""
     try:
-        with app.app_context():
-            installations = SolarInstallation.query.all()
-            for installation in installations:
-                weather_data = WeatherService.get_weather_data(
-                    installation.latitude, 
-                    installation.longitude
+        # One weather call per spatial grid cell (~50 km), shared by every site in it
+        snapshot = installation_registry.snapshot()
+        for rows in snapshot.grid.cells.values():
+            weather_data = WeatherService.get_weather_data(
+                float(snapshot.latitude[rows].mean()), 
+                float(snapshot.longitude[rows].mean())
+            )
+            if not weather_data:
+                continue
+            for installation_id in snapshot.ids[rows]:
+                # Create synthetic telemetry with weather data
+                telemetry = TelemetryData(
+                    installation_id=installation_id,
+                    pv_power_kw=0,  # Will be updated with real data
+                    irradiation_wm2=weather_data['irradiation'],
+                    module_temp_c=weather_data['temperature'] + 20,  # Module temp is higher
+                    ambient_temp_c=weather_data['temperature'],
+                    wind_speed_ms=weather_data['wind_speed'],
+                    humidity_percent=weather_data['humidity']
                 )
-                if weather_data:
-                    # Create synthetic telemetry with weather data
-                    telemetry = TelemetryData(
-                        installation_id=installation.id,
-                        pv_power_kw=0,  # Will be updated with real data
-                        irradiation_wm2=weather_data['irradiation'],
-                        module_temp_c=weather_data['temperature'] + 20,  # Module temp is higher
-                        ambient_temp_c=weather_data['temperature'],
-                        wind_speed_ms=weather_data['wind_speed'],
-                        humidity_percent=weather_data['humidity']
-                    )
-                    # This would be replaced with real sensor data in production
-                    
+                # This would be replaced with real sensor data in production
+
     except Exception as e:
         logger.error(f"Error updating weather data: {str(e)}")
 
-# Schedule periodic tasks
-scheduler.add_job(
-    func=update_weather_data,
-    trigger="interval",
-    minutes=15,
-    id='weather_update'
-)
+@timed(SCHEDULER_JOB_SECONDS, job='soiling_update')
+def update_soiling_estimates():
+    """Refit soiling rates and cleaning dates for the whole fleet"""
+    try:
+        import pandas as pd
+        from soiling import estimate_soiling, store_estimates
+        
+        snapshot = installation_registry.snapshot()
+        installations = pd.DataFrame({'installation_id': snapshot.ids, 'capacity_kw': snapshot.capacity_kw})
+        estimates = estimate_soiling(db.session, installations)
+        store_estimates(db.session, estimates)
+        logger.info(f"Soiling estimates updated for {len(estimates)} installations")
+        return len(estimates)
+        
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error updating soiling estimates: {str(e)}")
+        return 0
+
+# Scheduler for periodic tasks. It must run in exactly one process: the dev
+# server below or scheduler_runner.py, never inside the WSGI workers.
+def create_scheduler(app, scheduler_class=None):
+    """Build a scheduler whose jobs run inside ``app``'s application context"""
+    if scheduler_class is None:
+        from apscheduler.schedulers.background import BackgroundScheduler
+        scheduler_class = BackgroundScheduler
+    scheduler = scheduler_class()
+    
+    def in_app_context(job):
+        def run():
+            with app.app_context():
+                job()
+        return run
+    
+    # Schedule periodic tasks
+    scheduler.add_job(
+        func=in_app_context(update_weather_data),
+        trigger="interval",
+        minutes=15,
+        id='weather_update'
+    )
+    scheduler.add_job(
+        func=in_app_context(update_soiling_estimates),
+        trigger="cron",
+        hour=1,
+        id='soiling_update'
+    )
+    # Notifications go out from here, never from the request that raised the alert
+    scheduler.add_job(
+        func=in_app_context(send_notifications),
+        trigger="interval",
+        minutes=1,
+        id='notifications'
+    )
+    scheduler.add_job(
+        func=in_app_context(auto_resolve_alerts),
+        trigger="interval",
+        minutes=15,
+        id='alert_auto_resolve'
+    )
+    scheduler.add_job(
+        func=in_app_context(archive_alerts),
+        trigger="cron",
+        hour=3,
+        id='alert_archive'
+    )
+    scheduler.add_job(
+        func=in_app_context(retrain_models),
+        trigger="cron",
+        hour=2,
+        id='model_training'
+    )
+    return scheduler
 
 # Health check endpoint
-@app.route('/api/health', methods=['GET'])
+@api.route('/api/health', methods=['GET'])
 def health_check():
     return jsonify({
         'status': 'healthy',
         'timestamp': datetime.utcnow().isoformat(),
-        'ml_model_trained': ml_model.is_trained
+        'ml_model_trained': len(model_cache) > 0,
+        'models_loaded': len(model_cache)
     })
 
+# Prometheus scrape endpoint
+@api.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 # Initialize database
-def create_tables():
+def create_tables(app):
     with app.app_context():
         db.create_all()
         print("Database tables created successfully!")
@@ -692,17 +919,321 @@ def create_tables():
                 db.session.add(installation)
             
             db.session.commit()
+            installation_registry.invalidate()
             print("Sample installations added!")
 
+def register_commands(app):
+    """Flask CLI commands (run with ``flask --app app:create_app <command>``)"""
+    import click
+    
+    @app.cli.command('import-installations')
+    @click.argument('path')
+    @click.option('--atomic', is_flag=True, help='Reject the whole file if any row is invalid')
+    @click.option('--dry-run', is_flag=True, help='Validate only, write nothing')
+    def import_installations(path, atomic, dry_run):
+        """Bulk insert or update installations from a CSV or JSON file"""
+        db.create_all()
+        summary = bulk_upsert(db.session, load_file(path), atomic=atomic, dry_run=dry_run)
+        installation_registry.invalidate()
+        for error in summary['errors']:
+            click.echo(f"row {error['row']} ({error['id']}): {'; '.join(error['errors'])}", err=True)
+        click.echo(f"{summary['inserted']} inserted, {summary['updated']} updated, "
+                   f"{summary['failed']} failed ({'committed' if summary['committed'] else 'not committed'})")
+
+    @app.cli.command('load-telemetry')
+    @click.argument('path')
+    @click.option('--method', type=click.Choice(['auto', 'copy', 'executemany']), default='auto')
+    def load_telemetry_command(path, method):
+        """Bulk load telemetry from a CSV file (COPY on PostgreSQL); readings already stored are skipped"""
+        rows, errors = telemetry_rows(read_csv_readings(path))
+        for error in errors[:20]:
+            click.echo(f"row {error['row']}: {error['error']}", err=True)
+        if errors:
+            raise click.ClickException(f"{len(errors)} invalid rows, nothing loaded")
+        start = time.perf_counter()
+        try:
+            summary = upsert_telemetry(db.session, rows_to_columns(rows), method)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        db.session.commit()
+        for installation_id, since in summary['revised'].items():
+            feature_store.rewind(installation_id, since)
+        rescored = rescore_corrected(summary['corrected'])
+        click.echo(f"{summary['inserted']} rows loaded with {summary['method']}, {summary['updated']} corrected "
+                   f"({rescored} re-scored), {summary['duplicates']} already stored, "
+                   f"in {time.perf_counter() - start:.1f}s")
+
+    @app.cli.command('dedupe-telemetry')
+    def dedupe_telemetry_command():
+        """One-off upgrade: remove duplicate readings and create the unique (installation_id, timestamp) index"""
+        start = time.perf_counter()
+        removed, revised = deduplicate_telemetry(db.session)
+        db.session.commit()
+        for installation_id, since in revised.items():
+            feature_store.rewind(installation_id, since)
+        
+        # The unique index replaces the plain one on the same columns
+        db.session.execute(text('DROP INDEX IF EXISTS ix_telemetry_installation_timestamp'))
+        db.session.commit()
+        index = next(index for index in TelemetryData.__table__.indexes
+                     if index.name == 'uq_telemetry_installation_timestamp')
+        index.create(db.engine, checkfirst=True)
+        click.echo(f"Removed {removed} duplicate readings across {len(revised)} installations and created "
+                   f"{index.name} in {time.perf_counter() - start:.1f}s")
+
+    @app.cli.command('estimate-soiling')
+    def estimate_soiling_command():
+        """Refit soiling rates and cleaning schedules for every installation"""
+        start = time.perf_counter()
+        count = update_soiling_estimates()
+        click.echo(f"Soiling estimates for {count} installations in {time.perf_counter() - start:.1f}s")
+
+    @app.cli.command('materialize-features')
+    def materialize_features():
+        """Append derived features for telemetry not yet in the feature store"""
+        start = time.perf_counter()
+        snapshot = installation_registry.snapshot()
+        count = sum(feature_store.sync(installation) for installation in snapshot.by_id.values())
+        click.echo(f"{count} rows materialized for {len(snapshot)} installations "
+                   f"in {time.perf_counter() - start:.1f}s")
+
+    @app.cli.command('train-all')
+    @click.option('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+    def train_all_command(workers):
+        """Train every installation's model in parallel and save them to MODEL_DIR"""
+        def report(result):
+            seconds = f"{result['seconds']:.2f}s" if result['seconds'] is not None else '-'
+            if result['ok']:
+                click.echo(f"{result['installation_id']}: {result['backend']} on {result['rows']} rows in {seconds}")
+            else:
+                click.echo(f"{result['installation_id']}: FAILED in {seconds}: {result['error']}", err=True)
+        
+        start = time.perf_counter()
+        results = retrain_models(workers=workers, on_result=report)
+        failed = [result for result in results if not result['ok']]
+        click.echo(f"{len(results) - len(failed)} trained, {len(failed)} failed in {time.perf_counter() - start:.1f}s")
+
+    @app.cli.command('reprocess')
+    @click.option('--since', type=click.DateTime(), default=None, help='First reading timestamp (UTC, inclusive)')
+    @click.option('--until', type=click.DateTime(), default=None, help='Last reading timestamp (UTC, exclusive)')
+    @click.option('--job', default=None, help='Checkpoint name (default: derived from the range)')
+    @click.option('--restart', is_flag=True, help='Discard the job\'s checkpoints and start over')
+    @click.option('--no-anomalies', is_flag=True, help='Only re-evaluate threshold rules, not the anomaly detector')
+    @click.option('--workers', type=int, default=None, help='Worker processes (default: one per CPU)')
+    @click.option('--batch-rows', type=int, default=None, help='Readings per batch and checkpoint')
+    def reprocess_command(since, until, job, restart, no_anomalies, workers, batch_rows):
+        """Re-score historical telemetry and re-evaluate alerts, resuming from checkpoints"""
+        from reprocess import clear_checkpoints, job_name
+        
+        db.create_all()
+        job = job or job_name(since, until)
+        if restart:
+            click.echo(f"Cleared {clear_checkpoints(job)} checkpoints of job {job}")
+        
+        def report(result):
+            seconds = f"{result['seconds']:.2f}s" if result['seconds'] is not None else '-'
+            if result['ok']:
+                click.echo(f"{result['installation_id']}: {result['rows']} readings, "
+                           f"{result['alerts']} alerts in {seconds}")
+            else:
+                click.echo(f"{result['installation_id']}: FAILED in {seconds}: {result['error']}", err=True)
+        
+        start = time.perf_counter()
+        results = reprocess_history(since, until, job, not no_anomalies, workers, batch_rows, report)
+        failed = [result for result in results if not result['ok']]
+        rows = sum(result.get('rows', 0) for result in results)
+        click.echo(f"Job {job}: {rows} readings re-scored, {len(failed)} installations failed "
+                   f"in {time.perf_counter() - start:.1f}s")
+
+    @app.cli.command('resolve-alerts')
+    def resolve_alerts_command():
+        """Auto-resolve open alerts whose condition has cleared"""
+        db.create_all()
+        click.echo(f"{auto_resolve_alerts()} alerts resolved")
+
+    @app.cli.command('archive-alerts')
+    @click.option('--days', type=int, default=None, help='Archive alerts resolved more than this many days ago '
+                                                         '(default: ALERT_ARCHIVE_DAYS)')
+    def archive_alerts_command(days):
+        """Move resolved alerts out of the hot alert table"""
+        db.create_all()
+        start = time.perf_counter()
+        count = archive_alerts(days)
+        click.echo(f"{count} alerts archived in {time.perf_counter() - start:.1f}s")
+
+    @app.cli.command('send-notifications')
+    def send_notifications_command():
+        """Run one notification pass: queue new alerts into digests and deliver the due ones"""
+        db.create_all()
+        read, sent, failed = send_notifications()
+        click.echo(f"{read} alerts read, {sent} digests sent, {failed} failed")
+
+    @app.cli.command('build-solar-tables')
+    def build_solar_tables():
+        """Generate the clear-sky / solar-position tables for every installation's latitude band"""
+        start = time.perf_counter()
+        count = solar_tables.warm(installation_registry.snapshot().latitude)
+        click.echo(f"{count} solar tables ready in {time.perf_counter() - start:.1f}s")
+
+    @app.cli.command('generate-scenario')
+    @click.option('--start', type=click.DateTime(), required=True, help='First reading timestamp (UTC)')
+    @click.option('--days', type=int, default=365)
+    @click.option('--installations', 'count', type=int, default=None,
+                  help='Create this many synthetic installations (default: use every existing installation)')
+    @click.option('--interval', type=int, default=15, help='Minutes between readings')
+    @click.option('--seed', type=int, default=42)
+    @click.option('--labels', 'labels_path', default='scenario_labels.json', help='Ground-truth episodes file')
+    @click.option('--method', type=click.Choice(['auto', 'copy', 'executemany']), default='auto')
+    @click.option('--dry-run', is_flag=True, help='Generate and write the labels only, load nothing')
+    def generate_scenario(start, days, count, interval, seed, labels_path, method, dry_run):
+        """Load a synthetic fleet scenario (correlated weather, labelled faults) and save its ground truth"""
+        from scenarios import Scenario, chunk_columns, save_episodes, synthetic_installations
+        
+        db.create_all()
+        fresh = False
+        if count:
+            records = synthetic_installations(count, seed)
+            summary = bulk_upsert(db.session, records, dry_run=dry_run)
+            installation_registry.invalidate()
+            click.echo(f"{summary['inserted']} synthetic installations created, {summary['updated']} updated")
+            # Brand-new installations have no readings to collide with, so skip the duplicate lookups
+            fresh = summary['updated'] == 0
+        else:
+            records = [serialize(installation)
+                       for installation in SolarInstallation.query.order_by(SolarInstallation.id)]
+        if not records:
+            raise click.ClickException('no installations (use --installations to create synthetic ones)')
+        
+        scenario = Scenario(records, start, start + timedelta(days=days), interval, seed)
+        begin = time.perf_counter()
+        loaded = 0
+        for chunk in scenario.chunks():
+            if dry_run:
+                loaded += chunk.labels.size
+                continue
+            columns = chunk_columns(chunk)
+            try:
+                if fresh:
+                    loaded += load_telemetry(db.session, columns, method)[0]
+                else:
+                    summary = upsert_telemetry(db.session, columns, method)
+                    loaded += summary['inserted'] + summary['updated']
+            except ValueError as e:
+                raise click.ClickException(str(e))
+            db.session.commit()
+            if not fresh:
+                for installation_id, since in summary['revised'].items():
+                    feature_store.rewind(installation_id, since)
+        
+        save_episodes(labels_path, scenario)
+        episodes = scenario.episodes()
+        faults = {}
+        for episode in episodes:
+            faults[episode['fault']] = faults.get(episode['fault'], 0) + 1
+        click.echo(f"{loaded} readings {'generated' if dry_run else 'loaded'} for {len(records)} installations "
+                   f"in {time.perf_counter() - begin:.1f}s")
+        counts = ', '.join(f'{count} {fault}' for fault, count in sorted(faults.items()))
+        click.echo(f"{len(episodes)} fault episodes ({counts}) written to {labels_path}")
+
+    @app.cli.command('score-alerts')
+    @click.argument('labels_path')
+    @click.option('--grace-hours', type=float, default=24, help='Alerts this long after an episode still count')
+    @click.option('--output', default=None, help='Also write the scores as JSON')
+    def score_alerts_command(labels_path, grace_hours, output):
+        """Score stored alerts against a scenario's ground-truth fault episodes"""
+        from scenarios import load_episodes, score_alerts
+        from models import AlertArchive
+        
+        labels = load_episodes(labels_path)
+        alerts = []
+        for table in (AlertData, AlertArchive):
+            ids = labels['installation_ids']
+            for first in range(0, len(ids), 500):
+                alerts.extend(db.session.query(table.installation_id, TelemetryData.timestamp, table.alert_type)
+                              .join(TelemetryData, TelemetryData.id == table.telemetry_id)
+                              .filter(table.installation_id.in_(ids[first:first + 500]),
+                                      TelemetryData.timestamp >= labels['start'],
+                                      TelemetryData.timestamp < labels['end']))
+        scores = score_alerts(labels['episodes'], alerts, timedelta(hours=grace_hours))
+        
+        precision = f"{scores['precision']:.1%}" if scores['precision'] is not None else '-'
+        click.echo(f"{scores['alerts']} fault alerts, precision {precision}")
+        for fault, result in scores['faults'].items():
+            recall = f"{result['recall']:.1%}" if result['recall'] is not None else '-'
+            delay = f"{result['median_delay_hours']:.1f}h" if result['median_delay_hours'] is not None else '-'
+            click.echo(f"  {fault:22s} {result['detected']:6d}/{result['episodes']:<6d} recall {recall:>6s}  "
+                       f"median delay {delay}")
+        for alert_type, result in scores['alert_types'].items():
+            click.echo(f"  {alert_type:22s} {result['alerts']:6d} alerts  precision {result['precision']:.1%}")
+        for alert_type, count in sorted(scores['unscored_alerts'].items()):
+            click.echo(f"  {alert_type:22s} {count:6d} alerts  (not a modelled fault)")
+        if output:
+            with open(output, 'w') as f:
+                json.dump(scores, f, indent=2)
+
+def prewarm(app):
+    """Open a DB connection and train the model before the process takes traffic"""
+    start = time.perf_counter()
+    with app.app_context():
+        db.session.execute(text('SELECT 1'))
+        snapshot = installation_registry.snapshot()
+        solar_tables.warm(snapshot.latitude)
+        
+        # Train up front on the installation with the most history instead of
+        # on the first telemetry request
+        busiest = db.session.query(TelemetryData.installation_id).group_by(
+            TelemetryData.installation_id
+        ).order_by(func.count(TelemetryData.id).desc()).first()
+        if busiest and not model_cache.get(busiest[0]):
+            model_cache.train(busiest[0])
+        
+        db.session.remove()
+    
+    logger.info(f"Pre-warm completed in {time.perf_counter() - start:.2f}s (models loaded: {len(model_cache)})")
+
+def create_app(config=None):
+    """Application factory used by the dev server, wsgi.py and the scheduler runner"""
+    app = Flask(__name__)
+    CORS(app)
+    
+    # Database Configuration (using SQLite for quick demo)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///solar_energy.db')
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY')
+    if config:
+        app.config.update(config)
+    # Pool sizing, timeouts and SQLite WAL settings (see db_config.py)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    
+    db.init_app(app)
+    with app.app_context():
+        configure_engine(db.engine)
+    
+    # Metrics: per-route latency and per-statement DB time
+    instrument_app(app)
+    instrument_engine(Engine)
+    
+    # Opt-in request profiling (PROFILING_ENABLED=true): sampled/slow request stacks and SQL logs
+    RequestProfiler.from_env().init_app(app)
+    
+    app.register_blueprint(api)
+    register_commands(app)
+    return app
+
 if __name__ == '__main__':
+    app = create_app()
+    debug = os.getenv('FLASK_ENV', 'development') == 'development'
+    
     # Create tables on startup
-    create_tables()
+    create_tables(app)
     
-    # Start scheduler
-    scheduler.start()
+    # Start scheduler (only in the reloader's child process, so it runs once)
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        create_scheduler(app).start()
     
     print("🚀 Solar Energy Management System Backend Started!")
     print("📊 API available at: http://localhost:5000")
     print("🔍 Health check: http://localhost:5000/api/health")
+    print("🏭 Production: gunicorn -c gunicorn.conf.py wsgi:application")
     
-    app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(debug=debug, host='0.0.0.0', port=5000)
\ No newline at end of file
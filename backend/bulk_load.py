@@ -0,0 +1,317 @@
+import csv
+import io
+import os
+from datetime import datetime, timedelta, timezone
+from itertools import islice
+
+import numpy as np
+from sqlalchemy import bindparam, delete, func, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+
+from models import AlertArchive, AlertData, PredictionData, TelemetryData
+
+# Column order shared by the COPY stream and the executemany fallback
+TELEMETRY_COLUMNS = [
+    'installation_id', 'timestamp', 'pv_power_kw', 'irradiation_wm2', 'module_temp_c', 'ambient_temp_c',
+    'wind_speed_ms', 'humidity_percent', 'dust_level', 'inverter_efficiency'
+]
+
+REQUIRED_FIELDS = ['installation_id', 'pv_power_kw', 'irradiation_wm2', 'module_temp_c', 'ambient_temp_c']
+
+# Same defaults as the TelemetryData columns and POST /api/telemetry
+OPTIONAL_DEFAULTS = {
+    'wind_speed_ms': 0,
+    'humidity_percent': 0,
+    'dust_level': 0,
+    'inverter_efficiency': 95.0
+}
+
+MEASUREMENT_COLUMNS = TELEMETRY_COLUMNS[2:]
+
+# Rows buffered in memory per COPY / executemany round trip
+CHUNK_ROWS = 50000
+
+# (installation_id, timestamp) keys per lookup of already stored readings
+LOOKUP_CHUNK_ROWS = 500
+
+# Lookups and writes retried when a concurrent upload stores the same readings first
+UPSERT_ATTEMPTS = 3
+
+# Device clocks may run this far ahead of the server; later readings are refused,
+# since a future timestamp would outrank every real reading after it
+MAX_FUTURE_SECONDS = int(os.getenv('TELEMETRY_MAX_FUTURE_SECONDS', '300'))
+
+
+def telemetry_row(reading, now=None):
+    """Convert one reading dict into a tuple in TELEMETRY_COLUMNS order.
+
+    Raises KeyError for a missing required field and ValueError for values
+    that are not numbers or a malformed or future timestamp.
+    """
+    now = now or datetime.utcnow()
+    # CSV files leave absent values as empty strings
+    present = {field: value for field, value in reading.items() if value not in (None, '')}
+
+    timestamp = present.get('timestamp')
+    if timestamp is None:
+        timestamp = now
+    elif not isinstance(timestamp, datetime):
+        timestamp = datetime.fromisoformat(str(timestamp))
+    if timestamp.tzinfo is not None:
+        # Stored timestamps are naive UTC
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    if timestamp > now + timedelta(seconds=MAX_FUTURE_SECONDS):
+        raise ValueError(f"timestamp {timestamp.isoformat()} is more than {MAX_FUTURE_SECONDS}s ahead of server time")
+
+    row = [str(present['installation_id']), timestamp]
+    row.extend(float(present[field]) for field in REQUIRED_FIELDS[1:])
+    row.extend(float(present.get(field, default)) for field, default in OPTIONAL_DEFAULTS.items())
+    return tuple(row)
+
+
+def telemetry_rows(readings):
+    """Tuples for every reading plus per-row errors ``[{'row', 'error'}]``"""
+    now = datetime.utcnow()
+    rows, errors = [], []
+    for index, reading in enumerate(readings):
+        try:
+            rows.append(telemetry_row(reading, now))
+        except KeyError as e:
+            errors.append({'row': index, 'error': f"missing field {e.args[0]}"})
+        except (TypeError, ValueError, AttributeError) as e:
+            errors.append({'row': index, 'error': str(e)})
+    return rows, errors
+
+
+def rows_to_columns(rows):
+    """Column arrays (``{name: array}`` over TELEMETRY_COLUMNS) from row tuples.
+
+    Every loader below takes this shape: installation ids as an object array,
+    timestamps as ``datetime64[us]`` and measurements as float64.
+    """
+    fields = list(zip(*rows)) or [()] * len(TELEMETRY_COLUMNS)
+    columns = {'installation_id': np.array(fields[0], dtype=object),
+               'timestamp': np.array(fields[1], dtype='datetime64[us]')}
+    for name, values in zip(MEASUREMENT_COLUMNS, fields[2:]):
+        columns[name] = np.array(values, dtype=np.float64)
+    return columns
+
+
+def take_columns(columns, index):
+    """The readings at ``index`` (indices or a boolean mask) of every column"""
+    return {name: values[index] for name, values in columns.items()}
+
+
+def column_count(columns):
+    return len(columns['timestamp'])
+
+
+def supports_copy(session):
+    bind = session.get_bind()
+    return bind.dialect.name == 'postgresql' and bind.dialect.driver == 'psycopg2'
+
+
+def _chunks(rows, size):
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def copy_telemetry(session, columns, chunk_rows=CHUNK_ROWS):
+    """Stream column arrays into telemetry_data with ``COPY ... FROM STDIN`` (PostgreSQL + psycopg2).
+
+    Each ``chunk_rows`` slice is formatted column by column as CSV into an
+    in-memory buffer (no per-row Python objects) and sent over the session's
+    own connection, so the load commits or rolls back with the surrounding
+    transaction.
+    """
+    import pandas as pd
+
+    statement = (f"COPY {TelemetryData.__tablename__} ({', '.join(TELEMETRY_COLUMNS)}) "
+                 f"FROM STDIN WITH (FORMAT csv)")
+    cursor = session.connection().connection.cursor()
+    count = column_count(columns)
+    try:
+        for start in range(0, count, chunk_rows):
+            buffer = io.StringIO()
+            frame = pd.DataFrame({name: columns[name][start:start + chunk_rows] for name in TELEMETRY_COLUMNS})
+            frame.to_csv(buffer, header=False, index=False, date_format='%Y-%m-%dT%H:%M:%S.%f')
+            buffer.seek(0)
+            cursor.copy_expert(statement, buffer)
+    finally:
+        cursor.close()
+    return count
+
+
+def executemany_telemetry(session, columns, chunk_rows=CHUNK_ROWS):
+    """Portable fallback: one Core INSERT executed with ``executemany`` per chunk of the columns"""
+    statement = TelemetryData.__table__.insert()
+    count = column_count(columns)
+    for start in range(0, count, chunk_rows):
+        chunk = take_columns(columns, slice(start, start + chunk_rows))
+        chunk['timestamp'] = chunk['timestamp'].astype('datetime64[us]')
+        values = [chunk[name].tolist() for name in TELEMETRY_COLUMNS]
+        session.execute(statement, [dict(zip(TELEMETRY_COLUMNS, row)) for row in zip(*values)])
+    return count
+
+
+def load_telemetry(session, columns, method='auto'):
+    """Bulk insert telemetry column arrays (see ``rows_to_columns``) without building ORM objects.
+
+    ``method`` is ``copy``, ``executemany`` or ``auto`` (COPY on PostgreSQL
+    with psycopg2, executemany elsewhere). The caller commits. Returns
+    ``(row_count, method_used)``.
+    """
+    if method == 'auto':
+        method = 'copy' if supports_copy(session) else 'executemany'
+    if method == 'copy':
+        if not supports_copy(session):
+            raise ValueError('COPY needs PostgreSQL with psycopg2')
+        return copy_telemetry(session, columns), method
+    if method == 'executemany':
+        return executemany_telemetry(session, columns), method
+    raise ValueError(f"Unknown load method: {method}")
+
+
+def stored_readings(session, keys):
+    """``{(installation_id, timestamp): (id, measurements)}`` for the keys already in telemetry_data"""
+    table = TelemetryData.__table__
+    stored = {}
+    for chunk in _chunks(keys, LOOKUP_CHUNK_ROWS):
+        result = session.execute(
+            select(table.c.id, table.c.installation_id, table.c.timestamp,
+                   *(table.c[name] for name in MEASUREMENT_COLUMNS))
+            .where(tuple_(table.c.installation_id, table.c.timestamp).in_(chunk)))
+        for telemetry_id, installation_id, timestamp, *values in result:
+            stored[(installation_id, timestamp)] = (telemetry_id, tuple(values))
+    return stored
+
+
+def upsert_telemetry(session, columns, method='auto'):
+    """Load telemetry column arrays idempotently, keyed on the device's ``(installation_id, timestamp)``.
+
+    A key repeated within ``columns`` keeps its last reading. Readings stored
+    already with the same values are skipped, so a retried upload writes
+    nothing; stored readings with other values are corrected in place and
+    keep their id (and so their predictions and alerts). Only new readings
+    go through ``load_telemetry``. The caller commits. Returns a summary
+    with ``inserted``, ``updated``, ``duplicates``, ``method``, ``revised``
+    (``{installation_id: oldest corrected timestamp}``) and ``corrected``
+    (ids of the corrected readings).
+
+    The writes run in a savepoint: if a concurrent retry of the same upload
+    inserts some of the new readings between lookup and insert, the unique
+    index rejects the load, and the lookup and writes are redone so those
+    readings count as duplicates (or corrections) instead of failing.
+    """
+    # Keys are the only per-reading Python objects; measurements stay in the
+    # arrays unless the reading is stored already
+    timestamps = columns['timestamp'].astype('datetime64[us]')
+    latest = {key: index for index, key in enumerate(zip(columns['installation_id'].tolist(), timestamps.tolist()))}
+    for attempt in range(UPSERT_ATTEMPTS):
+        stored = stored_readings(session, list(latest))
+        new, changed, revised = [], [], {}
+        for key, index in latest.items():
+            match = stored.get(key)
+            if match is None:
+                new.append(index)
+                continue
+            values = tuple(float(columns[name][index]) for name in MEASUREMENT_COLUMNS)
+            if match[1] != values:
+                changed.append(dict(zip(MEASUREMENT_COLUMNS, values), id=match[0]))
+                revised[key[0]] = min(revised.get(key[0], key[1]), key[1])
+
+        try:
+            with session.begin_nested():
+                inserted, used = load_telemetry(session, take_columns(columns, np.array(new, dtype=np.intp)),
+                                                method)
+                for chunk in _chunks(changed, LOOKUP_CHUNK_ROWS):
+                    session.execute(update(TelemetryData), chunk)
+            break
+        except IntegrityError:
+            if attempt == UPSERT_ATTEMPTS - 1:
+                raise
+    return {
+        'inserted': inserted,
+        'updated': len(changed),
+        'duplicates': column_count(columns) - inserted - len(changed),
+        'method': used,
+        'revised': revised,
+        'corrected': [row['id'] for row in changed]
+    }
+
+
+def deduplicate_telemetry(session):
+    """Collapse repeated ``(installation_id, timestamp)`` readings so the unique index can be built.
+
+    One-off for databases created before readings were keyed on the device
+    timestamp. Each group keeps its first row (lowest id) with the values of
+    its last one, as a retried upload would now leave it. The other rows'
+    predictions are deleted and their alerts moved to the kept row (deleted
+    when it already has an alert of that type). The caller commits. Returns
+    ``(rows removed, {installation_id: oldest affected timestamp})``.
+    """
+    table = TelemetryData.__table__
+    groups = select(table.c.installation_id, table.c.timestamp).group_by(
+        table.c.installation_id, table.c.timestamp).having(func.count() > 1).subquery()
+    result = session.execute(
+        select(table.c.id, table.c.installation_id, table.c.timestamp, *(table.c[name] for name in MEASUREMENT_COLUMNS))
+        .join(groups, (table.c.installation_id == groups.c.installation_id) & (table.c.timestamp == groups.c.timestamp))
+        .order_by(table.c.installation_id, table.c.timestamp, table.c.id))
+
+    kept, moved, corrected, revised = {}, {}, [], {}
+    for telemetry_id, installation_id, timestamp, *values in result:
+        key = (installation_id, timestamp)
+        if key not in kept:
+            kept[key] = (telemetry_id, tuple(values))
+            revised[installation_id] = min(revised.get(installation_id, timestamp), timestamp)
+            continue
+        moved[telemetry_id] = kept[key][0]
+        corrected.append(dict(zip(MEASUREMENT_COLUMNS, values), id=kept[key][0]))
+    if not moved:
+        return 0, {}
+
+    # Later rows overwrite earlier ones, so each kept row ends with its group's last values
+    for chunk in _chunks(corrected, LOOKUP_CHUNK_ROWS):
+        session.execute(update(TelemetryData), chunk)
+    dropped = list(moved)
+    for chunk in _chunks(dropped, LOOKUP_CHUNK_ROWS):
+        session.execute(delete(PredictionData).where(PredictionData.telemetry_id.in_(chunk)))
+
+    alerts = AlertData.__table__
+    targets = list(set(moved.values()))
+    taken = set()
+    for chunk in _chunks(targets, LOOKUP_CHUNK_ROWS):
+        taken.update(session.execute(select(alerts.c.telemetry_id, alerts.c.alert_type)
+                                     .where(alerts.c.telemetry_id.in_(chunk))).all())
+    repoint, duplicates = [], []
+    for chunk in _chunks(dropped, LOOKUP_CHUNK_ROWS):
+        for alert_id, telemetry_id, alert_type in session.execute(
+                select(alerts.c.id, alerts.c.telemetry_id, alerts.c.alert_type)
+                .where(alerts.c.telemetry_id.in_(chunk)).order_by(alerts.c.id)):
+            target = (moved[telemetry_id], alert_type)
+            if target in taken:
+                duplicates.append(alert_id)
+            else:
+                taken.add(target)
+                repoint.append({'id': alert_id, 'telemetry_id': target[0]})
+    for chunk in _chunks(duplicates, LOOKUP_CHUNK_ROWS):
+        session.execute(delete(AlertData).where(AlertData.id.in_(chunk)))
+    for chunk in _chunks(repoint, LOOKUP_CHUNK_ROWS):
+        session.execute(update(AlertData), chunk)
+    archive = AlertArchive.__table__
+    session.execute(update(archive).where(archive.c.telemetry_id == bindparam('old')).values(
+        telemetry_id=bindparam('new')), [{'old': old, 'new': new} for old, new in moved.items()])
+
+    for chunk in _chunks(dropped, LOOKUP_CHUNK_ROWS):
+        session.execute(delete(TelemetryData).where(TelemetryData.id.in_(chunk)))
+    return len(dropped), revised
+
+
+def read_csv_readings(path):
+    """Reading dicts from a CSV file whose header names telemetry fields"""
+    with open(path, newline='') as f:
+        yield from csv.DictReader(f)
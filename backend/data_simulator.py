@@ -6,9 +6,18 @@ import math
 from datetime import datetime, timedelta
 import numpy as np
 
+from solar_geometry import apparent_solar_hour, solar_tables
+import wire
+from gateway import Gateway
+
+# Resends of one upload while the backend answers 429 (waiting Retry-After between them)
+MAX_RATE_LIMIT_RETRIES = 1000
+
 class SolarDataSimulator:
-    def __init__(self, base_url="http://localhost:5000"):
+    def __init__(self, base_url="http://localhost:5000", wire_format="json"):
         self.base_url = base_url
+        # 'binary' sends historical data as gzip-compressed binary batches (see wire.py)
+        self.wire_format = wire_format
         self.installations = [
             {
                 'id': 'INST_001',
@@ -39,27 +48,20 @@ class SolarDataSimulator:
     def get_realistic_solar_data(self, installation, current_time):
         """Generate realistic solar data based on time, location, and weather patterns"""
         
-        # Time-based factors
-        hour = current_time.hour
+        # Time-based factors (timestamps are UTC, like the backend's)
+        hour = apparent_solar_hour(current_time, installation['lon'])
         month = current_time.month
         
-        # Solar irradiation based on time of day and season
-        if 6 <= hour <= 18:  # Daylight hours
-            # Peak irradiation around noon
-            time_factor = math.sin(math.pi * (hour - 6) / 12)
-            
-            # Seasonal variation (higher in winter months for India)
-            seasonal_factor = 1.0
-            if month in [11, 12, 1, 2]:  # Winter months
-                seasonal_factor = 1.2
-            elif month in [6, 7, 8, 9]:  # Monsoon months
-                seasonal_factor = 0.7
-            
-            base_irradiation = 800 * time_factor * seasonal_factor
+        # Clear-sky irradiation for this latitude, day of year and minute
+        _, clear_sky = solar_tables.at(installation['lat'], installation['lon'], current_time)
+        if clear_sky > 0:
+            # Cloudier monsoon months (clear winter skies need no boost: the
+            # clear-sky model already follows the season)
+            seasonal_factor = 0.7 if month in [6, 7, 8, 9] else 1.0
             
             # Add weather variability
             weather_factor = random.uniform(0.6, 1.0)
-            irradiation = base_irradiation * weather_factor
+            irradiation = clear_sky * seasonal_factor * weather_factor
             
         else:
             irradiation = 0
@@ -120,8 +122,8 @@ class SolarDataSimulator:
     def send_telemetry_data(self, data):
         """Send telemetry data to the backend API"""
         try:
-            response = requests.post(
-                f"{self.base_url}/api/telemetry",
+            response = self.post_with_retry(
+                "/api/telemetry",
                 json=data,
                 headers={'Content-Type': 'application/json'},
                 timeout=10
@@ -138,6 +140,44 @@ class SolarDataSimulator:
             print(f"❌ Error sending telemetry: {str(e)}")
             return False
     
+    def post_with_retry(self, path, **kwargs):
+        """POST to the backend; a 429 is waited out for as long as its Retry-After asks and the same
+        body resent, so a backfill is slowed down by the rate limiter instead of losing readings"""
+        for _ in range(MAX_RATE_LIMIT_RETRIES):
+            response = requests.post(f"{self.base_url}{path}", **kwargs)
+            if response.status_code != 429:
+                return response
+            wait = float(response.headers.get('Retry-After', 1))
+            print(f"⏳ Rate limited ({response.json().get('scope')}), resending in {wait:.0f}s")
+            time.sleep(wait)
+        return response
+    
+    def send_telemetry_batch(self, readings):
+        """Send many readings to the batch endpoint, as JSON or compact binary"""
+        try:
+            if self.wire_format == 'binary':
+                body = wire.encode(readings, compress=True)
+                headers = {'Content-Type': wire.CONTENT_TYPE, 'Content-Encoding': 'gzip'}
+            else:
+                body = json.dumps(readings)
+                headers = {'Content-Type': 'application/json'}
+            response = self.post_with_retry("/api/telemetry/batch", data=body, headers=headers, timeout=60)
+            
+            if response.status_code == 201:
+                print(f"✅ Batch of {len(readings)} readings sent ({len(body)} bytes)")
+                return True
+            elif response.status_code == 413 and len(readings) > 1:
+                # Larger than a rate limit burst: send it in halves
+                half = len(readings) // 2
+                return self.send_telemetry_batch(readings[:half]) & self.send_telemetry_batch(readings[half:])
+            else:
+                print(f"❌ Error sending batch: {response.status_code} - {response.text}")
+                return False
+                
+        except Exception as e:
+            print(f"❌ Error sending telemetry batch: {str(e)}")
+            return False
+    
     def simulate_fault_conditions(self, data):
         """Simulate various fault conditions for testing alerts"""
         fault_type = random.choice(['normal', 'dust', 'temperature', 'inverter', 'shading'])
@@ -170,13 +210,13 @@ class SolarDataSimulator:
         print(f"📊 Sending data every {interval_seconds} seconds")
         print(f"🏭 Simulating {len(self.installations)} installations")
         
-        start_time = datetime.now()
+        start_time = datetime.utcnow()
         end_time = start_time + timedelta(minutes=duration_minutes)
         
         iteration = 0
         
-        while datetime.now() < end_time:
-            current_time = datetime.now()
+        while datetime.utcnow() < end_time:
+            current_time = datetime.utcnow()
             
             for installation in self.installations:
                 # Generate realistic data
@@ -198,14 +238,49 @@ class SolarDataSimulator:
         
         print(f"✅ Simulation completed! Sent data for {duration_minutes} minutes")
     
+    def run_gateway(self, duration_minutes=60, sample_seconds=5, window_seconds=900, spool_dir="gateway_spool",
+                    include_faults=True):
+        """Act as an edge gateway: sample every few seconds, upload window summaries (see gateway.py)"""
+        gateway = Gateway(spool_dir, base_url=self.base_url, window_seconds=window_seconds,
+                          sample_seconds=sample_seconds, wire_format=self.wire_format)
+        print(f"🛰️  Gateway mode for {duration_minutes} minutes: sampling every {sample_seconds}s, "
+              f"one summary per {window_seconds // 60} minutes per installation")
+        print(f"💾 Spooling to {spool_dir} ({len(gateway.spool.batches())} batches waiting from earlier runs)")
+        
+        end_time = datetime.utcnow() + timedelta(minutes=duration_minutes)
+        try:
+            while datetime.utcnow() < end_time:
+                current_time = datetime.utcnow()
+                for installation in self.installations:
+                    data = self.get_realistic_solar_data(installation, current_time)
+                    if include_faults and random.random() < 0.01:
+                        data = self.simulate_fault_conditions(data)
+                    gateway.add(data, current_time)
+                
+                uploaded = gateway.stats['uploaded_batches']
+                gateway.poll()
+                if gateway.stats['uploaded_batches'] > uploaded:
+                    print(f"✅ Uploaded {gateway.stats['uploaded_batches'] - uploaded} batches "
+                          f"({gateway.stats['uploaded_summaries']} summaries, {gateway.stats['uploaded_bytes']} bytes so far)")
+                time.sleep(sample_seconds)
+        except KeyboardInterrupt:
+            print("\n🛑 Gateway stopped by user")
+        
+        gateway.flush()
+        waiting = len(gateway.spool.batches())
+        print(f"✅ Gateway finished: {gateway.stats['samples']} samples → {gateway.stats['windows']} summaries"
+              + (f", {waiting} batches left in the spool for the next run" if waiting else ""))
+        print("ℹ️  Batches skip live scoring; run `flask --app app:create_app reprocess` for predictions and alerts")
+    
     def send_historical_data(self, days_back=7):
         """Generate and send historical data for ML model training"""
         print(f"📚 Generating {days_back} days of historical data...")
         
-        end_time = datetime.now()
+        end_time = datetime.utcnow()
         start_time = end_time - timedelta(days=days_back)
         
         current_time = start_time
+        batch = []
         
         while current_time < end_time:
             for installation in self.installations:
@@ -215,11 +290,21 @@ class SolarDataSimulator:
                 if random.random() < 0.05:  # 5% chance of issues
                     data = self.simulate_fault_conditions(data)
                 
-                self.send_telemetry_data(data)
+                if self.wire_format == 'binary':
+                    batch.append(data)
+                else:
+                    self.send_telemetry_data(data)
             
             # Move to next time point (every 15 minutes)
             current_time += timedelta(minutes=15)
+            
+            # One upload per simulated day (96 readings per site), like a gateway flushing its buffer
+            if batch and (len(batch) >= 96 * len(self.installations) or current_time >= end_time):
+                self.send_telemetry_batch(batch)
+                batch = []
         
+        if self.wire_format == 'binary':
+            print("ℹ️  Batches skip live scoring; run `flask --app app:create_app reprocess` for predictions and alerts")
         print(f"✅ Historical data generation completed!")
 
 def main():
@@ -230,11 +315,14 @@ def main():
     print("1. Send historical data (for ML training)")
     print("2. Start real-time simulation")
     print("3. Run both (recommended)")
+    print("4. Gateway mode (pre-aggregated window summaries)")
     
-    choice = input("\nEnter your choice (1-3): ").strip()
+    choice = input("\nEnter your choice (1-4): ").strip()
     
     if choice == "1":
         days = int(input("Enter number of days of historical data (default 3): ") or "3")
+        if (input("Send as compact binary batches? (y/N): ").strip().lower() or "n") == "y":
+            simulator.wire_format = "binary"
         simulator.send_historical_data(days_back=days)
         
     elif choice == "2":
@@ -250,6 +338,12 @@ def main():
         time.sleep(2)
         simulator.run_simulation(duration_minutes=30, interval_seconds=15)
         
+    elif choice == "4":
+        duration = int(input("Enter gateway duration in minutes (default 60): ") or "60")
+        sample = int(input("Enter sampling interval in seconds (default 5): ") or "5")
+        window = int(input("Enter summary window in minutes (default 15): ") or "15")
+        simulator.run_gateway(duration_minutes=duration, sample_seconds=sample, window_seconds=window * 60)
+        
     else:
         print("Invalid choice!")
 
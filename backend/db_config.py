@@ -0,0 +1,105 @@
+import logging
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool
+
+from metrics import DB_CONNECTIONS_OPENED, DB_POOL_CONNECTIONS, DB_POOL_SATURATION
+
+logger = logging.getLogger(__name__)
+
+
+def _env_flag(name, default=False):
+    return os.getenv(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def engine_options(database_url):
+    """SQLALCHEMY_ENGINE_OPTIONS for ``database_url``, tuned from the environment.
+
+    PostgreSQL gets a bounded QueuePool with pre-ping and recycling plus a
+    server-side statement timeout. Behind PgBouncer in transaction mode
+    (``DB_PGBOUNCER=true``) startup parameters are not allowed, so the timeout
+    is applied per transaction instead (see ``configure_engine``), and
+    ``DB_POOL_SIZE=0`` hands pooling to PgBouncer entirely. SQLite waits on
+    locks (``busy timeout``) instead of failing with "database is locked".
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == 'sqlite':
+        return {'connect_args': {
+            'timeout': float(os.getenv('SQLITE_BUSY_TIMEOUT_S', '30')),
+            'check_same_thread': False
+        }}
+
+    options = {
+        'pool_pre_ping': _env_flag('DB_POOL_PRE_PING', True),
+        'pool_recycle': int(os.getenv('DB_POOL_RECYCLE_S', '1800')),
+        'connect_args': {'application_name': os.getenv('DB_APPLICATION_NAME', 'solar-backend')}
+    }
+    pool_size = int(os.getenv('DB_POOL_SIZE', '5'))
+    if pool_size == 0:
+        options['poolclass'] = NullPool
+    else:
+        options.update({
+            'pool_size': pool_size,
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '5')),
+            'pool_timeout': float(os.getenv('DB_POOL_TIMEOUT_S', '30'))
+        })
+
+    statement_timeout_ms = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))
+    if url.get_backend_name() == 'postgresql' and statement_timeout_ms and not _env_flag('DB_PGBOUNCER'):
+        options['connect_args']['options'] = f'-c statement_timeout={statement_timeout_ms}'
+    return options
+
+
+def configure_engine(engine):
+    """Attach per-connection settings and pool metrics to ``engine``"""
+    backend = engine.url.get_backend_name()
+
+    if backend == 'sqlite' and engine.url.database not in (None, '', ':memory:'):
+        journal_mode = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+        synchronous = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+        busy_timeout_ms = int(float(os.getenv('SQLITE_BUSY_TIMEOUT_S', '30')) * 1000)
+
+        # WAL lets readers run alongside the single writer; NORMAL only
+        # fsyncs at checkpoints, which is safe in WAL mode
+        @event.listens_for(engine, 'connect')
+        def _sqlite_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+            cursor.execute(f'PRAGMA synchronous={synchronous}')
+            cursor.execute(f'PRAGMA busy_timeout={busy_timeout_ms}')
+            cursor.close()
+
+    statement_timeout_ms = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '30000'))
+    if backend == 'postgresql' and _env_flag('DB_PGBOUNCER') and statement_timeout_ms:
+        # SET LOCAL is scoped to the transaction, so it cannot leak to other
+        # clients sharing the server connection through PgBouncer
+        @event.listens_for(engine, 'begin')
+        def _statement_timeout(conn):
+            conn.exec_driver_sql(f'SET LOCAL statement_timeout = {statement_timeout_ms}')
+
+    pool = engine.pool
+    # QueuePool only; max_overflow < 0 means unbounded, so no saturation ratio
+    capacity = 0
+    if hasattr(pool, 'size') and getattr(pool, '_max_overflow', -1) >= 0:
+        capacity = pool.size() + pool._max_overflow
+
+    def _report_pool(*args):
+        checked_out = pool.checkedout()
+        DB_POOL_CONNECTIONS.set(checked_out, state='checked_out')
+        DB_POOL_CONNECTIONS.set(pool.checkedin(), state='idle')
+        DB_POOL_CONNECTIONS.set(max(pool.overflow(), 0), state='overflow')
+        if capacity > 0:
+            DB_POOL_SATURATION.set(checked_out / capacity)
+
+    if all(hasattr(pool, name) for name in ('checkedout', 'checkedin', 'overflow')):
+        event.listen(engine, 'checkout', _report_pool)
+        event.listen(engine, 'checkin', _report_pool)
+
+    @event.listens_for(engine, 'connect')
+    def _count_connection(dbapi_connection, connection_record):
+        DB_CONNECTIONS_OPENED.inc()
+
+    logger.info(f"Database engine configured: {backend}, pool {type(pool).__name__}"
+                + (f" (size {pool.size()}, capacity {capacity})" if capacity else ''))
@@ -0,0 +1,364 @@
+import json
+import logging
+import os
+import threading
+import warnings
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from urllib.parse import quote
+
+import numpy as np
+from sqlalchemy import func
+
+from models import db, TelemetryData
+from solar_geometry import EQUATION_OF_TIME, solar_tables
+
+try:
+    import fcntl
+except ImportError:  # Windows: only threads within one process are serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Same derating as the alert system's expected-power formula
+PERFORMANCE_FACTOR = 0.85
+
+RAW_COLUMNS = [
+    'irradiation_wm2', 'module_temp_c', 'ambient_temp_c', 'wind_speed_ms', 'humidity_percent',
+    'dust_level', 'inverter_efficiency'
+]
+
+# Windows over previous readings (1 h and 3 h at 15-minute sampling). Power
+# features only look backwards so the current reading's power never leaks in.
+ROLLING_WINDOWS = (4, 12)
+LAGS = (1, 4)
+HISTORY = max(ROLLING_WINDOWS + LAGS)
+
+FEATURE_COLUMNS = RAW_COLUMNS + [
+    'cos_zenith', 'clear_sky_index', 'solar_hour_sin', 'solar_hour_cos', 'day_of_year_sin', 'day_of_year_cos'
+] + [f'power_lag_{lag}' for lag in LAGS] + [
+    f'power_{stat}_{window}' for window in ROLLING_WINDOWS for stat in ('mean', 'max')
+] + [f'irradiation_mean_{window}' for window in ROLLING_WINDOWS]
+
+TARGET_COLUMNS = ['pv_power_kw', 'efficiency']
+
+# Columns carried between materializations to seed the rolling windows
+HISTORY_COLUMNS = ['pv_power_kw', 'irradiation_wm2']
+
+# Segments per installation before they are merged into one file
+MAX_SEGMENTS = 32
+
+# Telemetry rows read from the database per materialized segment
+SYNC_CHUNK_ROWS = 50000
+
+
+def raw_columns(rows):
+    """Column arrays (plus ids and timestamps) from TelemetryData rows"""
+    columns = {name: np.array([getattr(row, name) or 0.0 for row in rows], dtype=float)
+               for name in RAW_COLUMNS + ['pv_power_kw']}
+    columns['id'] = np.array([row.id or 0 for row in rows], dtype=np.int64)
+    columns['timestamp'] = np.array([row.timestamp for row in rows], dtype='datetime64[m]')
+    return columns
+
+
+def _backward_windows(values, history, size):
+    """[n, size] matrix of the ``size`` values before each element (NaN where unknown)"""
+    padded = np.concatenate([np.full(size, np.nan), history, values])[-(len(values) + size):]
+    return np.lib.stride_tricks.sliding_window_view(padded, size)[:len(values)]
+
+
+def compute_features(raw, history, installation):
+    """Feature and target columns for a chronologically ordered block of readings.
+
+    ``history`` holds the ``HISTORY_COLUMNS`` values of the readings before
+    the block (oldest first, possibly empty), so features come out the same
+    whether the block is materialized in one go or row by row.
+    """
+    features = {name: raw[name] for name in RAW_COLUMNS}
+
+    cos_zenith, clear_sky = solar_tables.lookup(installation.latitude, installation.longitude, raw['timestamp'])
+    features['cos_zenith'] = cos_zenith.astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # Capped where a low sun makes the ratio noisy
+        features['clear_sky_index'] = np.clip(
+            np.where(clear_sky > 10, raw['irradiation_wm2'] / clear_sky.astype(float), 0.0), 0, 1.5)
+
+    day = (raw['timestamp'].astype('datetime64[D]') - raw['timestamp'].astype('datetime64[Y]')).astype(int)
+    minutes = (raw['timestamp'] - raw['timestamp'].astype('datetime64[D]')).astype(int)
+    solar_hour = (minutes / 60 + installation.longitude / 15 + EQUATION_OF_TIME[day] / 60) % 24
+    features['solar_hour_sin'] = np.sin(2 * np.pi * solar_hour / 24)
+    features['solar_hour_cos'] = np.cos(2 * np.pi * solar_hour / 24)
+    features['day_of_year_sin'] = np.sin(2 * np.pi * day / 365.25)
+    features['day_of_year_cos'] = np.cos(2 * np.pi * day / 365.25)
+
+    power_history = np.asarray(history.get('pv_power_kw', []), dtype=float)
+    irradiation_history = np.asarray(history.get('irradiation_wm2', []), dtype=float)
+    power_windows = _backward_windows(raw['pv_power_kw'], power_history, HISTORY)
+    irradiation_windows = _backward_windows(raw['irradiation_wm2'], irradiation_history, HISTORY)
+    with warnings.catch_warnings():
+        # All-NaN windows are expected before an installation has history
+        warnings.simplefilter('ignore', RuntimeWarning)
+        for lag in LAGS:
+            features[f'power_lag_{lag}'] = power_windows[:, HISTORY - lag]
+        for window in ROLLING_WINDOWS:
+            features[f'power_mean_{window}'] = np.nanmean(power_windows[:, -window:], axis=1)
+            features[f'power_max_{window}'] = np.nanmax(power_windows[:, -window:], axis=1)
+            features[f'irradiation_mean_{window}'] = np.nanmean(irradiation_windows[:, -window:], axis=1)
+    # A new installation has no history yet; estimators need finite values
+    for name in FEATURE_COLUMNS:
+        features[name] = np.nan_to_num(np.asarray(features[name], dtype=float), nan=0.0)
+
+    theoretical = raw['irradiation_wm2'] / 1000 * installation.capacity_kw * PERFORMANCE_FACTOR
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features['efficiency'] = np.where(theoretical > 0, raw['pv_power_kw'] / theoretical, 0.0)
+    features['pv_power_kw'] = raw['pv_power_kw']
+    features['id'] = raw['id']
+    features['timestamp'] = raw['timestamp']
+    return features
+
+
+def feature_matrix(features):
+    return np.column_stack([features[name] for name in FEATURE_COLUMNS])
+
+
+class FeatureStore:
+    """Per-installation columnar store of derived features, appended incrementally.
+
+    Each materialization reads only telemetry newer than the last reading
+    stored, computes its features against the carried-over rolling history
+    and writes them as one ``.npz`` segment (one array per column). Late
+    readings and corrections rewind the store to the oldest affected time
+    instead (see ``sync``). Training reads the concatenated columns back
+    instead of recomputing from raw telemetry. Loaded columns are cached per
+    process and extended with new segments only.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self._columns = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def _root(self):
+        return self.directory or os.getenv('FEATURE_STORE_DIR', 'feature_store')
+
+    def _path(self, installation_id, name=''):
+        return os.path.join(self._root(), quote(str(installation_id), safe=''), name)
+
+    @contextmanager
+    def _locked(self, installation_id):
+        """Serialize writers of one installation across threads and (via flock) processes"""
+        with self._lock:
+            lock = self._locks.setdefault(installation_id, threading.Lock())
+        with lock:
+            os.makedirs(self._path(installation_id), exist_ok=True)
+            with open(self._path(installation_id, '.lock'), 'w') as f:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                yield
+
+    def state(self, installation_id):
+        try:
+            with open(self._path(installation_id, 'state.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'last_id': 0, 'last_timestamp': None, 'rows': 0, 'segments': [],
+                    'history': {name: [] for name in HISTORY_COLUMNS}}
+
+    def _write_state(self, installation_id, state):
+        path = self._path(installation_id, 'state.json')
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(state, f)
+        os.replace(temporary, path)
+
+    def _write_segment(self, installation_id, name, features):
+        path = self._path(installation_id, name)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez(f, **{column: features[column] for column in self._stored_columns()})
+        os.replace(temporary, path)
+
+    @staticmethod
+    def _next_segment(state):
+        state['next_segment'] = state.get('next_segment', 0) + 1
+        return f"segment_{state['next_segment']:06d}.npz"
+
+    @staticmethod
+    def _stored_columns():
+        return ['id', 'timestamp'] + FEATURE_COLUMNS + TARGET_COLUMNS
+
+    def materialize(self, installation, rows):
+        """Append features for ``rows`` (TelemetryData of ``installation``, any order).
+
+        Rows not newer than the last stored reading are skipped. Returns the
+        number of rows appended.
+        """
+        if not rows:
+            return 0
+        with self._locked(installation.id):
+            state = self.state(installation.id)
+            last = state.get('last_timestamp')
+            if last is not None:
+                last = datetime.fromisoformat(last)
+                rows = [row for row in rows if row.timestamp > last]
+            rows = sorted(rows, key=lambda row: (row.timestamp, row.id))
+            if not rows:
+                return 0
+            raw = raw_columns(rows)
+            features = compute_features(raw, state['history'], installation)
+
+            segment = self._next_segment(state)
+            self._write_segment(installation.id, segment, features)
+            state['segments'].append(segment)
+            state['last_id'] = max(state['last_id'], int(raw['id'].max()))
+            state['last_timestamp'] = rows[-1].timestamp.isoformat()
+            state['rows'] += len(rows)
+            state['history'] = {
+                name: (state['history'][name] + raw[name].tolist())[-HISTORY:] for name in HISTORY_COLUMNS
+            }
+            if len(state['segments']) > MAX_SEGMENTS:
+                self._compact(installation.id, state)
+            self._write_state(installation.id, state)
+            return len(rows)
+
+    def sync(self, installation):
+        """Materialize every telemetry row of ``installation`` not yet in the store.
+
+        Rows are appended in timestamp order. A late reading (an id above
+        every stored one but older than the newest stored reading) or a
+        ``rewind`` first drops the stored features from that time on, so the
+        lags and rolling windows are rebuilt over the readings that really
+        preceded each row.
+        """
+        since = self._rewind_from(installation.id)
+        if since is not None:
+            self._truncate(installation.id, since)
+        total = 0
+        while True:
+            last = self.state(installation.id).get('last_timestamp')
+            query = TelemetryData.query.filter(TelemetryData.installation_id == installation.id)
+            if last is not None:
+                query = query.filter(TelemetryData.timestamp > datetime.fromisoformat(last))
+            rows = query.order_by(TelemetryData.timestamp, TelemetryData.id).limit(SYNC_CHUNK_ROWS).all()
+            total += self.materialize(installation, rows)
+            if len(rows) < SYNC_CHUNK_ROWS:
+                return total
+
+    def rewind(self, installation_id, since):
+        """Rebuild features from ``since`` on at the next sync (stored readings were corrected)"""
+        with self._locked(installation_id):
+            state = self.state(installation_id)
+            if not state['rows']:
+                return
+            current = state.get('rewind_from')
+            if current is None or since < datetime.fromisoformat(current):
+                state['rewind_from'] = since.isoformat()
+                self._write_state(installation_id, state)
+
+    def _rewind_from(self, installation_id):
+        """Oldest time the stored features are stale from, or None"""
+        state = self.state(installation_id)
+        if not state['rows']:
+            return None
+        if state.get('last_timestamp') is None:
+            # Stores written before last_timestamp was tracked only know the last id
+            last = db.session.query(func.max(TelemetryData.timestamp)).filter(
+                TelemetryData.installation_id == installation_id, TelemetryData.id <= state['last_id']).scalar()
+            if last is None:
+                return None
+            with self._locked(installation_id):
+                state = self.state(installation_id)
+                state['last_timestamp'] = last.isoformat()
+                self._write_state(installation_id, state)
+        late = db.session.query(func.min(TelemetryData.timestamp)).filter(
+            TelemetryData.installation_id == installation_id, TelemetryData.id > state['last_id'],
+            TelemetryData.timestamp <= datetime.fromisoformat(state['last_timestamp'])).scalar()
+        requested = state.get('rewind_from')
+        candidates = [late, datetime.fromisoformat(requested) if requested else None]
+        return min((since for since in candidates if since is not None), default=None)
+
+    def _truncate(self, installation_id, since):
+        """Drop the stored features from ``since`` on; the next materialization continues from there"""
+        # Stored timestamps have minute resolution, so cut at the minute
+        since = since.replace(second=0, microsecond=0)
+        with self._locked(installation_id):
+            state = self.state(installation_id)
+            kept = None
+            if state['segments']:
+                columns = self._read_segments(installation_id, state['segments'])
+                order = np.argsort(columns['timestamp'], kind='stable')
+                keep = order[columns['timestamp'][order] < np.datetime64(since, 'm')]
+                kept = {name: values[keep] for name, values in columns.items()} if len(keep) else None
+            for old in state['segments']:
+                os.remove(self._path(installation_id, old))
+            state['segments'] = []
+            if kept is not None:
+                segment = self._next_segment(state)
+                self._write_segment(installation_id, segment, kept)
+                state['segments'] = [segment]
+            state['rows'] = 0 if kept is None else len(kept['id'])
+            state['history'] = {name: [] if kept is None else kept[name][-HISTORY:].tolist()
+                                for name in HISTORY_COLUMNS}
+            # Everything from since on is read again
+            state['last_timestamp'] = None if kept is None else (since - timedelta(microseconds=1)).isoformat()
+            state.pop('rewind_from', None)
+            self._write_state(installation_id, state)
+            self._columns.pop(installation_id, None)
+
+    def _compact(self, installation_id, state):
+        """Merge every segment into one so reads stay a handful of file opens"""
+        columns = self._read_segments(installation_id, state['segments'])
+        segment = self._next_segment(state)
+        self._write_segment(installation_id, segment, columns)
+        for old in state['segments']:
+            os.remove(self._path(installation_id, old))
+        state['segments'] = [segment]
+        self._columns.pop(installation_id, None)
+
+    def _read_segments(self, installation_id, segments):
+        parts = []
+        for segment in segments:
+            with np.load(self._path(installation_id, segment)) as data:
+                parts.append({column: data[column] for column in data.files})
+        return {column: np.concatenate([part[column] for part in parts]) for column in self._stored_columns()}
+
+    def columns(self, installation_id):
+        """All stored columns for one installation, in materialization order"""
+        state = self.state(installation_id)
+        cached = self._columns.get(installation_id)
+        if cached and cached['segments'] == state['segments']:
+            return cached['columns']
+        if not state['segments']:
+            return None
+
+        try:
+            if cached and state['segments'][:len(cached['segments'])] == cached['segments']:
+                new = self._read_segments(installation_id, state['segments'][len(cached['segments']):])
+                columns = {name: np.concatenate([cached['columns'][name], new[name]]) for name in new}
+            else:
+                columns = self._read_segments(installation_id, state['segments'])
+        except FileNotFoundError:
+            # Another process compacted the segments after we read the state
+            state = self.state(installation_id)
+            columns = self._read_segments(installation_id, state['segments'])
+        self._columns[installation_id] = {'segments': list(state['segments']), 'columns': columns}
+        return columns
+
+    def training_matrix(self, installation_id, limit=None):
+        """``(X, y_power, y_efficiency)`` for the latest ``limit`` materialized readings"""
+        columns = self.columns(installation_id)
+        if columns is None:
+            return None
+        order = np.argsort(columns['timestamp'], kind='stable')
+        if limit:
+            order = order[-limit:]
+        return (feature_matrix(columns)[order], columns['pv_power_kw'][order], columns['efficiency'][order])
+
+    def clear(self, installation_id):
+        import shutil
+        shutil.rmtree(self._path(installation_id), ignore_errors=True)
+        self._columns.pop(installation_id, None)
+
+
+feature_store = FeatureStore()
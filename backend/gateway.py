@@ -0,0 +1,337 @@
+import glob
+import json
+import logging
+import os
+import time
+import zlib
+from datetime import datetime, timedelta
+
+import wire
+from bulk_load import MEASUREMENT_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Edge pre-aggregation: a gateway samples its installations every few seconds,
+# folds the samples into fixed windows (15 minutes by default, the backend's
+# usual reading interval) and uploads one summary reading per installation and
+# window to POST /api/telemetry/batch, so ingest volume drops by the number of
+# samples per window.
+#
+# A summary is an ordinary reading stamped with its window's start: the
+# measurements are window means, except pv_power_kw, which is the
+# time-weighted mean (window energy / time covered), so energy the backend
+# derives from the summaries matches what the samples integrate to. JSON
+# uploads also carry samples, energy_kwh and per-measurement min / max.
+DEFAULT_WINDOW_SECONDS = 900
+
+DEFAULT_SAMPLE_SECONDS = 5
+
+# A gap longer than this many sample intervals is treated as downtime, not production
+MAX_GAP_SAMPLES = 3
+
+# Sealed batches kept on disk while offline (oldest are dropped beyond this)
+DEFAULT_MAX_BATCHES = 10000
+
+# Upload retry backoff after a failure, doubling up to the maximum
+RETRY_MIN_SECONDS = 5
+RETRY_MAX_SECONDS = 300
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+class WindowAggregate:
+    """Running min / mean / max and energy of one installation's window, in O(1) memory"""
+
+    __slots__ = ('installation_id', 'start', 'samples', 'seconds', 'energy_kwh', 'counts', 'sums', 'mins', 'maxs')
+
+    def __init__(self, installation_id, start):
+        self.installation_id = installation_id
+        self.start = start
+        self.samples = 0
+        self.seconds = 0.0
+        self.energy_kwh = 0.0
+        self.counts = dict.fromkeys(MEASUREMENT_COLUMNS, 0)
+        self.sums = dict.fromkeys(MEASUREMENT_COLUMNS, 0.0)
+        self.mins = {}
+        self.maxs = {}
+
+    def add(self, reading, seconds):
+        """Fold in one sample that stands for the ``seconds`` leading up to it"""
+        self.samples += 1
+        self.seconds += seconds
+        self.energy_kwh += float(reading['pv_power_kw']) * seconds / 3600
+        for name in MEASUREMENT_COLUMNS:
+            value = reading.get(name)
+            if value is None:
+                continue
+            value = float(value)
+            self.counts[name] += 1
+            self.sums[name] += value
+            if name not in self.mins or value < self.mins[name]:
+                self.mins[name] = value
+            if name not in self.maxs or value > self.maxs[name]:
+                self.maxs[name] = value
+
+    def summary(self, window_seconds):
+        """The window as a reading for /api/telemetry/batch, plus its summary fields"""
+        reading = {'installation_id': self.installation_id, 'timestamp': self.start.isoformat()}
+        for name in MEASUREMENT_COLUMNS:
+            if self.counts[name]:
+                reading[name] = round(self.sums[name] / self.counts[name], 4)
+        hours = self.seconds / 3600
+        reading['pv_power_kw'] = round(self.energy_kwh / hours, 4) if hours > 0 else 0.0
+        reading.update({
+            'window_seconds': window_seconds,
+            'samples': self.samples,
+            'energy_kwh': round(self.energy_kwh, 6),
+            'min': {name: round(value, 4) for name, value in self.mins.items()},
+            'max': {name: round(value, 4) for name, value in self.maxs.items()}
+        })
+        return reading
+
+
+class Spool:
+    """Window summaries waiting for upload, on disk so an offline gateway loses nothing.
+
+    Closed windows are appended (and fsynced) to ``open.jsonl``; ``seal``
+    renames it to the next numbered batch file. Batches are uploaded oldest
+    first and deleted once the backend has them. An ``open.jsonl`` left by a
+    crash is sealed on start-up.
+    """
+
+    OPEN_FILE = 'open.jsonl'
+
+    def __init__(self, directory, max_batches=DEFAULT_MAX_BATCHES):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_batches = max_batches
+        self.pending = 0
+        # Numbering continues after set-aside batches too, so none is ever overwritten
+        numbers = [int(os.path.basename(path).split('-')[1][:-6])
+                   for path in glob.glob(os.path.join(directory, '*-*.jsonl'))]
+        self._next = max(numbers, default=0) + 1
+        if os.path.exists(self._open_path):
+            self.pending = len(self.read(self._open_path))
+            self.seal()
+
+    @property
+    def _open_path(self):
+        return os.path.join(self.directory, self.OPEN_FILE)
+
+    def append(self, summary):
+        with open(self._open_path, 'a') as f:
+            f.write(json.dumps(summary) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        self.pending += 1
+
+    def seal(self):
+        """Turn the open summaries into a batch file; returns its path (None when there were none)"""
+        if not os.path.exists(self._open_path):
+            return None
+        if not self.pending:
+            os.remove(self._open_path)
+            return None
+        path = os.path.join(self.directory, f'batch-{self._next:010d}.jsonl')
+        os.replace(self._open_path, path)
+        self._next += 1
+        self.pending = 0
+
+        batches = self.batches()
+        if len(batches) > self.max_batches:
+            dropped = batches[:len(batches) - self.max_batches]
+            for old in dropped:
+                os.remove(old)
+            logger.warning(f"Spool full, dropped the {len(dropped)} oldest batches")
+        return path
+
+    def batches(self):
+        """Sealed batch files, oldest first"""
+        return sorted(glob.glob(os.path.join(self.directory, 'batch-*.jsonl')))
+
+    @staticmethod
+    def read(path):
+        summaries = []
+        with open(path) as f:
+            for line in f:
+                try:
+                    summaries.append(json.loads(line))
+                except ValueError:
+                    # A torn last line from a crash mid-append
+                    logger.warning(f"Skipping unreadable spool line in {path}")
+        return summaries
+
+    def reject(self, path, summaries=None):
+        """Set aside a batch the backend will never accept, so later batches can go through.
+
+        With ``summaries``, only those are kept in the rejected file and the batch is removed.
+        """
+        rejected = os.path.join(self.directory, 'rejected-' + os.path.basename(path)[6:])
+        if summaries is None:
+            os.replace(path, rejected)
+            return
+        with open(rejected, 'w') as f:
+            f.writelines(json.dumps(summary) + '\n' for summary in summaries)
+            f.flush()
+            os.fsync(f.fileno())
+        os.remove(path)
+
+
+class Gateway:
+    """Pre-aggregating telemetry client: samples in, spooled window summaries out.
+
+    Call ``add`` for every sample and ``poll`` regularly (e.g. once per
+    sampling round). ``poll`` closes windows that have ended, seals the
+    spool every ``upload_seconds`` and uploads sealed batches in order; a
+    failed upload is retried with backoff and, once the backend is
+    reachable again, the backlog is replayed oldest first. Re-sending a
+    batch is safe because ingest skips readings it already has.
+    """
+
+    def __init__(self, spool_dir, base_url='http://localhost:5000', window_seconds=DEFAULT_WINDOW_SECONDS,
+                 sample_seconds=DEFAULT_SAMPLE_SECONDS, upload_seconds=None, wire_format='json',
+                 tenant_id=None, max_batches=DEFAULT_MAX_BATCHES):
+        self.base_url = base_url
+        self.window_seconds = window_seconds
+        self.sample_seconds = sample_seconds
+        self.upload_seconds = upload_seconds or window_seconds
+        # 'binary' uploads the means only (see wire.py); 'json' keeps the summary fields
+        self.wire_format = wire_format
+        self.tenant_id = tenant_id
+        self.spool = Spool(spool_dir, max_batches)
+        self.windows = {}
+        self.last_sample = {}
+        self.stats = {'samples': 0, 'late_samples': 0, 'windows': 0, 'uploaded_batches': 0,
+                      'uploaded_summaries': 0, 'uploaded_bytes': 0, 'rejected_batches': 0}
+        self._next_seal = None
+        self._retry_at = 0.0
+        self._retry_delay = RETRY_MIN_SECONDS
+
+    def window_start(self, timestamp):
+        seconds = int((timestamp - _EPOCH).total_seconds())
+        return _EPOCH + timedelta(seconds=seconds - seconds % self.window_seconds)
+
+    def add(self, reading, timestamp=None):
+        """Fold one sample (a reading dict as posted to /api/telemetry) into its window"""
+        timestamp = timestamp or reading.get('timestamp') or datetime.utcnow()
+        if not isinstance(timestamp, datetime):
+            timestamp = datetime.fromisoformat(str(timestamp))
+        installation_id = str(reading['installation_id'])
+
+        previous = self.last_sample.get(installation_id)
+        if previous is not None and timestamp <= previous:
+            self.stats['late_samples'] += 1
+            return
+        start = self.window_start(timestamp)
+        window = self.windows.get(installation_id)
+        if window is not None and window.start != start:
+            self._close(window)
+            window = None
+        if window is None:
+            if self._next_seal is None:
+                self._next_seal = start + timedelta(seconds=self.upload_seconds)
+            window = self.windows[installation_id] = WindowAggregate(installation_id, start)
+
+        if previous is None:
+            seconds = self.sample_seconds
+        else:
+            seconds = min((timestamp - previous).total_seconds(), MAX_GAP_SAMPLES * self.sample_seconds)
+        self.last_sample[installation_id] = timestamp
+        window.add(reading, seconds)
+        self.stats['samples'] += 1
+
+    def _close(self, window):
+        self.spool.append(window.summary(self.window_seconds))
+        del self.windows[window.installation_id]
+        self.stats['windows'] += 1
+
+    def poll(self, now=None, upload=True):
+        """Close ended windows, seal the spool when an upload is due and upload what is sealed"""
+        now = now or datetime.utcnow()
+        for window in list(self.windows.values()):
+            if now >= window.start + timedelta(seconds=self.window_seconds):
+                self._close(window)
+        if self._next_seal is not None and now >= self._next_seal:
+            self.spool.seal()
+            self._next_seal = self.window_start(now) + timedelta(seconds=self.upload_seconds)
+        if upload:
+            self.upload()
+
+    def flush(self):
+        """Close every open window and upload everything spooled (e.g. on shutdown)"""
+        for window in list(self.windows.values()):
+            self._close(window)
+        self.spool.seal()
+        self._retry_at = 0.0
+        return self.upload()
+
+    def upload(self):
+        """Upload sealed batches oldest first; stops at the first failure. Returns batches uploaded."""
+        if time.monotonic() < self._retry_at:
+            return 0
+        uploaded = 0
+        for path in self.spool.batches():
+            summaries = self.spool.read(path)
+            status, retry_after, unknown = self._post(summaries) if summaries else (201, None, [])
+            if status == 201:
+                if unknown:
+                    # The backend loaded the other installations' summaries and skipped these
+                    logger.error(f"Backend does not know installations {', '.join(unknown)}; setting their "
+                                 f"summaries from {os.path.basename(path)} aside")
+                    unknown = set(unknown)
+                    self.spool.reject(path, [summary for summary in summaries
+                                             if summary['installation_id'] in unknown])
+                    self.stats['rejected_batches'] += 1
+                else:
+                    os.remove(path)
+                uploaded += 1
+                self.stats['uploaded_batches'] += 1
+                self.stats['uploaded_summaries'] += len(summaries)
+                self._retry_delay = RETRY_MIN_SECONDS
+            elif status in (400, 413):
+                # Retrying cannot help (unknown installation, malformed or oversized batch)
+                logger.error(f"Backend rejected spooled batch {os.path.basename(path)} ({status}), setting it aside")
+                self.spool.reject(path)
+                self.stats['rejected_batches'] += 1
+            else:
+                delay = retry_after or self._retry_delay
+                self._retry_delay = min(self._retry_delay * 2, RETRY_MAX_SECONDS)
+                self._retry_at = time.monotonic() + delay
+                logger.warning(f"Upload failed ({status}), {len(self.spool.batches())} batches spooled; "
+                               f"retrying in {delay:.0f}s")
+                break
+        return uploaded
+
+    def _post(self, summaries):
+        """``(status code, Retry-After seconds, installations the backend skipped as unknown)``.
+
+        Status is None when the backend is unreachable.
+        """
+        import requests
+
+        if self.wire_format == 'binary':
+            body = wire.encode(summaries, compress=True)
+            headers = {'Content-Type': wire.CONTENT_TYPE}
+        else:
+            body = zlib.compress(json.dumps(summaries).encode(), wbits=31)
+            headers = {'Content-Type': 'application/json'}
+        headers['Content-Encoding'] = 'gzip'
+        if self.tenant_id:
+            headers['X-Tenant-ID'] = self.tenant_id
+        try:
+            response = requests.post(f"{self.base_url}/api/telemetry/batch", data=body, headers=headers,
+                                     timeout=60)
+        except Exception as e:
+            logger.warning(f"Backend unreachable: {str(e)}")
+            return None, None, []
+        unknown = []
+        if response.status_code == 201:
+            self.stats['uploaded_bytes'] += len(body)
+            try:
+                unknown = response.json().get('unknown_installations') or []
+            except ValueError:
+                pass
+        elif response.status_code in (400, 413):
+            logger.error(f"Batch upload refused: {response.text[:500]}")
+        retry_after = response.headers.get('Retry-After')
+        return response.status_code, float(retry_after) if retry_after else None, unknown
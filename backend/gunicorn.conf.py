@@ -0,0 +1,64 @@
+# Gunicorn configuration for the Solar Energy Management System backend
+#
+#   gunicorn -c gunicorn.conf.py wsgi:application
+#
+# Every value can be overridden through the environment.
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', f"0.0.0.0:{os.getenv('PORT', '5000')}")
+
+# Ingest and prediction are CPU bound (sklearn), so one process per core gets
+# past the GIL; a few threads per worker cover the time spent waiting on the
+# database and external APIs (OpenAI, OpenWeatherMap).
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+# Each worker owns a DB pool (DB_POOL_SIZE + DB_MAX_OVERFLOW, see db_config.py);
+# keep workers * (pool size + overflow) under the server's max_connections.
+
+# Report generation waits on the OpenAI API
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+# Recycle workers periodically to bound memory growth from cached models
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '5000'))
+max_requests_jitter = 500
+
+# Load the app in each worker (not the master) so every worker opens its own
+# DB connections and pre-warms before it is handed connections.
+preload_app = False
+
+accesslog = '-'
+errorlog = '-'
+loglevel = os.getenv('LOG_LEVEL', 'info')
+
+
+# Every worker has its own metrics registry; with METRICS_MULTIPROC_DIR set
+# they share snapshots there and /metrics on any worker reports the sum (see
+# metrics.py). The master wipes it on start and archives exited workers.
+metrics_dir = os.getenv('METRICS_MULTIPROC_DIR')
+
+
+def on_starting(server):
+    """Create tables once in the master, before any worker is forked"""
+    from app import create_app, create_tables, db
+
+    if metrics_dir:
+        from metrics import clear_multiprocess_dir
+        clear_multiprocess_dir(metrics_dir)
+
+    app = create_app()
+    create_tables(app)
+    with app.app_context():
+        # Never hand pooled connections down to forked workers
+        db.engine.dispose()
+
+
+def child_exit(server, worker):
+    """Keep a recycled or killed worker's counters in the /metrics totals"""
+    if metrics_dir:
+        from metrics import mark_process_dead
+        mark_process_dead(metrics_dir, worker.pid)
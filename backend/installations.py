@@ -0,0 +1,242 @@
+import csv
+import io
+import json
+from datetime import datetime
+
+from sqlalchemy import insert, update
+
+from models import SolarInstallation
+
+DEFAULT_CLIMATIC_ZONE = 'tropical'
+DEFAULT_TENANT = 'default'
+
+# Listing defaults; per_page is capped so one request cannot pull the whole fleet
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Existing-id lookups and bulk statements are issued in chunks of this size
+BULK_CHUNK_SIZE = 500
+
+# field -> (type, required, max length)
+FIELDS = {
+    'id': (str, True, 50),
+    'name': (str, True, 100),
+    'location': (str, True, 100),
+    'latitude': (float, True, None),
+    'longitude': (float, True, None),
+    'capacity_kw': (float, True, None),
+    'panel_count': (int, True, None),
+    'climatic_zone': (str, False, 50),
+    'tenant_id': (str, False, 50),
+    'installation_date': (datetime, False, None)
+}
+
+RANGES = {
+    'latitude': (-90, 90),
+    'longitude': (-180, 180)
+}
+
+POSITIVE = ['capacity_kw', 'panel_count']
+
+TYPE_NAMES = {str: 'text', float: 'a number', int: 'a whole number', datetime: 'an ISO 8601 date'}
+
+
+def _coerce(value, kind):
+    if kind is str:
+        return str(value).strip()
+    if kind is datetime:
+        return value if isinstance(value, datetime) else datetime.fromisoformat(str(value).strip())
+    if kind is int:
+        number = float(value)
+        if not number.is_integer():
+            raise ValueError('must be a whole number')
+        return int(number)
+    return float(value)
+
+
+def validate_installation(record, partial=False, current_id=None):
+    """Check and coerce one installation record.
+
+    Returns ``(clean, errors)``. With ``partial`` only the fields present are
+    checked, as for an update of installation ``current_id``; an ``id``
+    repeating ``current_id`` is accepted and dropped. CSV rows arrive as
+    strings, so numeric and date fields are coerced rather than type-checked.
+    """
+    if not isinstance(record, dict):
+        return None, ['record must be an object']
+
+    clean, errors = {}, []
+    for field, (kind, required, max_length) in FIELDS.items():
+        value = record.get(field)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            if required and not partial:
+                errors.append(f"{field} is required")
+            continue
+        try:
+            value = _coerce(value, kind)
+        except (TypeError, ValueError):
+            errors.append(f"{field} must be {TYPE_NAMES[kind]}")
+            continue
+
+        if max_length and len(value) > max_length:
+            errors.append(f"{field} is longer than {max_length} characters")
+        elif field in RANGES and not RANGES[field][0] <= value <= RANGES[field][1]:
+            errors.append(f"{field} must be between {RANGES[field][0]} and {RANGES[field][1]}")
+        elif field in POSITIVE and value <= 0:
+            errors.append(f"{field} must be positive")
+        else:
+            clean[field] = value
+
+    if partial and 'id' in clean:
+        if clean.pop('id') != current_id:
+            errors.append('id cannot be changed')
+    return clean, errors
+
+
+def parse_records(payload, content_type=''):
+    """Turn a JSON list/``{"installations": [...]}`` or CSV text into a list of dicts"""
+    if 'csv' in content_type:
+        return list(csv.DictReader(io.StringIO(payload)))
+    data = json.loads(payload) if isinstance(payload, str) else payload
+    if isinstance(data, dict):
+        data = data.get('installations')
+    if not isinstance(data, list):
+        raise ValueError('expected a list of installations')
+    return data
+
+
+def load_file(path):
+    """Read installation records from a .csv or .json file"""
+    with open(path, newline='') as f:
+        return parse_records(f.read(), 'text/csv' if path.lower().endswith('.csv') else 'application/json')
+
+
+def bulk_upsert(session, records, atomic=False, dry_run=False, tenant_id=None):
+    """Validate ``records`` and insert or update them in one transaction.
+
+    Invalid rows (and repeated ids within the batch) are reported per row and
+    skipped; with ``atomic`` any error rejects the whole batch. Existing ids
+    are found with chunked ``IN`` queries, then new and changed rows are
+    written with one bulk INSERT and one bulk UPDATE per chunk. With
+    ``tenant_id`` every row belongs to that tenant, and ids owned by another
+    tenant are rejected.
+    """
+    valid, rows, errors, seen = [], [], [], set()
+    for row, record in enumerate(records):
+        clean, row_errors = validate_installation(record)
+        if not row_errors and clean['id'] in seen:
+            row_errors = ['duplicate id in batch']
+        if not row_errors and tenant_id is not None:
+            if clean.setdefault('tenant_id', tenant_id) != tenant_id:
+                row_errors = [f'tenant_id must be {tenant_id}']
+        if row_errors:
+            errors.append({'row': row, 'id': record.get('id') if isinstance(record, dict) else None,
+                           'errors': row_errors})
+            continue
+        seen.add(clean['id'])
+        valid.append(clean)
+        rows.append(row)
+
+    owners = {}
+    ids = [record['id'] for record in valid]
+    for start in range(0, len(ids), BULK_CHUNK_SIZE):
+        chunk = ids[start:start + BULK_CHUNK_SIZE]
+        owners.update(session.query(SolarInstallation.id, SolarInstallation.tenant_id)
+                      .filter(SolarInstallation.id.in_(chunk)))
+    existing = set(owners)
+    if tenant_id is not None:
+        foreign = {index for index, record in enumerate(valid)
+                   if record['id'] in owners and owners[record['id']] != tenant_id}
+        errors.extend({'row': rows[index], 'id': valid[index]['id'], 'errors': ['id belongs to another tenant']}
+                      for index in sorted(foreign))
+        errors.sort(key=lambda error: error['row'])
+        valid = [record for index, record in enumerate(valid) if index not in foreign]
+
+    # Updates leave an omitted zone alone; new rows get the default
+    to_insert = [dict({'climatic_zone': DEFAULT_CLIMATIC_ZONE, 'tenant_id': DEFAULT_TENANT}, **record)
+                 for record in valid if record['id'] not in existing]
+    to_update = [record for record in valid if record['id'] in existing]
+    summary = {
+        'received': len(records),
+        'inserted': len(to_insert),
+        'updated': len(to_update),
+        'failed': len(errors),
+        'errors': errors,
+        'committed': False
+    }
+    if dry_run or (atomic and errors) or not valid:
+        return summary
+
+    try:
+        for start in range(0, len(to_insert), BULK_CHUNK_SIZE):
+            session.execute(insert(SolarInstallation), to_insert[start:start + BULK_CHUNK_SIZE])
+        # Rows that leave a column out must not null it, so group updates by column set
+        by_columns = {}
+        for record in to_update:
+            by_columns.setdefault(tuple(sorted(record)), []).append(record)
+        for group in by_columns.values():
+            for start in range(0, len(group), BULK_CHUNK_SIZE):
+                session.execute(update(SolarInstallation), group[start:start + BULK_CHUNK_SIZE])
+        session.commit()
+    except Exception:
+        session.rollback()
+        raise
+
+    summary['committed'] = True
+    return summary
+
+
+def filtered_query(query, args, tenant_id=None):
+    """Apply tenant / zone / capacity range / bounding box filters from request args.
+
+    ``bbox`` is ``min_lat,min_lon,max_lat,max_lon``. ``tenant_id`` (the
+    request's tenant) always applies, on top of any ``tenant_id`` arg.
+    Raises ValueError on malformed values.
+    """
+    for tenant in (tenant_id, args.get('tenant_id')):
+        if tenant:
+            query = query.filter(SolarInstallation.tenant_id == tenant)
+
+    zone = args.get('zone')
+    if zone:
+        query = query.filter(SolarInstallation.climatic_zone == zone)
+
+    min_capacity = args.get('min_capacity_kw', type=float)
+    if min_capacity is not None:
+        query = query.filter(SolarInstallation.capacity_kw >= min_capacity)
+    max_capacity = args.get('max_capacity_kw', type=float)
+    if max_capacity is not None:
+        query = query.filter(SolarInstallation.capacity_kw <= max_capacity)
+
+    bbox = args.get('bbox')
+    if bbox:
+        try:
+            min_lat, min_lon, max_lat, max_lon = [float(part) for part in bbox.split(',')]
+        except ValueError:
+            raise ValueError('bbox must be min_lat,min_lon,max_lat,max_lon')
+        query = query.filter(SolarInstallation.latitude.between(min_lat, max_lat),
+                             SolarInstallation.longitude.between(min_lon, max_lon))
+    return query
+
+
+def page_args(args):
+    """``(page, per_page)`` from request args, 1-based and capped"""
+    page = args.get('page', 1, type=int)
+    per_page = args.get('per_page', DEFAULT_PAGE_SIZE, type=int)
+    if page < 1 or per_page < 1:
+        raise ValueError('page and per_page must be positive')
+    return page, min(per_page, MAX_PAGE_SIZE)
+
+
+def serialize(installation):
+    return {
+        'id': installation.id,
+        'name': installation.name,
+        'location': installation.location,
+        'latitude': installation.latitude,
+        'longitude': installation.longitude,
+        'capacity_kw': installation.capacity_kw,
+        'panel_count': installation.panel_count,
+        'climatic_zone': installation.climatic_zone,
+        'tenant_id': installation.tenant_id
+    }
@@ -0,0 +1,448 @@
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond DB calls up to model training
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Directory shared by the gunicorn workers and the scheduler so /metrics
+# reports the whole server rather than whichever worker took the scrape;
+# unset keeps metrics per process
+MULTIPROC_DIR = os.getenv('METRICS_MULTIPROC_DIR')
+
+# Seconds between snapshot writes of a process in multiprocess mode; a scrape
+# sees the other workers' samples at most this old
+FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '5'))
+
+# Samples of exited processes, folded together so their files do not pile up
+ARCHIVE_FILE = 'archive.json'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _copy(self, value):
+        return value
+
+    def snapshot(self):
+        with self._lock:
+            return [[list(key), self._copy(value)] for key, value in self._values.items()]
+
+    def render(self, snapshots=None):
+        """Render this process's samples merged with ``snapshots`` of other processes.
+
+        ``snapshots`` are ``(pid, samples)`` pairs as written by ``snapshot``
+        (None outside multiprocess mode); ``pid`` is None for the archive of
+        exited processes.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        with self._lock:
+            values = {key: self._copy(value) for key, value in self._values.items()}
+        for pid, samples in snapshots or ():
+            _merge_samples(self.metric_type, values, samples)
+        lines.extend(self._render_samples(sorted(values.items())))
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonically increasing count (rows ingested, alerts generated, ...)"""
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in items]
+
+
+class Gauge(_Metric):
+    """Point-in-time value that can go up and down"""
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def render(self, snapshots=None):
+        """Point-in-time values do not add up across processes: each live one gets a ``pid`` label"""
+        if snapshots is None:
+            return super().render()
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}']
+        with self._lock:
+            items = [(key + (str(os.getpid()),), value) for key, value in self._values.items()]
+        for pid, samples in snapshots:
+            if pid is not None and _process_alive(pid):
+                items.extend((tuple(key) + (str(pid),), value) for key, value in samples)
+        lines.extend(f'{self.name}{_format_labels(self.labelnames + ("pid",), key)} {_format_value(value)}'
+                     for key, value in sorted(items))
+        return lines
+
+    def _render_samples(self, items):
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in items]
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observed durations"""
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def _copy(self, value):
+        return [list(value[0]), value[1], value[2]]
+
+    def count(self, **labels):
+        state = self._values.get(self._key(labels))
+        return state[2] if state else 0
+
+    def _render_samples(self, items):
+        lines = []
+        for key, (bucket_counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+def _merge_samples(metric_type, values, samples):
+    """Add another process's counter or histogram ``samples`` into ``values``"""
+    if metric_type == 'gauge':
+        return
+    for key, value in samples:
+        key = tuple(key)
+        current = values.get(key)
+        if current is None:
+            values[key] = value if metric_type == 'counter' else [list(value[0]), value[1], value[2]]
+        elif metric_type == 'counter':
+            values[key] = current + value
+        else:
+            values[key] = [[a + b for a, b in zip(current[0], value[0])], current[1] + value[1],
+                           current[2] + value[2]]
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        # Gone (worker archived meanwhile) or never written; skip it this scrape
+        return None
+
+
+def _write_json(path, data):
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def mark_process_dead(directory, pid):
+    """Fold an exited process's counters and histograms into the archive file.
+
+    Keeps fleet totals monotonic across worker recycling; the process's
+    gauges are dropped. Called by the gunicorn master from ``child_exit`` and
+    by each process on a clean exit.
+    """
+    path = os.path.join(directory, f'{pid}.json')
+    snapshot = _read_json(path)
+    if snapshot is None:
+        return
+    with open(os.path.join(directory, 'archive.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        archive_path = os.path.join(directory, ARCHIVE_FILE)
+        archive = _read_json(archive_path) or {}
+        for name, entry in snapshot.items():
+            if entry['type'] == 'gauge':
+                continue
+            values = {tuple(key): value for key, value in archive.get(name, {}).get('values', [])}
+            _merge_samples(entry['type'], values, entry['values'])
+            archive[name] = {'type': entry['type'], 'values': [[list(key), value] for key, value in values.items()]}
+        _write_json(archive_path, archive)
+        os.remove(path)
+
+
+def clear_multiprocess_dir(directory):
+    """Remove every snapshot of a previous server run"""
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, '*.json')):
+        os.remove(path)
+
+
+class MetricsRegistry:
+    """Holds every metric of the process and renders the Prometheus text format.
+
+    With ``enable_multiprocess`` every process (gunicorn worker, scheduler)
+    periodically writes its samples to ``<directory>/<pid>.json`` and
+    ``render`` merges all of them, so a scrape of any worker reports the whole
+    server: counters and histograms are summed, gauges get a ``pid`` label.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self.multiprocess_dir = None
+        self._flusher_pid = None
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = cls(name, *args, **kwargs)
+            return self._metrics[name]
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter, name, documentation, labelnames)
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def snapshot(self):
+        return {name: {'type': metric.metric_type, 'values': metric.snapshot()}
+                for name, metric in list(self._metrics.items())}
+
+    def write_snapshot(self):
+        _write_json(os.path.join(self.multiprocess_dir, f'{os.getpid()}.json'), self.snapshot())
+
+    def enable_multiprocess(self, directory, flush_seconds=FLUSH_SECONDS):
+        """Share this process's samples through ``directory``; once per process"""
+        if self._flusher_pid == os.getpid():
+            return
+        os.makedirs(directory, exist_ok=True)
+        self.multiprocess_dir = directory
+        self._flusher_pid = os.getpid()
+
+        def flush():
+            while True:
+                time.sleep(flush_seconds)
+                try:
+                    self.write_snapshot()
+                except OSError as e:
+                    logger.warning(f"Could not write metrics snapshot: {e}")
+
+        threading.Thread(target=flush, name='metrics-flush', daemon=True).start()
+        atexit.register(self._archive_on_exit)
+
+    def _archive_on_exit(self):
+        if self._flusher_pid != os.getpid():
+            return
+        self.write_snapshot()
+        mark_process_dead(self.multiprocess_dir, os.getpid())
+
+    def _other_snapshots(self):
+        own = f'{os.getpid()}.json'
+        snapshots = []
+        for path in glob.glob(os.path.join(self.multiprocess_dir, '*.json')):
+            filename = os.path.basename(path)
+            if filename == own:
+                continue
+            data = _read_json(path)
+            if data is None:
+                continue
+            pid = None if filename == ARCHIVE_FILE else int(filename[:-len('.json')])
+            snapshots.append((pid, data))
+        return snapshots
+
+    def render(self):
+        snapshots = self._other_snapshots() if self.multiprocess_dir else None
+        lines = []
+        for name, metric in list(self._metrics.items()):
+            samples = None
+            if snapshots is not None:
+                samples = [(pid, data[name]['values']) for pid, data in snapshots if name in data]
+            lines.extend(metric.render(samples))
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    'solar_http_request_duration_seconds', 'HTTP request latency by route', ['method', 'route', 'status'])
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    'solar_db_query_duration_seconds', 'Database statement execution time by statement type', ['operation'])
+FUNCTION_SECONDS = REGISTRY.histogram(
+    'solar_function_duration_seconds', 'Execution time of backend hot-path functions', ['function'])
+SCHEDULER_JOB_SECONDS = REGISTRY.histogram(
+    'solar_scheduler_job_duration_seconds', 'Background scheduler job duration', ['job'])
+TELEMETRY_ROWS_INGESTED = REGISTRY.counter(
+    'solar_telemetry_rows_ingested_total', 'Telemetry rows written by ingest')
+RATE_LIMITED = REGISTRY.counter(
+    'solar_rate_limited_total', 'Requests rejected by the rate limiter', ['endpoint', 'scope'])
+ALERTS_GENERATED = REGISTRY.counter(
+    'solar_alerts_generated_total', 'Alerts generated by the alert system', ['alert_type', 'severity'])
+ALERTS_RESOLVED = REGISTRY.counter(
+    'solar_alerts_resolved_total', 'Alerts resolved by operators or automatically', ['resolution'])
+ALERTS_ARCHIVED = REGISTRY.counter(
+    'solar_alerts_archived_total', 'Resolved alerts moved to the archive table')
+NOTIFICATIONS_SENT = REGISTRY.counter(
+    'solar_notifications_total', 'Notification digest deliveries by sink and outcome', ['sink', 'result'])
+NOTIFICATION_ALERTS_QUEUED = REGISTRY.counter(
+    'solar_notification_alerts_queued_total', 'Alerts added to notification digests')
+MODEL_CACHE_REQUESTS = REGISTRY.counter(
+    'solar_model_cache_requests_total', 'ML model lookups on the prediction path', ['result'])
+MODEL_TRAINING_RUNS = REGISTRY.counter(
+    'solar_model_training_runs_total', 'Per-installation runs of the fleet training job', ['result'])
+MODELS_LOADED = REGISTRY.gauge(
+    'solar_models_loaded', 'Trained per-installation models held in this process')
+DB_POOL_CONNECTIONS = REGISTRY.gauge(
+    'solar_db_pool_connections', 'Connections in this process\'s DB pool by state', ['state'])
+DB_POOL_SATURATION = REGISTRY.gauge(
+    'solar_db_pool_saturation_ratio', 'Checked-out connections / (pool_size + max_overflow)')
+DB_CONNECTIONS_OPENED = REGISTRY.counter(
+    'solar_db_connections_opened_total', 'New DBAPI connections opened (connection churn)')
+
+
+def timed(histogram, **labels):
+    """Decorator recording the wrapped function's wall time in ``histogram``"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def statement_operation(statement):
+    """Classify a SQL statement by its leading keyword (SELECT, INSERT, ...)"""
+    parts = statement.lstrip().split(None, 1)
+    return parts[0].upper() if parts else 'UNKNOWN'
+
+
+_instrumented_engines = set()
+
+
+def instrument_engine(engine_class):
+    """Record every statement's execution time in DB_QUERY_SECONDS.
+
+    ``engine_class`` may be a specific Engine or the ``Engine`` class itself to
+    cover every engine created in the process. Repeated calls are no-ops.
+    """
+    from sqlalchemy import event
+
+    if engine_class in _instrumented_engines:
+        return
+    _instrumented_engines.add(engine_class)
+
+    @event.listens_for(engine_class, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+    @event.listens_for(engine_class, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info['query_start_time'].pop()
+        DB_QUERY_SECONDS.observe(time.perf_counter() - start, operation=statement_operation(statement))
+
+    @event.listens_for(engine_class, 'handle_error')
+    def _discard_failed_statement(exception_context):
+        conn = exception_context.connection
+        if conn is not None and conn.info.get('query_start_time'):
+            conn.info['query_start_time'].pop()
+
+
+def instrument_app(app):
+    """Record per-route request latency for a Flask app"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_request_timer():
+        g.request_start_time = time.perf_counter()
+
+    @app.after_request
+    def _record_request_latency(response):
+        start = g.pop('request_start_time', None)
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, method=request.method,
+                                         route=route, status=response.status_code)
+        return response
@@ -0,0 +1,224 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+import numpy as np
+import logging
+from metrics import FUNCTION_SECONDS, MODELS_LOADED, timed
+from models import TelemetryData
+from registry import installation_registry
+from feature_store import HISTORY, HISTORY_COLUMNS, compute_features, feature_matrix, feature_store, raw_columns
+from model_backends import QUANTILES, create_backend
+from alert_rules import maintenance_scores
+
+logger = logging.getLogger(__name__)
+
+# ML Model Class
+class SolarPredictionModel:
+    def __init__(self, backend=None):
+        # Estimators are built on first training, so processes that never
+        # train (CLI tools, the scheduler) don't import scikit-learn
+        self.backend_name = backend
+        self.backend = None
+        self.is_trained = False
+        self.training_rows = 0
+        self.training_error = None
+    
+    def _build_estimators(self):
+        self.backend = create_backend(self.backend_name)
+        self.backend_name = self.backend.name
+    
+    def prepare_features(self, data):
+        """Feature matrix for readings of one installation, in the feature store's layout.
+        
+        Lag and rolling features need the readings just before ``data``; they
+        are read with one indexed query.
+        """
+        installation = installation_registry.get(data[0].installation_id)
+        previous = TelemetryData.query.filter(
+            TelemetryData.installation_id == installation.id,
+            TelemetryData.timestamp < data[0].timestamp
+        ).order_by(TelemetryData.timestamp.desc()).limit(HISTORY).all()[::-1]
+        history = {name: [getattr(row, name) or 0.0 for row in previous] for name in HISTORY_COLUMNS}
+        return feature_matrix(compute_features(raw_columns(data), history, installation))
+    
+    @timed(FUNCTION_SECONDS, function='train_model')
+    def train_model(self, installation_id):
+        """Train ML model on the installation's materialized features"""
+        try:
+            installation = installation_registry.get(installation_id)
+            if installation is None:
+                self.training_error = 'unknown installation'
+                return False
+            
+            # Only telemetry that arrived since the last training is featurized
+            feature_store.sync(installation)
+            matrix = feature_store.training_matrix(installation_id, limit=1000)
+            
+            self.training_rows = 0 if matrix is None else len(matrix[0])
+            if self.training_rows < 50:
+                self.training_error = f'insufficient data ({self.training_rows} records)'
+                logger.warning(f"Insufficient data for training: {self.training_rows} records")
+                return False
+            
+            X, y_power, y_efficiency = matrix
+            
+            # Train models (scaling, where the estimator needs it, is part of the backend)
+            self._build_estimators()
+            self.backend.fit(X, y_power, y_efficiency)
+            
+            self.is_trained = True
+            logger.info(f"Model trained successfully for installation {installation_id} ({self.backend_name})")
+            return True
+            
+        except Exception as e:
+            self.training_error = str(e)
+            logger.error(f"Error training model: {str(e)}")
+            return False
+    
+    @timed(FUNCTION_SECONDS, function='predict')
+    def predict(self, telemetry_data):
+        """Make predictions based on current telemetry"""
+        if not self.is_trained:
+            return None
+        
+        try:
+            X = self.prepare_features([telemetry_data])
+            predicted = self.predict_matrix(X)
+            predicted_efficiency = float(predicted['efficiency'][0])
+            
+            # Calculate maintenance score based on efficiency and environmental factors
+            maintenance_score = self.calculate_maintenance_score(telemetry_data, predicted_efficiency)
+            
+            return {
+                'predicted_power_kw': float(predicted['p50'][0]),
+                'predicted_power_p10_kw': float(predicted['p10'][0]),
+                'predicted_power_p90_kw': float(predicted['p90'][0]),
+                'efficiency_score': max(0, min(1, predicted_efficiency)),
+                'maintenance_score': maintenance_score
+            }
+            
+        except Exception as e:
+            logger.error(f"Error making prediction: {str(e)}")
+            return None
+    
+    def predict_matrix(self, X):
+        """Power quantiles (``p10``/``p50``/``p90``, kW) and ``efficiency`` arrays for a feature matrix"""
+        quantiles, efficiency = self.backend.predict_quantiles(X)
+        predicted = {f'p{q}': quantiles[:, i] for i, q in enumerate(QUANTILES)}
+        predicted['efficiency'] = efficiency
+        return predicted
+    
+    def calculate_maintenance_score(self, telemetry, efficiency):
+        """Calculate maintenance score (0-100, higher means more maintenance needed)"""
+        return int(maintenance_scores([telemetry.dust_level], [telemetry.module_temp_c], [efficiency],
+                                      [telemetry.inverter_efficiency])[0])
+
+
+def model_path(installation_id):
+    return os.path.join(os.getenv('MODEL_DIR', 'models'), f"{quote(str(installation_id), safe='')}.joblib")
+
+
+def save_model(installation_id, model):
+    """Persist a trained model so every worker process can load it; returns the file's mtime"""
+    import joblib
+    
+    path = model_path(installation_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f'{path}.{os.getpid()}.tmp'
+    joblib.dump(model, temporary)
+    os.replace(temporary, path)
+    return os.path.getmtime(path)
+
+
+def stored_model_mtime(installation_id):
+    try:
+        return os.path.getmtime(model_path(installation_id))
+    except OSError:
+        return None
+
+
+def load_model(installation_id):
+    """The persisted model for an installation, or None"""
+    import joblib
+    
+    try:
+        return joblib.load(model_path(installation_id))
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.error(f"Error loading model for {installation_id}: {str(e)}")
+        return None
+
+
+class ModelCache:
+    """Trained models per installation, least recently used evicted beyond ``max_models``.
+    
+    Models trained anywhere (another worker, ``flask train-all``) are saved
+    under ``MODEL_DIR``; a lookup loads the file when it is newer than the
+    copy in memory, so a fleet retrain reaches every worker without a restart.
+    The backend for each installation comes from the choices file written by
+    ``benchmarks/model_selection.py`` (``MODEL_BACKEND_CHOICES``), falling back
+    to ``MODEL_BACKEND``. The file is re-read when it changes.
+    """
+    
+    def __init__(self, max_models=None, choices_path=None):
+        self.max_models = max_models or int(os.getenv('MODEL_CACHE_SIZE', '1000'))
+        self.choices_path = choices_path
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._choices = {}
+        self._choices_mtime = None
+    
+    def __len__(self):
+        return len(self._models)
+    
+    def backend_for(self, installation_id):
+        path = self.choices_path or os.getenv('MODEL_BACKEND_CHOICES')
+        if path:
+            try:
+                mtime = os.path.getmtime(path)
+                if mtime != self._choices_mtime:
+                    with open(path) as f:
+                        self._choices = json.load(f).get('choices', {})
+                    self._choices_mtime = mtime
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cannot read model backend choices from {path}: {str(e)}")
+        return self._choices.get(installation_id)
+    
+    def get(self, installation_id):
+        """The installation's trained model (from memory or MODEL_DIR), or None"""
+        with self._lock:
+            entry = self._models.get(installation_id)
+            if entry is not None:
+                self._models.move_to_end(installation_id)
+        
+        mtime = stored_model_mtime(installation_id)
+        if mtime is not None and (entry is None or mtime > entry[1]):
+            model = load_model(installation_id)
+            if model is not None:
+                self.put(installation_id, model, mtime)
+                return model
+        return entry[0] if entry else None
+    
+    def put(self, installation_id, model, mtime=0):
+        with self._lock:
+            self._models[installation_id] = (model, mtime)
+            self._models.move_to_end(installation_id)
+            while len(self._models) > self.max_models:
+                self._models.popitem(last=False)
+            MODELS_LOADED.set(len(self._models))
+    
+    def train(self, installation_id):
+        """Train (or retrain) and save the installation's model; returns it, or None when training failed"""
+        model = SolarPredictionModel(self.backend_for(installation_id))
+        if not model.train_model(installation_id):
+            return None
+        try:
+            mtime = save_model(installation_id, model)
+        except OSError as e:
+            logger.error(f"Error saving model for {installation_id}: {str(e)}")
+            mtime = 0
+        self.put(installation_id, model, mtime)
+        return model
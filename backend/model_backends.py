@@ -0,0 +1,161 @@
+import os
+
+import numpy as np
+
+from feature_store import FEATURE_COLUMNS
+
+DEFAULT_BACKEND = 'random_forest'
+
+# Power quantiles returned by predict_quantiles (percent)
+QUANTILES = (10, 50, 90)
+
+# Rows predicted below this share of the peak are left out of the residual
+# spread; near-zero output at night would swamp the relative errors
+RESIDUAL_MIN_SHARE = 0.05
+
+# Folds of the out-of-sample predictions the residual spread is measured on
+RESIDUAL_FOLDS = int(os.getenv('MODEL_RESIDUAL_FOLDS', '5'))
+
+
+class ModelBackend:
+    """A pair of regressors (power, efficiency) over the feature store's columns.
+
+    Subclasses only say how to build one estimator; scikit-learn is imported
+    when the first backend is built, not at import time.
+    """
+
+    name = None
+
+    def __init__(self):
+        self.power_model = None
+        self.efficiency_model = None
+        self.relative_residuals = None
+
+    def _estimator(self):
+        raise NotImplementedError
+
+    def fit(self, X, y_power, y_efficiency):
+        self.power_model = self._estimator().fit(X, y_power)
+        self.efficiency_model = self._estimator().fit(X, y_efficiency)
+        self._fit_residuals(X, y_power)
+        return self
+
+    def _fit_residuals(self, X, y_power):
+        """Quantiles of the out-of-sample error relative to the prediction, for predict_quantiles.
+
+        A model's error on its own training rows understates its error on new
+        readings, so every row is predicted by a model fitted without it. The
+        folds are contiguous (rows are in time order) so a reading's
+        neighbours do not leak into its prediction.
+        """
+        from sklearn.model_selection import KFold, cross_val_predict
+
+        y_power = np.asarray(y_power, dtype=float)
+        if len(y_power) < 10 * RESIDUAL_FOLDS:
+            self.relative_residuals = np.zeros(len(QUANTILES))
+            return
+        predicted = cross_val_predict(self._estimator(), X, y_power, cv=KFold(RESIDUAL_FOLDS))
+        daylight = predicted > RESIDUAL_MIN_SHARE * max(float(y_power.max()), 1e-9)
+        if daylight.sum() < 10:
+            self.relative_residuals = np.zeros(len(QUANTILES))
+            return
+        ratio = (y_power[daylight] - predicted[daylight]) / predicted[daylight]
+        self.relative_residuals = np.percentile(ratio, QUANTILES)
+
+    def predict(self, X):
+        """``(power, efficiency)`` arrays, one entry per row of ``X``"""
+        return self.power_model.predict(X), self.efficiency_model.predict(X)
+
+    def predict_quantiles(self, X):
+        """``(power quantiles [n, len(QUANTILES)], efficiency [n])``.
+
+        Point prediction scaled by the out-of-sample residual quantiles; backends
+        with a better source of spread override this.
+        """
+        power, efficiency = self.predict(X)
+        return np.clip(power[:, None] * (1 + self.relative_residuals[None, :]), 0, None), efficiency
+
+
+class RandomForestBackend(ModelBackend):
+    """The original estimator: accurate, but large in memory and slow per row"""
+
+    name = 'random_forest'
+
+    def _estimator(self):
+        from sklearn.ensemble import RandomForestRegressor
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+
+        # MODEL_N_JOBS is set by the fleet training job so trees use this
+        # worker's share of the cores and no more
+        return make_pipeline(StandardScaler(), RandomForestRegressor(
+            n_estimators=int(os.getenv('MODEL_RF_TREES', '100')), random_state=42,
+            n_jobs=int(os.getenv('MODEL_N_JOBS', '1'))))
+
+    def fit(self, X, y_power, y_efficiency):
+        self.power_model = self._estimator().fit(X, y_power)
+        self.efficiency_model = self._estimator().fit(X, y_efficiency)
+        # Serving scores one row at a time, where worker threads only add overhead
+        for model in (self.power_model, self.efficiency_model):
+            model[-1].set_params(n_jobs=1)
+        return self
+
+    def tree_predictions(self, X):
+        """[trees, n] power predictions of every tree; their mean is the forest's prediction"""
+        scaled = self.power_model[:-1].transform(X)
+        return np.stack([tree.predict(scaled) for tree in self.power_model[-1].estimators_])
+
+    def predict_quantiles(self, X):
+        """Quantiles across the trees' own predictions: an interval for the cost of one forest pass"""
+        trees = self.tree_predictions(np.asarray(X, dtype=float))
+        return (np.clip(np.percentile(trees, QUANTILES, axis=0).T, 0, None),
+                self.efficiency_model.predict(X))
+
+
+class HistGradientBoostingBackend(ModelBackend):
+    """Binned gradient boosting: a few hundred KB per model and fast single-row scoring"""
+
+    name = 'hist_gradient_boosting'
+
+    def _estimator(self):
+        from sklearn.ensemble import HistGradientBoostingRegressor
+
+        return HistGradientBoostingRegressor(max_iter=int(os.getenv('MODEL_HGB_ITERATIONS', '100')),
+                                             random_state=42)
+
+
+# Interaction terms that make a linear model follow PV physics: output scales
+# with irradiance, derated by module temperature, soiling and the inverter
+_IRRADIATION = FEATURE_COLUMNS.index('irradiation_wm2')
+_INTERACTIONS = [FEATURE_COLUMNS.index(name) for name in ('module_temp_c', 'dust_level', 'inverter_efficiency',
+                                                          'cos_zenith', 'clear_sky_index')]
+
+
+def physics_features(X):
+    X = np.asarray(X, dtype=float)
+    return np.hstack([X, X[:, [_IRRADIATION]] * X[:, _INTERACTIONS]])
+
+
+class RidgeBackend(ModelBackend):
+    """Ridge regression on the features plus irradiance interaction terms; a few KB per model"""
+
+    name = 'ridge'
+
+    def _estimator(self):
+        from sklearn.linear_model import Ridge
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import FunctionTransformer, StandardScaler
+
+        return make_pipeline(FunctionTransformer(physics_features), StandardScaler(),
+                             Ridge(alpha=float(os.getenv('MODEL_RIDGE_ALPHA', '1.0'))))
+
+
+BACKENDS = {backend.name: backend for backend in (RandomForestBackend, HistGradientBoostingBackend, RidgeBackend)}
+
+
+def create_backend(name=None):
+    """A new, unfitted backend; ``name`` defaults to ``MODEL_BACKEND``"""
+    name = name or os.getenv('MODEL_BACKEND', DEFAULT_BACKEND)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown model backend {name!r} (choose from {', '.join(BACKENDS)})")
+    return BACKENDS[name]()
@@ -0,0 +1,175 @@
+from flask_sqlalchemy import SQLAlchemy
+from datetime import datetime
+
+# Bound to an application in app.create_app()
+db = SQLAlchemy()
+
+# Database Models
+class SolarInstallation(db.Model):
+    __tablename__ = 'solar_installations'
+    __table_args__ = (
+        db.Index('ix_installations_lat_lon', 'latitude', 'longitude'),
+    )
+    
+    id = db.Column(db.String(50), primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    location = db.Column(db.String(100), nullable=False)
+    latitude = db.Column(db.Float, nullable=False)
+    longitude = db.Column(db.Float, nullable=False)
+    capacity_kw = db.Column(db.Float, nullable=False)
+    panel_count = db.Column(db.Integer, nullable=False)
+    installation_date = db.Column(db.DateTime, default=datetime.utcnow)
+    climatic_zone = db.Column(db.String(50), nullable=False, index=True)
+    # Owning organisation; scoped API requests only see their tenant's installations
+    tenant_id = db.Column(db.String(50), nullable=False, default='default', index=True)
+    
+class TelemetryData(db.Model):
+    __tablename__ = 'telemetry_data'
+    __table_args__ = (
+        # One reading per installation and device timestamp: retried uploads upsert instead of duplicating
+        db.Index('uq_telemetry_installation_timestamp', 'installation_id', 'timestamp', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    installation_id = db.Column(db.String(50), db.ForeignKey('solar_installations.id'), nullable=False)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    pv_power_kw = db.Column(db.Float, nullable=False)
+    irradiation_wm2 = db.Column(db.Float, nullable=False)
+    module_temp_c = db.Column(db.Float, nullable=False)
+    ambient_temp_c = db.Column(db.Float, nullable=False)
+    wind_speed_ms = db.Column(db.Float, default=0)
+    humidity_percent = db.Column(db.Float, default=0)
+    dust_level = db.Column(db.Float, default=0)
+    inverter_efficiency = db.Column(db.Float, default=95.0)
+
+class PredictionData(db.Model):
+    __tablename__ = 'prediction_data'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    installation_id = db.Column(db.String(50), db.ForeignKey('solar_installations.id'), nullable=False)
+    # The scored reading; unique so reprocessing upserts instead of duplicating
+    telemetry_id = db.Column(db.Integer, db.ForeignKey('telemetry_data.id'), unique=True)
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    predicted_power_kw = db.Column(db.Float, nullable=False)  # P50
+    # Prediction interval; REAL (4 bytes) is plenty for a kW bound
+    predicted_power_p10_kw = db.Column(db.REAL)
+    predicted_power_p90_kw = db.Column(db.REAL)
+    actual_power_kw = db.Column(db.Float)
+    efficiency_score = db.Column(db.Float, nullable=False)
+    maintenance_score = db.Column(db.Float, nullable=False)
+
+class AlertData(db.Model):
+    __tablename__ = 'alert_data'
+    __table_args__ = (
+        db.UniqueConstraint('telemetry_id', 'alert_type', name='uq_alert_telemetry_type'),
+        # Partial index: open alerts stay a small, fast slice however long the history grows
+        db.Index('ix_alerts_open', 'installation_id', 'timestamp',
+                 postgresql_where=db.text('NOT resolved'), sqlite_where=db.text('resolved = 0')),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    installation_id = db.Column(db.String(50), db.ForeignKey('solar_installations.id'), nullable=False)
+    telemetry_id = db.Column(db.Integer, db.ForeignKey('telemetry_data.id'))
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)  # the reading's device time
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)  # server time the alert was raised
+    alert_type = db.Column(db.String(50), nullable=False)
+    severity = db.Column(db.String(20), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    resolved = db.Column(db.Boolean, default=False)
+    acknowledged_at = db.Column(db.DateTime)
+    resolved_at = db.Column(db.DateTime, index=True)
+    resolution = db.Column(db.String(20))  # 'manual' or 'auto'
+
+class AlertArchive(db.Model):
+    """Resolved alerts moved out of alert_data by the archival job (ids are kept)"""
+    __tablename__ = 'alert_archive'
+    __table_args__ = (
+        db.Index('ix_alert_archive_installation_timestamp', 'installation_id', 'timestamp'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    installation_id = db.Column(db.String(50), nullable=False)
+    telemetry_id = db.Column(db.Integer, index=True)
+    timestamp = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime)
+    alert_type = db.Column(db.String(50), nullable=False)
+    severity = db.Column(db.String(20), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    resolved = db.Column(db.Boolean, default=True)
+    acknowledged_at = db.Column(db.DateTime)
+    resolved_at = db.Column(db.DateTime)
+    resolution = db.Column(db.String(20))
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+class NotificationOutbox(db.Model):
+    """One digest of alerts for one recipient, collected during a window and then delivered"""
+    __tablename__ = 'notification_outbox'
+    __table_args__ = (
+        db.Index('ix_outbox_status_send_after', 'status', 'send_after'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    recipient = db.Column(db.String(100), nullable=False, index=True)
+    sink = db.Column(db.String(20), nullable=False)
+    target = db.Column(db.String(500), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pending')  # pending, sent, failed
+    # End of the digest window, then the next retry
+    send_after = db.Column(db.DateTime, nullable=False)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    alert_count = db.Column(db.Integer, nullable=False, default=0)
+    payload = db.Column(db.Text, nullable=False)  # JSON digest
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+class NotificationCursor(db.Model):
+    """Highest AlertData id already fanned out to the outbox"""
+    __tablename__ = 'notification_cursor'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    last_alert_id = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class ReprocessCheckpoint(db.Model):
+    """Progress of one reprocessing job for one installation, committed with each batch"""
+    __tablename__ = 'reprocess_checkpoints'
+    
+    job = db.Column(db.String(100), primary_key=True)
+    installation_id = db.Column(db.String(50), db.ForeignKey('solar_installations.id'), primary_key=True)
+    # Last reading processed, in (timestamp, id) order
+    last_timestamp = db.Column(db.DateTime)
+    last_telemetry_id = db.Column(db.Integer)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    predictions = db.Column(db.Integer, nullable=False, default=0)
+    alerts = db.Column(db.Integer, nullable=False, default=0)
+    # Anomaly detector state (JSON, see InstallationDetector.to_bytes), so a resumed job carries on where it stopped
+    detector_state = db.Column(db.LargeBinary)
+    completed = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class AnomalyState(db.Model):
+    """Live anomaly detector state per installation, shared by every worker process"""
+    __tablename__ = 'anomaly_states'
+    
+    installation_id = db.Column(db.String(50), db.ForeignKey('solar_installations.id'), primary_key=True)
+    # InstallationDetector.to_bytes() (JSON); NULL until the first reading is folded in
+    state = db.Column(db.LargeBinary)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SoilingEstimate(db.Model):
+    __tablename__ = 'soiling_estimates'
+    
+    installation_id = db.Column(db.String(50), db.ForeignKey('solar_installations.id'), primary_key=True)
+    computed_at = db.Column(db.DateTime, nullable=False)
+    soiling_rate_per_day = db.Column(db.Float, nullable=False)  # fraction of clean output lost per day
+    clean_performance_ratio = db.Column(db.Float)
+    current_performance_ratio = db.Column(db.Float)
+    r_squared = db.Column(db.Float)
+    days_fitted = db.Column(db.Integer, nullable=False)
+    last_cleaning_date = db.Column(db.Date)  # NULL when no cleaning was seen in the window
+    days_since_cleaning = db.Column(db.Integer)  # since the last cleaning, else since the fit start
+    daily_energy_kwh = db.Column(db.Float)
+    current_loss_kwh_per_day = db.Column(db.Float)
+    cleaning_cost = db.Column(db.Float)
+    optimal_interval_days = db.Column(db.Float)
+    next_cleaning_date = db.Column(db.Date, index=True)
@@ -0,0 +1,339 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, select
+
+from metrics import NOTIFICATION_ALERTS_QUEUED, NOTIFICATIONS_SENT
+from models import AlertData, NotificationCursor, NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+SEVERITY_RANK = {'LOW': 0, 'MEDIUM': 1, 'HIGH': 2}
+
+# Alerts read from alert_data per consumer pass
+CONSUME_CHUNK_ROWS = 5000
+
+# Alerts listed individually in a digest; the rest are only counted
+DIGEST_SAMPLE_ALERTS = 20
+
+DEFAULT_DIGEST_MINUTES = 5
+
+# Alerts younger than this wait for the next pass: ids are assigned before
+# commit, so a slightly older transaction may still add a lower id
+SETTLE_SECONDS = 5
+
+# A claimed digest is retried after this long if its dispatcher dies mid-send
+CLAIM_SECONDS = 300
+
+# Alerts raised longer ago than this (the consumer was down), or stamped with
+# a reading time further before they were raised (e.g. by the reprocessing
+# job), are history, not news
+MAX_ALERT_AGE_MINUTES = int(os.getenv('NOTIFY_MAX_ALERT_AGE_MINUTES', '60'))
+
+# Failed deliveries are retried after base * 2^(attempt - 1) seconds (with
+# jitter, capped) until MAX_ATTEMPTS, then marked failed
+RETRY_BASE_SECONDS = int(os.getenv('NOTIFY_RETRY_BASE_SECONDS', '30'))
+RETRY_MAX_SECONDS = 3600
+MAX_ATTEMPTS = int(os.getenv('NOTIFY_MAX_ATTEMPTS', '8'))
+
+# Delivered digests are kept this long for inspection
+RETENTION_DAYS = 7
+
+
+class Sink:
+    """Delivers one digest to one target; raises on failure so the outbox retries"""
+
+    name = None
+
+    def send(self, target, digest):
+        raise NotImplementedError
+
+
+class WebhookSink(Sink):
+    """POSTs the digest as JSON (requests is imported on first use)"""
+
+    name = 'webhook'
+
+    def send(self, target, digest):
+        import requests
+
+        response = requests.post(target, json=digest, timeout=float(os.getenv('NOTIFY_WEBHOOK_TIMEOUT', '10')))
+        response.raise_for_status()
+
+
+class EmailSink(Sink):
+    """Plain-text email through the SMTP server in ``SMTP_HOST`` / ``SMTP_PORT``"""
+
+    name = 'email'
+
+    def send(self, target, digest):
+        import smtplib
+        from email.message import EmailMessage
+
+        message = EmailMessage()
+        message['Subject'] = subject(digest)
+        message['From'] = os.getenv('SMTP_FROM', 'alerts@eco-power.local')
+        message['To'] = target
+        message.set_content(render_text(digest))
+        with smtplib.SMTP(os.getenv('SMTP_HOST', 'localhost'), int(os.getenv('SMTP_PORT', '25')),
+                          timeout=30) as smtp:
+            if os.getenv('SMTP_STARTTLS', 'false').lower() == 'true':
+                smtp.starttls()
+            if os.getenv('SMTP_USER'):
+                smtp.login(os.getenv('SMTP_USER'), os.getenv('SMTP_PASSWORD', ''))
+            smtp.send_message(message)
+
+
+class FileSink(Sink):
+    """Appends the digest as one JSON line to a file (``-`` for stdout); for local runs and tests"""
+
+    name = 'file'
+
+    _lock = threading.Lock()
+
+    def send(self, target, digest):
+        line = json.dumps(digest, sort_keys=True) + '\n'
+        with self._lock:
+            if target == '-':
+                sys.stdout.write(line)
+                sys.stdout.flush()
+            else:
+                with open(target, 'a') as f:
+                    f.write(line)
+
+
+SINKS = {sink.name: sink for sink in (WebhookSink, EmailSink, FileSink)}
+
+
+def load_recipients(path=None):
+    """Recipients from the ``NOTIFICATION_RECIPIENTS`` JSON file.
+
+    ``{"recipients": [{"name": "ops", "sink": "webhook", "target": "https://...",
+    "min_severity": "MEDIUM", "digest_minutes": 5, "installations": [...],
+    "alert_types": [...]}]}``; the last three are optional filters. Invalid
+    entries are logged and skipped.
+    """
+    path = path or os.getenv('NOTIFICATION_RECIPIENTS')
+    if not path:
+        return []
+    try:
+        with open(path) as f:
+            entries = json.load(f).get('recipients', [])
+    except (OSError, ValueError) as e:
+        logger.warning(f"Cannot read notification recipients from {path}: {str(e)}")
+        return []
+
+    recipients = []
+    for entry in entries:
+        if not entry.get('name') or entry.get('sink') not in SINKS or not entry.get('target'):
+            logger.warning(f"Skipping notification recipient {entry!r}: needs name, target and a sink "
+                           f"({', '.join(SINKS)})")
+            continue
+        recipients.append(dict(entry, min_rank=SEVERITY_RANK.get(entry.get('min_severity', 'LOW'), 0),
+                               installations=set(entry['installations']) if entry.get('installations') else None,
+                               alert_types=set(entry['alert_types']) if entry.get('alert_types') else None))
+    return recipients
+
+
+def wants(recipient, alert):
+    return (SEVERITY_RANK.get(alert.severity, 0) >= recipient['min_rank']
+            and (recipient['installations'] is None or alert.installation_id in recipient['installations'])
+            and (recipient['alert_types'] is None or alert.alert_type in recipient['alert_types']))
+
+
+def new_digest(recipient, start, end):
+    return {
+        'recipient': recipient['name'],
+        'window_start': start.isoformat(),
+        'window_end': end.isoformat(),
+        'alert_count': 0,
+        'by_severity': {},
+        'by_type': {},
+        'by_installation': {},
+        'alerts': []
+    }
+
+
+def add_to_digest(digest, alerts):
+    """Fold alerts into a digest: everything is counted, the most severe few are listed"""
+    for alert in alerts:
+        digest['alert_count'] += 1
+        for key, value in (('by_severity', alert.severity), ('by_type', alert.alert_type),
+                           ('by_installation', alert.installation_id)):
+            digest[key][value] = digest[key].get(value, 0) + 1
+        digest['alerts'].append({
+            'id': alert.id,
+            'installation_id': alert.installation_id,
+            'timestamp': alert.timestamp.isoformat() if alert.timestamp else None,
+            'alert_type': alert.alert_type,
+            'severity': alert.severity,
+            'message': alert.message
+        })
+    digest['alerts'].sort(key=lambda alert: (-SEVERITY_RANK.get(alert['severity'], 0), alert['id']))
+    del digest['alerts'][DIGEST_SAMPLE_ALERTS:]
+    return digest
+
+
+def subject(digest):
+    high = digest['by_severity'].get('HIGH', 0)
+    return (f"[Eco-Power] {digest['alert_count']} alerts at {len(digest['by_installation'])} installations"
+            + (f" ({high} high)" if high else ''))
+
+
+def render_text(digest):
+    lines = [subject(digest), f"Window: {digest['window_start']} - {digest['window_end']} UTC", '']
+    lines += [f"{alert_type}: {count}" for alert_type, count in sorted(digest['by_type'].items())]
+    lines.append('')
+    lines += [f"[{alert['severity']}] {alert['installation_id']} {alert['alert_type']}: {alert['message']}"
+              for alert in digest['alerts']]
+    hidden = digest['alert_count'] - len(digest['alerts'])
+    if hidden > 0:
+        lines.append(f"... and {hidden} more")
+    return '\n'.join(lines) + '\n'
+
+
+def enqueue_new_alerts(session, recipients=None, now=None):
+    """Fan alerts created since the last pass out to the recipients' outbox digests.
+
+    Alerts are read past the stored cursor in id order. Each matching
+    recipient's alerts join the recipient's digest whose window is still
+    open, or start one that closes ``digest_minutes`` from now. Digest
+    updates and the cursor commit together, so each alert is queued exactly
+    once. Returns the number of alerts read.
+    """
+    now = now or datetime.utcnow()
+    recipients = load_recipients() if recipients is None else recipients
+    cursor = session.get(NotificationCursor, 'alerts')
+    if cursor is None:
+        # Start from the present: alerts raised before notifications were set up are not sent
+        last_id = session.execute(select(AlertData.id).order_by(AlertData.id.desc()).limit(1)).scalar() or 0
+        cursor = NotificationCursor(name='alerts', last_alert_id=last_id)
+        session.add(cursor)
+
+    total = 0
+    while True:
+        alerts = session.execute(select(AlertData).where(AlertData.id > cursor.last_alert_id)
+                                 .order_by(AlertData.id).limit(CONSUME_CHUNK_ROWS)).scalars().all()
+        read = len(alerts)
+        # Settling and age go by when the alert was raised, not the device time of its
+        # reading, which a skewed clock or a backfill can put anywhere
+        settled = now - timedelta(seconds=SETTLE_SECONDS)
+        for index, alert in enumerate(alerts):
+            if _created(alert) is not None and _created(alert) > settled:
+                alerts = alerts[:index]
+                break
+        if not alerts:
+            break
+        fresh = [alert for alert in alerts if is_fresh(alert, now)]
+        for recipient in recipients:
+            matching = [alert for alert in fresh if wants(recipient, alert)]
+            if matching:
+                _add_to_outbox(session, recipient, matching, now)
+                NOTIFICATION_ALERTS_QUEUED.inc(len(matching))
+        cursor.last_alert_id = alerts[-1].id
+        cursor.updated_at = now
+        session.commit()
+        total += len(alerts)
+        if len(alerts) < read or read < CONSUME_CHUNK_ROWS:
+            break
+    session.commit()
+    return total
+
+
+def _created(alert):
+    # Rows from before created_at existed only have the reading time
+    return alert.created_at or alert.timestamp
+
+
+def is_fresh(alert, now):
+    """Raised within MAX_ALERT_AGE_MINUTES, about a reading no older than that when it was raised"""
+    created = _created(alert)
+    if created is None:
+        return True
+    max_age = timedelta(minutes=MAX_ALERT_AGE_MINUTES)
+    return created >= now - max_age and (alert.timestamp is None or alert.timestamp >= created - max_age)
+
+
+def _add_to_outbox(session, recipient, alerts, now):
+    entry = session.execute(select(NotificationOutbox).where(
+        NotificationOutbox.recipient == recipient['name'], NotificationOutbox.status == 'pending',
+        NotificationOutbox.attempts == 0, NotificationOutbox.send_after > now
+    ).order_by(NotificationOutbox.id.desc()).limit(1)).scalar()
+    if entry is None:
+        window_end = now + timedelta(minutes=recipient.get('digest_minutes', DEFAULT_DIGEST_MINUTES))
+        entry = NotificationOutbox(recipient=recipient['name'], sink=recipient['sink'], target=recipient['target'],
+                                   status='pending', send_after=window_end, attempts=0, alert_count=0,
+                                   payload=json.dumps(new_digest(recipient, now, window_end)), created_at=now)
+        session.add(entry)
+    digest = add_to_digest(json.loads(entry.payload), alerts)
+    entry.payload = json.dumps(digest)
+    entry.alert_count = digest['alert_count']
+
+
+def retry_delay(attempts):
+    """Seconds before retry number ``attempts``: exponential, capped, with +-20% jitter"""
+    delay = min(RETRY_BASE_SECONDS * 2 ** (attempts - 1), RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def dispatch_due(session, now=None, sinks=None):
+    """Deliver every digest whose window has closed (or whose retry is due).
+
+    Due digests are claimed by pushing ``send_after`` out by
+    ``CLAIM_SECONDS`` before any is sent, so a dispatcher that dies leaves
+    them to be retried rather than lost. A failed delivery is rescheduled with exponential backoff and marked
+    ``failed`` after ``MAX_ATTEMPTS``. Returns ``(sent, failed)`` counts of
+    this pass.
+    """
+    now = now or datetime.utcnow()
+    sinks = sinks or {name: sink() for name, sink in SINKS.items()}
+    # Claim the due digests first (SKIP LOCKED keeps concurrent dispatchers apart on PostgreSQL)
+    due = session.execute(select(NotificationOutbox).where(
+        NotificationOutbox.status == 'pending', NotificationOutbox.send_after <= now
+    ).order_by(NotificationOutbox.send_after).with_for_update(skip_locked=True)).scalars().all()
+    for entry in due:
+        entry.send_after = now + timedelta(seconds=CLAIM_SECONDS)
+    session.commit()
+
+    sent = failed = 0
+    for entry in due:
+        digest = json.loads(entry.payload)
+        entry.attempts += 1
+        try:
+            sinks[entry.sink].send(entry.target, digest)
+        except Exception as e:
+            entry.last_error = str(e)[:1000]
+            if entry.attempts >= MAX_ATTEMPTS:
+                entry.status = 'failed'
+                logger.error(f"Giving up on notification {entry.id} to {entry.recipient} after "
+                             f"{entry.attempts} attempts: {str(e)}")
+            else:
+                entry.send_after = now + timedelta(seconds=retry_delay(entry.attempts))
+                logger.warning(f"Notification {entry.id} to {entry.recipient} failed (attempt {entry.attempts}): "
+                               f"{str(e)}")
+            NOTIFICATIONS_SENT.inc(sink=entry.sink, result='error')
+            failed += 1
+        else:
+            entry.status = 'sent'
+            entry.sent_at = now
+            NOTIFICATIONS_SENT.inc(sink=entry.sink, result='sent')
+            sent += 1
+        # Record each delivery as it happens; a crash re-sends at most the one in flight
+        session.commit()
+
+    session.execute(delete(NotificationOutbox).where(
+        NotificationOutbox.status == 'sent', NotificationOutbox.sent_at < now - timedelta(days=RETENTION_DAYS)))
+    session.commit()
+    return sent, failed
+
+
+def run_once(session, now=None):
+    """One consumer + dispatcher pass; returns ``(alerts read, sent, failed)``"""
+    read = enqueue_new_alerts(session, now=now)
+    sent, failed = dispatch_due(session, now=now)
+    return read, sent, failed
@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+
+logger = logging.getLogger(__name__)
+
+# Client request ids end up in profile file names, so only these are kept as given
+REQUEST_ID_PATTERN = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+
+def _env_flag(name, default=False):
+    return os.getenv(name, str(default)).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def collapse_stack(frame):
+    """Render a frame chain root-first in the collapsed (flamegraph) format"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+def safe_request_id(value):
+    """``value`` if it is a plain id (letters, digits, ``_``, ``-``), else a fresh server id"""
+    if value and REQUEST_ID_PATTERN.fullmatch(value):
+        return value
+    return uuid.uuid4().hex
+
+
+class RequestProfile:
+    """Per-request state: identity, collected stack samples and SQL timings"""
+
+    def __init__(self, request_id, thread_id, method, path, forced):
+        self.request_id = request_id
+        self.thread_id = thread_id
+        self.method = method
+        self.path = path
+        self.forced = forced
+        self.sampling = forced
+        self.start = time.perf_counter()
+        self.stacks = Counter()
+        self.statements = []
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+
+class RequestProfiler:
+    """Opt-in sampling profiler for Flask requests.
+
+    A request is profiled from its first instruction when it wins the
+    ``sample_rate`` draw or, with ``allow_header``, carries the profile
+    header. Every other request is
+    watched, and stack sampling starts once it runs past ``slow_threshold_ms``,
+    so slow requests are captured without paying for sampling on fast ones.
+    Captured requests are written to ``output_dir`` as a ``.collapsed`` stack
+    file (flamegraph.pl / speedscope input) plus a ``.json`` summary holding
+    the request's SQL statements and their timings.
+    """
+
+    def __init__(self, enabled=False, sample_rate=0.0, slow_threshold_ms=1000, interval_ms=5,
+                 output_dir='profiles', header='X-Profile', max_statements=500, allow_header=False):
+        self.enabled = enabled
+        # Off by default: any client could otherwise force profiling of its requests
+        self.allow_header = allow_header
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold_ms / 1000 if slow_threshold_ms else None
+        self.interval = interval_ms / 1000
+        self.output_dir = output_dir
+        self.header = header
+        self.max_statements = max_statements
+        self._active = {}
+        self._lock = threading.Lock()
+        self._sampler = None
+        self._sql_listening = False
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            enabled=_env_flag('PROFILING_ENABLED'),
+            sample_rate=float(os.getenv('PROFILE_SAMPLE_RATE', '0.01')),
+            slow_threshold_ms=float(os.getenv('PROFILE_SLOW_MS', '1000')),
+            interval_ms=float(os.getenv('PROFILE_INTERVAL_MS', '5')),
+            output_dir=os.getenv('PROFILE_DIR', 'profiles'),
+            allow_header=_env_flag('PROFILE_ALLOW_HEADER')
+        )
+
+    def init_app(self, app):
+        """Register request hooks and SQL statement listeners"""
+        if not self.enabled:
+            return
+
+        from flask import g, request
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        @app.before_request
+        def _start_profile():
+            request_id = safe_request_id(request.headers.get('X-Request-ID'))
+            forced = ((self.allow_header and request.headers.get(self.header) == '1')
+                      or random.random() < self.sample_rate)
+            g.profile = self.start(request_id, request.method, request.path, forced)
+
+        @app.after_request
+        def _finish_profile(response):
+            profile = g.pop('profile', None)
+            if profile is not None:
+                response.headers['X-Request-ID'] = profile.request_id
+                self.finish(profile, response.status_code)
+            return response
+
+        # SQL listeners are process-wide; register them once per profiler
+        if self._sql_listening:
+            return
+        self._sql_listening = True
+
+        @event.listens_for(Engine, 'before_cursor_execute')
+        def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            conn.info.setdefault('profile_query_start', []).append(time.perf_counter())
+
+        @event.listens_for(Engine, 'after_cursor_execute')
+        def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+            duration = time.perf_counter() - conn.info['profile_query_start'].pop()
+            profile = self._active.get(threading.get_ident())
+            if profile is not None and len(profile.statements) < self.max_statements:
+                profile.statements.append((statement, duration))
+
+        @event.listens_for(Engine, 'handle_error')
+        def _discard_failed_statement(exception_context):
+            conn = exception_context.connection
+            if conn is not None and conn.info.get('profile_query_start'):
+                conn.info['profile_query_start'].pop()
+
+    def start(self, request_id, method, path, forced=False):
+        profile = RequestProfile(request_id, threading.get_ident(), method, path, forced)
+        with self._lock:
+            self._active[profile.thread_id] = profile
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample_loop, name='request-profiler', daemon=True)
+                self._sampler.start()
+        return profile
+
+    def finish(self, profile, status_code):
+        with self._lock:
+            self._active.pop(profile.thread_id, None)
+
+        duration = profile.elapsed
+        slow = self.slow_threshold is not None and duration >= self.slow_threshold
+        if not (profile.forced or slow):
+            return None
+
+        if slow:
+            logger.warning(f"Slow request {profile.request_id}: {profile.method} {profile.path} "
+                           f"took {duration * 1000:.0f}ms ({len(profile.statements)} SQL statements)")
+        try:
+            return self.write(profile, status_code, duration, slow)
+        except OSError as e:
+            logger.error(f"Error writing profile for request {profile.request_id}: {str(e)}")
+            return None
+
+    def write(self, profile, status_code, duration, slow):
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir,
+                            f"{time.strftime('%Y%m%dT%H%M%S')}_{safe_request_id(profile.request_id)}")
+
+        with open(base + '.collapsed', 'w') as f:
+            for stack, count in profile.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+        summary = {
+            'request_id': profile.request_id,
+            'method': profile.method,
+            'path': profile.path,
+            'status': status_code,
+            'duration_ms': round(duration * 1000, 3),
+            'trigger': 'slow' if slow and not profile.forced else 'sampled',
+            'sample_interval_ms': self.interval * 1000,
+            'samples': sum(profile.stacks.values()),
+            'sql_time_ms': round(sum(d for _, d in profile.statements) * 1000, 3),
+            'sql': [{'statement': s, 'duration_ms': round(d * 1000, 3)} for s, d in profile.statements]
+        }
+        with open(base + '.json', 'w') as f:
+            json.dump(summary, f, indent=2)
+
+        return base
+
+    def _sample_loop(self):
+        own_id = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                profiles = list(self._active.values())
+            if not profiles:
+                continue
+
+            due = []
+            for profile in profiles:
+                if not profile.sampling and self.slow_threshold is not None \
+                        and profile.elapsed >= self.slow_threshold:
+                    profile.sampling = True
+                if profile.sampling:
+                    due.append(profile)
+            if not due:
+                continue
+
+            frames = sys._current_frames()
+            for profile in due:
+                frame = frames.get(profile.thread_id)
+                if frame is not None and profile.thread_id != own_id:
+                    profile.stacks[collapse_stack(frame)] += 1
@@ -0,0 +1,208 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+# Refill rate (tokens per second) and bucket size
+Limit = namedtuple('Limit', ['rate', 'burst'])
+
+# Tokens are readings for ingest and requests for reports. Defaults let a
+# tenant backfill in large batches while one installation replaying its
+# buffer is held to a trickle once its burst is spent.
+DEFAULTS = {
+    'RATE_LIMIT_TENANT': '200:20000',
+    'RATE_LIMIT_INSTALLATION': '1:300',
+    'RATE_LIMIT_REPORT': '0.1:5'
+}
+
+Decision = namedtuple('Decision', ['allowed', 'retry_after', 'scope'])
+
+ALLOWED = Decision(True, 0.0, None)
+
+
+def parse_limit(value):
+    """``Limit`` from ``"rate:burst"`` (tokens per second : bucket size)"""
+    rate, burst = value.split(':')
+    limit = Limit(float(rate), float(burst))
+    if limit.rate <= 0 or limit.burst <= 0:
+        raise ValueError(f'rate limit {value!r} must be positive')
+    return limit
+
+
+# Seconds between sweeps of the in-process buckets for ones that have refilled
+SWEEP_SECONDS = 60
+
+
+class MemoryBuckets:
+    """Token buckets in this process's memory: exact per worker, not shared between workers.
+
+    A bucket that has refilled to its burst is the same as one never used,
+    so idle buckets are dropped every ``SWEEP_SECONDS`` and memory follows
+    the keys in active use rather than every key ever seen.
+    """
+
+    def __init__(self):
+        # key -> (tokens, updated, time the bucket is full again)
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._next_sweep = time.monotonic() + SWEEP_SECONDS
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def _sweep(self, now):
+        self._buckets = {key: state for key, state in self._buckets.items() if state[2] > now}
+        self._next_sweep = now + SWEEP_SECONDS
+
+    def acquire(self, requests):
+        """Take ``cost`` tokens from every ``(key, limit, cost)`` bucket, or from none.
+
+        Returns ``(None, 0)`` when allowed, else the index of the first
+        bucket that is short and the seconds until it would have enough.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if now >= self._next_sweep:
+                self._sweep(now)
+            levels = []
+            for index, (key, limit, cost) in enumerate(requests):
+                tokens, updated, _ = self._buckets.get(key, (limit.burst, now, now))
+                tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+                if tokens < cost:
+                    return index, (cost - tokens) / limit.rate
+                levels.append(tokens)
+            for (key, limit, cost), tokens in zip(requests, levels):
+                left = tokens - cost
+                self._buckets[key] = (left, now, now + (limit.burst - left) / limit.rate)
+        return None, 0.0
+
+
+# All-or-nothing take across several buckets, atomic inside Redis. Each bucket
+# is a hash {t: tokens, u: last update}; the server clock is used so app hosts
+# need not agree on the time. Returns {index of short bucket (1-based) or 0, wait}.
+_REDIS_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) + tonumber(now_parts[2]) / 1000000
+local levels = {}
+for i = 1, #KEYS do
+    local rate = tonumber(ARGV[(i - 1) * 3 + 1])
+    local burst = tonumber(ARGV[(i - 1) * 3 + 2])
+    local cost = tonumber(ARGV[(i - 1) * 3 + 3])
+    local state = redis.call('HMGET', KEYS[i], 't', 'u')
+    local tokens = tonumber(state[1]) or burst
+    local updated = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+    if tokens < cost then
+        return {i, tostring((cost - tokens) / rate)}
+    end
+    levels[i] = tokens
+end
+for i = 1, #KEYS do
+    local rate = tonumber(ARGV[(i - 1) * 3 + 1])
+    local burst = tonumber(ARGV[(i - 1) * 3 + 2])
+    local cost = tonumber(ARGV[(i - 1) * 3 + 3])
+    redis.call('HSET', KEYS[i], 't', tostring(levels[i] - cost), 'u', tostring(now))
+    redis.call('PEXPIRE', KEYS[i], math.ceil(burst / rate * 1000) + 1000)
+end
+return {0, '0'}
+"""
+
+
+class RedisBuckets:
+    """Token buckets in Redis, shared by every worker and host (redis is imported on first use)"""
+
+    def __init__(self, url, prefix='ratelimit:'):
+        import redis
+
+        self.prefix = prefix
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(_REDIS_SCRIPT)
+
+    def acquire(self, requests):
+        args = []
+        for _, limit, cost in requests:
+            args += [limit.rate, limit.burst, cost]
+        index, wait = self._script(keys=[self.prefix + key for key, _, _ in requests], args=args)
+        return (None, 0.0) if index == 0 else (index - 1, float(wait))
+
+
+class RateLimiter:
+    """Per-tenant and per-installation token buckets for ingest and reports.
+
+    Limits come from ``RATE_LIMIT_*`` (``"rate:burst"``) when first used,
+    with per-tenant overrides in ``RATE_LIMIT_TENANT_OVERRIDES``
+    (``acme=500:50000,...``). Buckets live in this process unless
+    ``RATE_LIMIT_REDIS_URL`` points at a shared Redis; if Redis is
+    unreachable requests are let through rather than rejected.
+    """
+
+    def __init__(self):
+        self._config = None
+        self._lock = threading.Lock()
+
+    def _configure(self):
+        if self._config is None:
+            with self._lock:
+                if self._config is None:
+                    limits = {name: parse_limit(os.getenv(name, default)) for name, default in DEFAULTS.items()}
+                    overrides = {}
+                    for item in os.getenv('RATE_LIMIT_TENANT_OVERRIDES', '').split(','):
+                        if '=' in item:
+                            tenant, value = item.split('=', 1)
+                            overrides[tenant.strip()] = parse_limit(value.strip())
+                    redis_url = os.getenv('RATE_LIMIT_REDIS_URL')
+                    self._config = {
+                        'enabled': os.getenv('RATE_LIMIT_ENABLED', 'true').lower() == 'true',
+                        'limits': limits,
+                        'tenant_overrides': overrides,
+                        'buckets': RedisBuckets(redis_url) if redis_url else MemoryBuckets()
+                    }
+        return self._config
+
+    def reset(self):
+        """Forget configuration and in-process buckets (limits are re-read from the environment)"""
+        with self._lock:
+            self._config = None
+
+    def _acquire(self, requests):
+        config = self._configure()
+        if not config['enabled'] or not requests:
+            return ALLOWED
+        for key, limit, cost in requests:
+            if cost > limit.burst:
+                # Could never succeed, however long the client waits
+                return Decision(False, None, key.split(':')[1])
+        try:
+            index, wait = config['buckets'].acquire(requests)
+        except Exception as e:
+            logger.warning(f"Rate limiter unavailable, allowing request: {str(e)}")
+            return ALLOWED
+        if index is None:
+            return ALLOWED
+        return Decision(False, wait, requests[index][0].split(':')[1])
+
+    def check_ingest(self, tenant_readings, installation_readings):
+        """Decision for ingesting readings: ``{tenant: count}`` and ``{installation_id: count}``"""
+        config = self._configure()
+        limits = config['limits']
+        requests = [(f'ingest:tenant:{tenant}', config['tenant_overrides'].get(tenant, limits['RATE_LIMIT_TENANT']),
+                     count) for tenant, count in sorted(tenant_readings.items())]
+        requests += [(f'ingest:installation:{installation_id}', limits['RATE_LIMIT_INSTALLATION'], count)
+                     for installation_id, count in sorted(installation_readings.items())]
+        return self._acquire(requests)
+
+    def check_report(self, tenant):
+        """Decision for generating one AI report for ``tenant``"""
+        return self._acquire([(f'report:tenant:{tenant}', self._configure()['limits']['RATE_LIMIT_REPORT'], 1)])
+
+
+def retry_after_header(decision):
+    """Whole seconds for a ``Retry-After`` header (at least 1)"""
+    return str(max(1, math.ceil(decision.retry_after)))
+
+
+rate_limiter = RateLimiter()
@@ -0,0 +1,179 @@
+import logging
+import math
+import os
+import threading
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from models import db, SolarInstallation
+
+logger = logging.getLogger(__name__)
+
+InstallationInfo = namedtuple('InstallationInfo', [
+    'id', 'name', 'location', 'latitude', 'longitude', 'capacity_kw', 'panel_count', 'climatic_zone', 'tenant_id'
+])
+
+
+class RegistrySnapshot:
+    """Immutable view of every installation, as a lookup dict plus column arrays.
+
+    Row ``i`` of every array describes ``ids[i]``; ``zone_codes`` index into
+    ``zones``. Vectorized paths map installation ids to rows with ``rows_for``
+    and then work on the arrays directly.
+    """
+
+    def __init__(self, infos, loaded_at):
+        self.loaded_at = loaded_at
+        self.by_id = {info.id: info for info in infos}
+        self.ids = np.array([info.id for info in infos], dtype=object)
+        self.row_of = {installation_id: row for row, installation_id in enumerate(self.ids)}
+        self.capacity_kw = np.array([info.capacity_kw for info in infos], dtype=np.float64)
+        self.latitude = np.array([info.latitude for info in infos], dtype=np.float64)
+        self.longitude = np.array([info.longitude for info in infos], dtype=np.float64)
+        self.zones, zone_codes = np.unique(
+            np.array([info.climatic_zone for info in infos], dtype=object).astype(str), return_inverse=True)
+        self.zone_codes = zone_codes.astype(np.int32)
+        self.tenant_ids = np.array([info.tenant_id for info in infos], dtype=object)
+
+        self._grid = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def grid(self):
+        """Spatial grid over the snapshot's coordinates, built on first use"""
+        if self._grid is None:
+            self._grid = GridIndex(self.latitude, self.longitude)
+        return self._grid
+
+    def rows_for(self, installation_ids):
+        """Array rows for ``installation_ids`` (-1 for unknown ids)"""
+        return np.fromiter((self.row_of.get(i, -1) for i in installation_ids), dtype=np.int64)
+
+
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_km(lat, lon, latitudes, longitudes):
+    """Great-circle distance from one point to arrays of points, in km"""
+    lat1, lon1 = np.radians(lat), np.radians(lon)
+    lat2, lon2 = np.radians(latitudes), np.radians(longitudes)
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class GridIndex:
+    """Fixed-size lat/lon grid mapping each cell to the snapshot rows inside it.
+
+    Nearest-site queries search rings of cells outwards from the query point
+    and stop once the closest candidate found is nearer than anything the
+    next ring could hold, so a lookup touches a handful of cells rather than
+    the whole fleet.
+    """
+
+    def __init__(self, latitude, longitude, cell_degrees=0.5):
+        self.cell_degrees = cell_degrees
+        self.latitude = latitude
+        self.longitude = longitude
+        self.cells = {}
+        for row, cell in enumerate(zip(self._cell(latitude), self._cell(longitude))):
+            self.cells.setdefault(cell, []).append(row)
+        self.cells = {cell: np.array(rows, dtype=np.int64) for cell, rows in self.cells.items()}
+
+    def _cell(self, value):
+        return np.floor(np.asarray(value) / self.cell_degrees).astype(np.int64)
+
+    def nearest(self, lat, lon, k=5, max_km=None):
+        """Rows and distances (km) of the ``k`` installations closest to (lat, lon)"""
+        if not self.cells:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        row0, col0 = int(self._cell(lat)), int(self._cell(lon))
+        # One cell is at least this wide in every direction (longitude shrinks towards the poles)
+        cell_km = self.cell_degrees * math.pi / 180 * EARTH_RADIUS_KM * max(
+            math.cos(math.radians(min(abs(lat) + self.cell_degrees, 90))), 0.01)
+        max_rings = int(180 / self.cell_degrees)
+
+        rows, distances = np.empty(0, dtype=np.int64), np.empty(0)
+        for ring in range(max_rings + 1):
+            found = [self.cells.get((row0 + dr, col0 + dc)) for dr in range(-ring, ring + 1)
+                     for dc in range(-ring, ring + 1) if max(abs(dr), abs(dc)) == ring]
+            found = [cell for cell in found if cell is not None]
+            if found:
+                candidates = np.concatenate(found)
+                rows = np.concatenate([rows, candidates])
+                distances = np.concatenate([distances, haversine_km(
+                    lat, lon, self.latitude[candidates], self.longitude[candidates])])
+
+            # Anything in ring + 1 or beyond is at least ring * cell_km away
+            reach = ring * cell_km
+            if len(rows) >= k and np.sort(distances)[k - 1] <= reach:
+                break
+            if max_km is not None and reach > max_km:
+                break
+            if len(rows) == len(self.latitude):
+                break
+
+        order = np.argsort(distances, kind='stable')[:k]
+        rows, distances = rows[order], distances[order]
+        if max_km is not None:
+            keep = distances <= max_km
+            rows, distances = rows[keep], distances[keep]
+        return rows, distances
+
+
+class InstallationRegistry:
+    """Process-wide cache of installation metadata, loaded with one query.
+
+    Invalidated explicitly when this process creates or updates an
+    installation. Because other workers may write too, a snapshot also
+    expires after ``ttl_seconds``, and a lookup miss reloads it (at most
+    once per ``miss_reload_seconds``) so newly onboarded sites are found
+    without waiting for the TTL.
+    """
+
+    def __init__(self, ttl_seconds=300, miss_reload_seconds=5):
+        self.ttl_seconds = ttl_seconds
+        self.miss_reload_seconds = miss_reload_seconds
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def snapshot(self):
+        snapshot = self._snapshot
+        if snapshot is None or time.monotonic() - snapshot.loaded_at > self.ttl_seconds:
+            snapshot = self._reload()
+        return snapshot
+
+    def get(self, installation_id):
+        """Metadata for one installation, or None if it does not exist"""
+        snapshot = self.snapshot()
+        info = snapshot.by_id.get(installation_id)
+        if info is None and time.monotonic() - snapshot.loaded_at > self.miss_reload_seconds:
+            info = self._reload().by_id.get(installation_id)
+        return info
+
+    def capacity_kw(self, installation_id):
+        info = self.get(installation_id)
+        return info.capacity_kw if info else None
+
+    def invalidate(self):
+        self._snapshot = None
+
+    def _reload(self):
+        with self._lock:
+            rows = db.session.query(
+                SolarInstallation.id, SolarInstallation.name, SolarInstallation.location,
+                SolarInstallation.latitude, SolarInstallation.longitude, SolarInstallation.capacity_kw,
+                SolarInstallation.panel_count, SolarInstallation.climatic_zone, SolarInstallation.tenant_id
+            ).all()
+            snapshot = RegistrySnapshot([InstallationInfo(*row) for row in rows], time.monotonic())
+            self._snapshot = snapshot
+        logger.debug(f"Installation registry loaded {len(snapshot)} installations")
+        return snapshot
+
+
+installation_registry = InstallationRegistry(
+    ttl_seconds=float(os.getenv('INSTALLATION_CACHE_TTL', '300'))
+)
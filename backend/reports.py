@@ -0,0 +1,70 @@
+import os
+import logging
+from metrics import FUNCTION_SECONDS, timed
+
+logger = logging.getLogger(__name__)
+
+def soiling_section(soiling):
+    """Prompt lines for the fitted soiling rate and cleaning schedule, if any"""
+    if not soiling:
+        return "Soiling: no estimate yet (not enough history)"
+    interval = soiling['optimal_interval_days']
+    days = soiling['days_since_cleaning']
+    cleaning = (f"{days} days since last cleaning" if soiling.get('last_cleaning_date')
+                else f"no cleaning seen in the last {days} days")
+    return (f"Soiling: output falls {soiling['soiling_rate_per_day']:.2%} per day; "
+            f"{cleaning}, now losing "
+            f"{soiling['current_loss_kwh_per_day']:.1f} kWh/day. "
+            f"Cost-optimal cleaning interval: {f'{interval:.0f} days' if interval else 'no cleaning needed'}, "
+            f"next cleaning due {soiling['next_cleaning_date'] or 'not scheduled'}")
+
+@timed(FUNCTION_SECONDS, function='generate_ai_report')
+def generate_ai_report(data):
+    """Generate AI-powered report using OpenAI GPT"""
+    try:
+        prompt = f"""
+        Generate a comprehensive solar energy performance report for the following installation:
+        
+        Installation: {data['installation']['name']}
+        Location: {data['installation']['location']}
+        Capacity: {data['installation']['capacity_kw']} kW
+        Panel Count: {data['installation']['panel_count']}
+        
+        Performance Summary:
+        - Average Power Generation: {data['performance_summary']['avg_power_kw']:.2f} kW
+        - Average Efficiency: {data['performance_summary']['avg_efficiency']:.1%}
+        - Maintenance Score: {data['performance_summary']['maintenance_score']:.0f}/100
+        
+        Active Alerts: {data['alerts_count']}
+        Recent Issues: {', '.join(data['recent_issues'])}
+        {soiling_section(data.get('soiling'))}
+        
+        Please provide:
+        1. Performance Analysis
+        2. Maintenance Recommendations
+        3. Optimization Suggestions
+        4. ROI Impact Assessment
+        5. Next Steps
+        
+        Keep the report professional and actionable.
+        """
+        
+        # Imported on first report: the OpenAI SDK is one of the slowest imports
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv('OPENAI_API_KEY', 'demo-key-for-testing'))
+        
+        response = client.chat.completions.create(
+            model="gpt-3.5-turbo",
+            messages=[
+                {"role": "system", "content": "You are a solar energy expert providing technical analysis and recommendations."},
+                {"role": "user", "content": prompt}
+            ],
+            max_tokens=1500,
+            temperature=0.7
+        )
+        
+        return response.choices[0].message.content
+        
+    except Exception as e:
+        logger.error(f"Error generating AI report: {str(e)}")
+        return "Report generation failed. Please check API configuration."
@@ -0,0 +1,294 @@
+import logging
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+from sqlalchemy import and_, delete, or_, select
+
+import alert_rules
+from anomaly import AnomalyDetector, InstallationDetector
+from feature_store import HISTORY, HISTORY_COLUMNS, RAW_COLUMNS, compute_features, feature_matrix, raw_columns
+from models import db, AlertArchive, AlertData, PredictionData, ReprocessCheckpoint, TelemetryData
+from registry import installation_registry
+
+logger = logging.getLogger(__name__)
+
+# Readings scored per batch; each batch is one transaction and one checkpoint
+BATCH_ROWS = int(os.getenv('REPROCESS_BATCH_ROWS', '20000'))
+
+# Rows per INSERT ... ON CONFLICT statement
+UPSERT_CHUNK_ROWS = 5000
+
+_TELEMETRY_COLUMNS = ['id', 'installation_id', 'timestamp', 'pv_power_kw'] + RAW_COLUMNS
+
+
+def job_name(since, until):
+    """Default checkpoint key: rerunning the same range resumes it"""
+    return f"{since.isoformat() if since else 'start'}..{until.isoformat() if until else 'end'}"
+
+
+def upsert(session, model, rows, keys, columns):
+    """Insert ``rows`` (dicts), updating ``columns`` of rows that already exist with the same ``keys``.
+
+    One ``INSERT ... ON CONFLICT DO UPDATE`` per chunk on PostgreSQL and
+    SQLite; other databases delete the conflicting rows first. The caller
+    commits.
+    """
+    if not rows:
+        return 0
+    dialect = session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        if dialect == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+            statement = insert(model.__table__)
+            statement = statement.on_conflict_do_update(
+                index_elements=keys, set_={column: statement.excluded[column] for column in columns})
+            session.execute(statement, rows[start:start + UPSERT_CHUNK_ROWS])
+    else:
+        table = model.__table__
+        for start in range(0, len(rows), UPSERT_CHUNK_ROWS):
+            chunk = rows[start:start + UPSERT_CHUNK_ROWS]
+            for row in chunk:
+                session.execute(delete(table).where(and_(*(table.c[key] == row[key] for key in keys))))
+            session.execute(table.insert(), chunk)
+    return len(rows)
+
+
+def _read_batch(installation_id, after, until, limit):
+    """Up to ``limit`` readings after the ``(timestamp, id)`` position ``after``, in that order"""
+    query = select(*(TelemetryData.__table__.c[name] for name in _TELEMETRY_COLUMNS)).where(
+        TelemetryData.installation_id == installation_id)
+    last_timestamp, last_id = after
+    if last_timestamp is not None:
+        query = query.where(or_(TelemetryData.timestamp > last_timestamp,
+                                and_(TelemetryData.timestamp == last_timestamp, TelemetryData.id > last_id)))
+    if until is not None:
+        query = query.where(TelemetryData.timestamp < until)
+    return db.session.execute(query.order_by(TelemetryData.timestamp, TelemetryData.id).limit(limit)).all()
+
+
+def _history_before(installation_id, timestamp):
+    """HISTORY_COLUMNS of the readings just before ``timestamp``, oldest first"""
+    if timestamp is None:
+        return {name: [] for name in HISTORY_COLUMNS}
+    previous = db.session.execute(
+        select(TelemetryData.pv_power_kw, TelemetryData.irradiation_wm2).where(
+            TelemetryData.installation_id == installation_id, TelemetryData.timestamp < timestamp
+        ).order_by(TelemetryData.timestamp.desc()).limit(HISTORY)
+    ).all()[::-1]
+    return {name: [getattr(row, name) or 0.0 for row in previous] for name in HISTORY_COLUMNS}
+
+
+def score_batch(model, installation, rows, history, detector):
+    """Predictions and alerts for a chronologically ordered batch of telemetry rows.
+
+    Features, predictions, maintenance scores and the threshold rules are
+    computed for the whole batch at once; only the anomaly detector, whose
+    state runs from reading to reading, walks the rows one by one.
+    Returns ``(prediction rows, alert rows)`` ready for ``upsert``.
+    """
+    raw = raw_columns(rows)
+    features = compute_features(raw, history, installation)
+    predicted = model.predict_matrix(feature_matrix(features))
+    efficiency = np.clip(predicted['efficiency'], 0, 1)
+    predicted['maintenance'] = alert_rules.maintenance_scores(
+        raw['dust_level'], raw['module_temp_c'], predicted['efficiency'], raw['inverter_efficiency'])
+
+    predictions = [{
+        'installation_id': installation.id,
+        'telemetry_id': row.id,
+        'timestamp': row.timestamp,
+        'predicted_power_kw': float(predicted['p50'][i]),
+        'predicted_power_p10_kw': float(predicted['p10'][i]),
+        'predicted_power_p90_kw': float(predicted['p90'][i]),
+        'actual_power_kw': row.pv_power_kw,
+        'efficiency_score': float(efficiency[i]),
+        'maintenance_score': float(predicted['maintenance'][i])
+    } for i, row in enumerate(rows)]
+
+    fired = alert_rules.evaluate(raw, predicted, features['cos_zenith'], installation)
+    if detector is not None:
+        for i, row in enumerate(rows):
+            fired.extend((i, alert) for alert in detector.update(installation, row))
+    alerts = [{
+        'installation_id': installation.id,
+        'telemetry_id': rows[i].id,
+        'timestamp': rows[i].timestamp,
+        'alert_type': alert['type'],
+        'severity': alert['severity'],
+        'message': alert['message'],
+        'resolved': False
+    } for i, alert in fired]
+    return predictions, alerts
+
+
+def _archived_alerts(session, telemetry_ids):
+    """``(telemetry_id, alert_type)`` of alerts on these readings already resolved and archived"""
+    archived = set()
+    for start in range(0, len(telemetry_ids), UPSERT_CHUNK_ROWS):
+        archived.update(session.execute(select(AlertArchive.telemetry_id, AlertArchive.alert_type).where(
+            AlertArchive.telemetry_id.in_(telemetry_ids[start:start + UPSERT_CHUNK_ROWS]))).tuples())
+    return archived
+
+
+def _remove_stale_alerts(session, telemetry_ids, alerts, alert_types=None):
+    """Delete open alerts on these readings (of ``alert_types``, default all) that are no longer raised"""
+    current = {(alert['telemetry_id'], alert['alert_type']) for alert in alerts}
+    stale = []
+    for start in range(0, len(telemetry_ids), UPSERT_CHUNK_ROWS):
+        query = select(AlertData.id, AlertData.telemetry_id, AlertData.alert_type).where(
+            AlertData.telemetry_id.in_(telemetry_ids[start:start + UPSERT_CHUNK_ROWS]),
+            AlertData.resolved.is_(False))
+        if alert_types is not None:
+            query = query.where(AlertData.alert_type.in_(alert_types))
+        stale.extend(alert_id for alert_id, telemetry_id, alert_type in session.execute(query)
+                     if (telemetry_id, alert_type) not in current)
+    for start in range(0, len(stale), UPSERT_CHUNK_ROWS):
+        session.execute(delete(AlertData).where(AlertData.id.in_(stale[start:start + UPSERT_CHUNK_ROWS])))
+    return len(stale)
+
+
+def _store_scores(session, rows, predictions, alerts, alert_types):
+    """Upsert a scored batch's predictions and alerts; returns the alerts kept"""
+    telemetry_ids = [row.id for row in rows]
+    upsert(session, PredictionData, predictions, ['telemetry_id'],
+           [name for name in predictions[0] if name != 'telemetry_id'])
+    # An archived alert was dealt with already; don't reopen it
+    archived = _archived_alerts(session, telemetry_ids)
+    if archived:
+        alerts = [alert for alert in alerts if (alert['telemetry_id'], alert['alert_type']) not in archived]
+    _remove_stale_alerts(session, telemetry_ids, alerts, alert_types)
+    upsert(session, AlertData, alerts, ['telemetry_id', 'alert_type'],
+           ['installation_id', 'timestamp', 'severity', 'message'])
+    return alerts
+
+
+def rescore(session, installation, model, telemetry):
+    """Replace the prediction and threshold alerts of a stored reading whose values changed.
+
+    Scored like a one-row reprocessing batch, without a checkpoint; anomaly
+    alerts are left alone because the streaming detector cannot revisit the
+    past. The caller commits. Returns the number of alerts now raised.
+    """
+    history = _history_before(installation.id, telemetry.timestamp)
+    predictions, alerts = score_batch(model, installation, [telemetry], history, None)
+    return len(_store_scores(session, [telemetry], predictions, alerts, alert_rules.RULE_ALERT_TYPES))
+
+
+def reprocess_installation(installation_id, model, since=None, until=None, job=None, anomalies=True,
+                           batch_rows=None):
+    """Re-score one installation's telemetry in ``[since, until)`` and re-evaluate its alerts.
+
+    Readings are read in ``(timestamp, id)`` order, ``batch_rows`` at a
+    time. Each batch's predictions and alerts are upserted on their
+    ``telemetry_id`` and committed together with the job's checkpoint, so an
+    interrupted run resumes after the last committed batch. Returns
+    ``(rows, predictions, alerts)`` processed by this call.
+    """
+    session = db.session
+    installation = installation_registry.get(installation_id)
+    if installation is None:
+        raise ValueError(f'unknown installation {installation_id}')
+    job = job or job_name(since, until)
+    batch_rows = batch_rows or BATCH_ROWS
+
+    checkpoint = session.get(ReprocessCheckpoint, (job, installation_id))
+    if checkpoint is None:
+        checkpoint = ReprocessCheckpoint(job=job, installation_id=installation_id, rows=0, predictions=0, alerts=0,
+                                         completed=False)
+        session.add(checkpoint)
+    if checkpoint.completed:
+        return 0, 0, 0
+
+    if checkpoint.last_timestamp is not None:
+        after = (checkpoint.last_timestamp, checkpoint.last_telemetry_id)
+    elif since is not None:
+        # Strictly after (since, 0) is every reading at or after since
+        after = (since, 0)
+    else:
+        after = (None, None)
+    rows = _read_batch(installation_id, after, until, batch_rows)
+    history = _history_before(installation_id, rows[0].timestamp if rows else None)
+
+    detector = None
+    if anomalies:
+        # A private detector replays the range; the serving workers' state is untouched
+        detector = AnomalyDetector()
+        state = checkpoint.detector_state and InstallationDetector.from_bytes(checkpoint.detector_state,
+                                                                              detector.config)
+        if state:
+            detector.restore(installation_id, state)
+    alert_types = None if anomalies else alert_rules.RULE_ALERT_TYPES
+
+    totals = [0, 0, 0]
+    while rows:
+        predictions, alerts = score_batch(model, installation, rows, history, detector)
+        alerts = _store_scores(session, rows, predictions, alerts, alert_types)
+
+        checkpoint.last_timestamp = rows[-1].timestamp
+        checkpoint.last_telemetry_id = rows[-1].id
+        checkpoint.rows += len(rows)
+        checkpoint.predictions += len(predictions)
+        checkpoint.alerts += len(alerts)
+        if detector is not None:
+            state = detector.state(installation_id)
+            checkpoint.detector_state = state.to_bytes() if state else None
+        checkpoint.updated_at = datetime.utcnow()
+        session.commit()
+        totals = [totals[0] + len(rows), totals[1] + len(predictions), totals[2] + len(alerts)]
+
+        history = {name: ([*history[name], *(getattr(row, name) or 0.0 for row in rows)])[-HISTORY:]
+                   for name in HISTORY_COLUMNS}
+        if len(rows) < batch_rows:
+            break
+        rows = _read_batch(installation_id, (rows[-1].timestamp, rows[-1].id), until, batch_rows)
+
+    checkpoint.completed = True
+    checkpoint.updated_at = datetime.utcnow()
+    session.commit()
+    return tuple(totals)
+
+
+def _reprocess_one(installation_id, since, until, job, anomalies, batch_rows):
+    """Reprocess one installation inside a worker; never raises"""
+    from training import worker_app, worker_cache
+
+    start = time.perf_counter()
+    result = {'installation_id': installation_id, 'ok': False, 'rows': 0, 'predictions': 0, 'alerts': 0,
+              'error': None}
+    try:
+        with worker_app().app_context():
+            cache = worker_cache()
+            # The saved model if there is one, so history is scored by what serves live traffic
+            model = cache.get(installation_id) or cache.train(installation_id)
+            if model is None:
+                result['error'] = 'no trained model'
+            else:
+                rows, predictions, alerts = reprocess_installation(
+                    installation_id, model, since, until, job, anomalies, batch_rows)
+                result.update(ok=True, rows=rows, predictions=predictions, alerts=alerts)
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def reprocess_all(installation_ids, config, since=None, until=None, job=None, anomalies=True, workers=None,
+                  batch_rows=None, on_result=None):
+    """Reprocess every installation in parallel worker processes (see ``reprocess_installation``)"""
+    from training import map_installations
+
+    job = job or job_name(since, until)
+    return map_installations(_reprocess_one, installation_ids, config, workers, on_result,
+                             args=(since, until, job, anomalies, batch_rows))
+
+
+def clear_checkpoints(job):
+    """Forget a job's progress so the next run starts from the beginning of its range"""
+    count = db.session.execute(delete(ReprocessCheckpoint).where(ReprocessCheckpoint.job == job)).rowcount
+    db.session.commit()
+    return count
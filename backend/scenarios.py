@@ -0,0 +1,469 @@
+import json
+import logging
+import math
+from collections import namedtuple
+from datetime import datetime, timedelta
+from statistics import NormalDist
+
+import numpy as np
+
+from bulk_load import MEASUREMENT_COLUMNS
+from solar_geometry import CLEAR_SKY_GHI, band_of, cloudy_sky_ghi, solar_tables, solar_time_index
+
+logger = logging.getLogger(__name__)
+
+# Synthetic fleet scenarios for load and accuracy testing. Unlike
+# data_simulator.py, whose weather and faults are drawn independently per
+# reading, a scenario is generated for all sites at once, a chunk of time at a
+# time, as (sites x timestamps) arrays:
+#
+#   clouds   a Gaussian random field over site coordinates (random Fourier
+#            features) whose coefficients evolve as AR(1) processes, one
+#            mesoscale field (tens of km, hours) and one synoptic field
+#            (hundreds of km, days), so neighbours share clouds
+#   regimes  winter / pre-monsoon / monsoon / post-monsoon by day of year, the
+#            southwest monsoon arriving later and leaving earlier further
+#            north, with year-to-year jitter
+#   faults   soiling that builds up at a per-site rate and is washed off by
+#            rain or scheduled cleaning, plus sampled multi-day inverter
+#            degradation and string outage episodes
+#
+# Every reading carries ground-truth fault bits and every fault episode is
+# recorded, so alerts raised on the data can be scored (score_alerts).
+SOILING = 1
+INVERTER_DEGRADATION = 2
+STRING_OUTAGE = 4
+
+FAULTS = {'soiling': SOILING, 'inverter_degradation': INVERTER_DEGRADATION, 'string_outage': STRING_OUTAGE}
+
+# Alert types that count as detecting each fault
+DETECTING_ALERTS = {
+    'soiling': ('DUST_ACCUMULATION', 'LOW_POWER', 'PERFORMANCE_DEGRADATION', 'MAINTENANCE_REQUIRED'),
+    'inverter_degradation': ('INVERTER_ISSUE', 'INVERTER_DRIFT', 'LOW_POWER', 'PERFORMANCE_DEGRADATION',
+                             'MAINTENANCE_REQUIRED'),
+    'string_outage': ('LOW_POWER', 'PERFORMANCE_ANOMALY', 'PERFORMANCE_DEGRADATION')
+}
+
+REGIMES = ('winter', 'pre_monsoon', 'monsoon', 'post_monsoon')
+
+# zone -> base temperature (C), seasonal amplitude (C), dry-season and monsoon
+# cloud cover (fraction of time cloudy), clean-panel soiling rate (loss per day)
+ZONES = {
+    'tropical': (27.0, 3.0, 0.25, 0.80, 0.0015),
+    'semi-arid': (26.0, 7.0, 0.15, 0.65, 0.0030),
+    'arid': (27.0, 9.0, 0.08, 0.45, 0.0050),
+    'temperate': (17.0, 8.0, 0.30, 0.60, 0.0010)
+}
+
+# Soiling rate multiplier per regime (monsoon ground is wet, pre-monsoon brings dust storms)
+REGIME_SOILING = (1.0, 1.5, 0.3, 0.8)
+
+DEFAULT_CONFIG = {
+    'cloud_length_km': 30.0,
+    'cloud_hours': 2.0,
+    'synoptic_length_km': 400.0,
+    'synoptic_days': 3.0,
+    'synoptic_share': 0.5,
+    'cloud_features': 256,
+    'monsoon': True,
+    'inverter_faults_per_year': 0.5,
+    'inverter_fault_days': 20.0,
+    'string_outages_per_year': 1.0,
+    'string_outage_days': 4.0,
+    'string_kw': 5.0,
+    'never_cleaned_share': 0.3,
+    'cleaning_days': (20, 90),
+    'soiling_label_loss': 0.1
+}
+
+# Readings generated per chunk (sites x timestamps), bounding memory
+CHUNK_CELLS = 1000000
+
+# Sites for synthetic_installations: (city, latitude, longitude, climatic zone)
+CITIES = [
+    ('Mumbai', 19.076, 72.878, 'tropical'),
+    ('Delhi', 28.704, 77.103, 'semi-arid'),
+    ('Bangalore', 12.972, 77.595, 'tropical'),
+    ('Chennai', 13.083, 80.271, 'tropical'),
+    ('Kolkata', 22.573, 88.364, 'tropical'),
+    ('Hyderabad', 17.385, 78.487, 'semi-arid'),
+    ('Ahmedabad', 23.023, 72.571, 'semi-arid'),
+    ('Pune', 18.520, 73.857, 'semi-arid'),
+    ('Jaipur', 26.912, 75.787, 'arid'),
+    ('Jodhpur', 26.238, 73.024, 'arid'),
+    ('Lucknow', 26.847, 80.947, 'semi-arid'),
+    ('Shimla', 31.105, 77.173, 'temperate')
+]
+
+EARTH_RADIUS_KM = 6371.0
+
+ScenarioChunk = namedtuple('ScenarioChunk', ['timestamps', 'installation_ids', 'columns', 'labels',
+                                             'cloud_fraction'])
+
+
+def synthetic_installations(count, seed=42, prefix='SCN'):
+    """Installation records (as accepted by ``installations.bulk_upsert``) clustered around Indian cities"""
+    rng = np.random.default_rng(seed)
+    cities = rng.integers(len(CITIES), size=count)
+    offsets = rng.normal(0, 0.3, size=(count, 2))
+    capacities = rng.choice([5.0, 10.0, 25.0, 50.0, 100.0, 200.0, 1000.0], size=count,
+                            p=[0.3, 0.2, 0.15, 0.15, 0.1, 0.07, 0.03])
+    records = []
+    for index in range(count):
+        city, latitude, longitude, zone = CITIES[cities[index]]
+        records.append({
+            'id': f'{prefix}_{index + 1:05d}',
+            'name': f'{city} Scenario Site {index + 1}',
+            'location': city,
+            'latitude': round(latitude + offsets[index, 0], 4),
+            'longitude': round(longitude + offsets[index, 1], 4),
+            'capacity_kw': float(capacities[index]),
+            'panel_count': int(capacities[index] * 4),
+            'climatic_zone': zone
+        })
+    return records
+
+
+class _CloudField:
+    """Gaussian random field over sites with squared-exponential correlation ``length_km``.
+
+    Random Fourier features turn the field into ``features`` coefficients
+    shared by all sites; each coefficient is an AR(1) process with
+    correlation time ``hours``, so a chunk is one matrix product.
+    """
+
+    def __init__(self, xy_km, length_km, hours, features, rng):
+        frequencies = rng.normal(0, 1 / length_km, size=(features, 2))
+        phases = rng.uniform(0, 2 * np.pi, size=features)
+        self.basis = (np.sqrt(2 / features) * np.cos(xy_km @ frequencies.T + phases)).astype(np.float32)
+        self.hours = hours
+        self.state = rng.standard_normal(features)
+
+    def advance(self, steps, interval_minutes, rng):
+        """Field values (sites x steps), approximately standard normal at every site"""
+        rho = math.exp(-interval_minutes / 60 / self.hours)
+        noise = rng.standard_normal((steps, len(self.state))) * math.sqrt(1 - rho ** 2)
+        coefficients = np.empty((steps, len(self.state)))
+        state = self.state
+        for step in range(steps):
+            state = rho * state + noise[step]
+            coefficients[step] = state
+        self.state = state
+        return self.basis @ coefficients.T.astype(np.float32)
+
+
+class Scenario:
+    """Correlated weather and labelled faults for a fleet over ``[start, end)``.
+
+    ``installations`` are dicts with ``id``, ``latitude``, ``longitude``,
+    ``capacity_kw`` and ``climatic_zone``; ``config`` overrides entries of
+    ``DEFAULT_CONFIG``. ``chunks`` yields the readings in time order;
+    ``episodes`` lists the ground-truth fault episodes once they have all
+    been generated. The same seed always produces the same scenario.
+    """
+
+    def __init__(self, installations, start, end, interval_minutes=15, seed=42, config=None):
+        if end <= start:
+            raise ValueError('end must be after start')
+        self.config = dict(DEFAULT_CONFIG, **(config or {}))
+        self.start, self.end = start, end
+        self.interval_minutes = interval_minutes
+        self.seed = seed
+        self.ids = [str(inst['id']) for inst in installations]
+        self.latitude = np.array([inst['latitude'] for inst in installations], dtype=float)
+        self.longitude = np.array([inst['longitude'] for inst in installations], dtype=float)
+        self.capacity = np.array([inst['capacity_kw'] for inst in installations], dtype=float)
+        zones = [ZONES.get(inst.get('climatic_zone'), ZONES['tropical']) for inst in installations]
+        (self.base_temp, self.season_amp, self.dry_cover,
+         self.monsoon_cover, self.soiling_rate) = (np.array(column) for column in zip(*zones))
+        self.steps = int((end - start).total_seconds() // 60 // interval_minutes)
+        self._sampled = self._sample_faults(np.random.default_rng([seed, 1]))
+
+    def _sample_faults(self, rng):
+        """Inverter degradation and string outage episodes, drawn up front for the whole period"""
+        cfg = self.config
+        sites, years = len(self.ids), self.steps * self.interval_minutes / 525600
+        episodes = []
+        for fault, per_year, median_days in (
+                ('inverter_degradation', cfg['inverter_faults_per_year'], cfg['inverter_fault_days']),
+                ('string_outage', cfg['string_outages_per_year'], cfg['string_outage_days'])):
+            counts = rng.poisson(per_year * years, size=sites)
+            site = np.repeat(np.arange(sites), counts)
+            start = rng.uniform(0, self.steps, size=len(site)).astype(int)
+            days = rng.lognormal(math.log(median_days), 0.6, size=len(site))
+            end = np.minimum(start + np.maximum(1, (days * 1440 / self.interval_minutes).astype(int)), self.steps)
+            if fault == 'inverter_degradation':
+                # Efficiency points lost once the ramp is complete
+                severity = rng.uniform(5, 15, size=len(site))
+                ramp = rng.uniform(2, 10, size=len(site)) * 1440 / self.interval_minutes
+            else:
+                # Share of strings offline
+                strings = np.maximum(1, np.round(self.capacity[site] / cfg['string_kw']))
+                offline = np.minimum(strings, 1 + rng.poisson(0.3, size=len(site)))
+                severity = offline / strings
+                ramp = np.zeros(len(site))
+            episodes.extend(zip([fault] * len(site), site.tolist(), start.tolist(), end.tolist(),
+                                severity.tolist(), ramp.tolist()))
+        episodes.sort(key=lambda episode: (episode[2], episode[1]))
+        return episodes
+
+    def _timestamp(self, step):
+        return self.start + timedelta(minutes=step * self.interval_minutes)
+
+    def episodes(self):
+        """Ground-truth fault episodes ``{installation_id, fault, start, end, severity}`` (complete after ``chunks``)"""
+        episodes = [{'installation_id': self.ids[site], 'fault': fault, 'start': self._timestamp(start),
+                     'end': self._timestamp(end), 'severity': round(severity, 4)}
+                    for fault, site, start, end, severity, _ in self._sampled]
+        episodes.extend(self._soiling_episodes)
+        episodes.sort(key=lambda episode: (episode['start'], episode['installation_id']))
+        return episodes
+
+    def chunks(self, chunk_cells=CHUNK_CELLS):
+        """Yield ``ScenarioChunk``s covering the period in order; each call starts from the beginning"""
+        cfg = self.config
+        sites = len(self.ids)
+        rng = np.random.default_rng([self.seed, 2])
+
+        # Equirectangular projection is plenty at cloud scales
+        xy_km = np.column_stack([
+            np.radians(self.longitude) * math.cos(math.radians(float(np.mean(self.latitude)))),
+            np.radians(self.latitude)]) * EARTH_RADIUS_KM
+        fields = [
+            _CloudField(xy_km, cfg['cloud_length_km'], cfg['cloud_hours'], cfg['cloud_features'], rng),
+            _CloudField(xy_km, cfg['synoptic_length_km'], cfg['synoptic_days'] * 24, cfg['cloud_features'], rng)
+        ]
+        share = cfg['synoptic_share']
+
+        # Per-site regime cloud thresholds: P(field > threshold) = cloud cover of the regime
+        north = self.latitude > 23
+        covers = np.column_stack([self.dry_cover + 0.1 * north, self.dry_cover,
+                                  self.monsoon_cover if cfg['monsoon'] else self.dry_cover, self.dry_cover * 1.5])
+        normal = NormalDist()
+        thresholds = np.vectorize(lambda cover: normal.inv_cdf(1 - min(max(cover, 0.01), 0.99)))(covers)
+
+        # Southwest monsoon: onset ~1 June at 10N to ~8 July at 28N, withdrawal mid-September to mid-October
+        latitude = np.clip(self.latitude, 8, 32)
+        onset = 152 + 2.0 * (latitude - 10)
+        withdrawal = 288 - 1.5 * (latitude - 10)
+        years = self.end.year - self.start.year + 1
+        onset_shift, withdrawal_shift = rng.normal(0, 7, size=(2, years))
+
+        healthy_inverter = rng.uniform(95.5, 97.5, size=sites)
+        soiling_rate = self.soiling_rate * rng.lognormal(0, 0.4, size=sites)
+        cleaning_days = np.where(rng.random(sites) < cfg['never_cleaned_share'], np.inf,
+                                 rng.uniform(*cfg['cleaning_days'], size=sites))
+        cleaning_phase = rng.uniform(0, 1, size=sites) * np.where(np.isfinite(cleaning_days), cleaning_days, 0)
+
+        soiling = np.zeros(sites)
+        cleaning_round = np.floor(cleaning_phase / cleaning_days)
+        open_start = np.full(sites, -1)
+        open_peak = np.zeros(sites)
+        self._soiling_episodes = []
+
+        bands = band_of(self.latitude)
+        chunk_steps = max(1, chunk_cells // max(1, sites))
+        for first in range(0, self.steps, chunk_steps):
+            steps = min(chunk_steps, self.steps - first)
+            index = np.arange(first, first + steps)
+            times = np.datetime64(self.start, 'm') + (index * self.interval_minutes).astype('timedelta64[m]')
+            days = index * self.interval_minutes / 1440
+            day_of_year = (times.astype('datetime64[D]') - times.astype('datetime64[Y]')).astype(int) + 1
+            year = times.astype('datetime64[Y]').astype(int) + 1970 - self.start.year
+
+            monsoon = ((day_of_year >= onset[:, None] + onset_shift[year])
+                       & (day_of_year < withdrawal[:, None] + withdrawal_shift[year]))
+            winter = np.broadcast_to((day_of_year >= 335) | (day_of_year < 60), monsoon.shape)
+            regime = np.where(monsoon, 2, np.where(winter, 0, np.where(day_of_year < onset[:, None], 1, 3)))
+
+            field = (math.sqrt(1 - share) * fields[0].advance(steps, self.interval_minutes, rng)
+                     + math.sqrt(share) * fields[1].advance(steps, self.interval_minutes, rng))
+            threshold = np.take_along_axis(thresholds, regime, axis=1)
+            cloud = 1 / (1 + np.exp(-(field - threshold) / 0.35))
+            rain = (cloud > 0.97) & (field > threshold + 1.0)
+
+            clear_sky = np.empty((sites, steps), dtype=np.float32)
+            for band in np.unique(bands):
+                rows = np.flatnonzero(bands == band)
+                day, minute = solar_time_index(np.broadcast_to(times, (len(rows), steps)),
+                                               self.longitude[rows, None])
+                clear_sky[rows] = solar_tables.table(int(band))[CLEAR_SKY_GHI, day, minute]
+            irradiation = np.maximum(0, cloudy_sky_ghi(clear_sky, cloud) * rng.normal(1, 0.02, size=cloud.shape))
+
+            # Weather: seasonal cycle (peak mid-May, cooler monsoon), diurnal cycle damped by cloud
+            solar_hour = ((times.astype('datetime64[m]').astype(np.int64) % 1440)[None, :] / 60
+                          + self.longitude[:, None] / 15) % 24
+            seasonal = (self.base_temp[:, None] - 3 * monsoon
+                        + self.season_amp[:, None] * np.cos(2 * np.pi * (day_of_year - 135) / 365))
+            diurnal = (5 + 3 * (1 - cloud)) * np.cos(2 * np.pi * (solar_hour - 15) / 24)
+            ambient_temp = seasonal + diurnal + rng.normal(0, 0.8, size=cloud.shape)
+            wind_speed = np.maximum(0, (3 + 2 * monsoon) * (1 + 0.3 * field) + rng.normal(0, 0.8, size=cloud.shape))
+            humidity = np.clip(np.where(monsoon, 85, 45) - 12 * np.cos(2 * np.pi * (solar_hour - 15) / 24)
+                               + 10 * cloud + rng.normal(0, 4, size=cloud.shape), 5, 100)
+            module_temp = ambient_temp + irradiation * 0.03 - 0.5 * wind_speed * irradiation / 1000
+
+            # Soiling builds up and resets on rain or a cleaning round; loss is
+            # (carried loss + cumulative deposit) - deposit total at the last reset
+            rate = soiling_rate[:, None] * np.take(REGIME_SOILING, regime)
+            total = soiling[:, None] + np.cumsum(rate * self.interval_minutes / 1440, axis=1)
+            rounds = np.floor((days[None, :] + cleaning_phase[:, None]) / cleaning_days[:, None])
+            reset = rain | (rounds != np.column_stack([cleaning_round, rounds[:, :-1]]))
+            loss = np.minimum(total - np.maximum.accumulate(np.where(reset, total, 0), axis=1), 0.6)
+            soiling, cleaning_round = loss[:, -1], rounds[:, -1]
+            dust_level = np.clip(loss / 0.3 + rng.normal(0, 0.03, size=cloud.shape), 0, 1)
+
+            labels = np.where(loss >= cfg['soiling_label_loss'], SOILING, 0).astype(np.uint8)
+            inverter_drop = np.zeros((sites, steps))
+            strings_lost = np.zeros((sites, steps))
+            for fault, site, start, end, severity, ramp in self._sampled:
+                if start >= first + steps:
+                    break
+                if end <= first:
+                    continue
+                span = slice(max(start, first) - first, min(end, first + steps) - first)
+                if fault == 'inverter_degradation':
+                    progress = (index[span] - start + 1) / max(ramp, 1)
+                    inverter_drop[site, span] = np.maximum(inverter_drop[site, span],
+                                                           severity * np.minimum(1, progress))
+                    labels[site, span] |= INVERTER_DEGRADATION
+                else:
+                    strings_lost[site, span] = np.maximum(strings_lost[site, span], severity)
+                    labels[site, span] |= STRING_OUTAGE
+
+            inverter_efficiency = healthy_inverter[:, None] - inverter_drop + rng.normal(0, 0.3, size=cloud.shape)
+            efficiency = 0.85 * (1 - 0.004 * (module_temp - 25))
+            pv_power = (self.capacity[:, None] * irradiation / 1000 * efficiency * (1 - loss) * (1 - strings_lost)
+                        * inverter_efficiency / healthy_inverter[:, None] * rng.normal(1, 0.01, size=cloud.shape))
+
+            self._track_soiling(labels & SOILING > 0, loss, first, open_start, open_peak)
+            columns = {
+                'pv_power_kw': np.round(np.maximum(0, pv_power), 3),
+                'irradiation_wm2': np.round(irradiation, 1),
+                'module_temp_c': np.round(module_temp, 1),
+                'ambient_temp_c': np.round(ambient_temp, 1),
+                'wind_speed_ms': np.round(wind_speed, 1),
+                'humidity_percent': np.round(humidity, 1),
+                'dust_level': np.round(dust_level, 2),
+                'inverter_efficiency': np.round(inverter_efficiency, 1)
+            }
+            yield ScenarioChunk(times, self.ids, columns, labels, cloud.astype(np.float32))
+
+        for site in np.flatnonzero(open_start >= 0):
+            self._close_soiling(site, open_start[site], self.steps, open_peak[site])
+
+    def _track_soiling(self, soiled, loss, first, open_start, open_peak):
+        """Turn runs of soiled readings into episodes, carrying open runs across chunks"""
+        previous = (open_start >= 0)[:, None]
+        changes = soiled != np.concatenate([previous, soiled[:, :-1]], axis=1)
+        segment_from = np.zeros(len(soiled), dtype=int)
+        for site, step in zip(*np.nonzero(changes)):
+            if soiled[site, step]:
+                open_start[site], open_peak[site], segment_from[site] = first + step, 0, step
+            else:
+                peak = max(open_peak[site], loss[site, segment_from[site]:step].max(initial=0))
+                self._close_soiling(site, open_start[site], first + step, peak)
+                open_start[site] = -1
+        columns = np.arange(soiled.shape[1])[None, :]
+        still_open = open_start >= 0
+        tail = np.where(columns >= segment_from[:, None], loss, 0).max(axis=1, initial=0)
+        open_peak[still_open] = np.maximum(open_peak[still_open], tail[still_open])
+
+    def _close_soiling(self, site, start, end, peak):
+        self._soiling_episodes.append({'installation_id': self.ids[site], 'fault': 'soiling',
+                                       'start': self._timestamp(int(start)), 'end': self._timestamp(int(end)),
+                                       'severity': round(float(peak), 4)})
+
+
+def chunk_columns(chunk):
+    """Column arrays for ``bulk_load`` (see ``bulk_load.rows_to_columns``), installation by installation"""
+    sites, steps = chunk.labels.shape
+    columns = {'installation_id': np.repeat(np.array(chunk.installation_ids, dtype=object), steps),
+               'timestamp': np.tile(chunk.timestamps.astype('datetime64[us]'), sites)}
+    columns.update((name, chunk.columns[name].ravel().astype(np.float64)) for name in MEASUREMENT_COLUMNS)
+    return columns
+
+
+def save_episodes(path, scenario):
+    """Write the scenario's parameters and ground-truth episodes as JSON"""
+    with open(path, 'w') as f:
+        json.dump({
+            'start': scenario.start.isoformat(),
+            'end': scenario.end.isoformat(),
+            'interval_minutes': scenario.interval_minutes,
+            'seed': scenario.seed,
+            'installation_ids': scenario.ids,
+            'episodes': [dict(episode, start=episode['start'].isoformat(), end=episode['end'].isoformat())
+                         for episode in scenario.episodes()]
+        }, f, indent=1)
+
+
+def load_episodes(path):
+    with open(path) as f:
+        labels = json.load(f)
+    for key in ('start', 'end'):
+        labels[key] = datetime.fromisoformat(labels[key])
+    for episode in labels['episodes']:
+        episode['start'] = datetime.fromisoformat(episode['start'])
+        episode['end'] = datetime.fromisoformat(episode['end'])
+    return labels
+
+
+def score_alerts(episodes, alerts, grace=timedelta(hours=24)):
+    """Alert precision and fault recall against ground-truth episodes.
+
+    ``alerts`` are ``(installation_id, timestamp, alert_type)``. An alert is
+    a true positive when it falls inside an episode (or within ``grace``
+    after it ends) of a fault its type detects (``DETECTING_ALERTS``); an
+    episode is detected when such an alert falls inside it. Alert types
+    that detect no fault (e.g. HIGH_TEMPERATURE) are only counted.
+    """
+    by_site = {}
+    for episode in episodes:
+        by_site.setdefault(episode['installation_id'], []).append(episode)
+
+    alert_counts, true_alerts, other_alerts = {}, {}, {}
+    first_alert = {}
+    for installation_id, timestamp, alert_type in alerts:
+        faults = [fault for fault, types in DETECTING_ALERTS.items() if alert_type in types]
+        if not faults:
+            other_alerts[alert_type] = other_alerts.get(alert_type, 0) + 1
+            continue
+        alert_counts[alert_type] = alert_counts.get(alert_type, 0) + 1
+        hit = False
+        for index, episode in enumerate(by_site.get(installation_id, ())):
+            if episode['fault'] not in faults or not episode['start'] <= timestamp < episode['end'] + grace:
+                continue
+            hit = True
+            if timestamp < episode['end']:
+                key = (installation_id, index)
+                first_alert[key] = min(first_alert.get(key, timestamp), timestamp)
+        if hit:
+            true_alerts[alert_type] = true_alerts.get(alert_type, 0) + 1
+
+    faults = {}
+    for fault in FAULTS:
+        delays, total = [], 0
+        for installation_id, site_episodes in by_site.items():
+            for index, episode in enumerate(site_episodes):
+                if episode['fault'] != fault:
+                    continue
+                total += 1
+                if (installation_id, index) in first_alert:
+                    delays.append((first_alert[(installation_id, index)] - episode['start']).total_seconds() / 3600)
+        faults[fault] = {
+            'episodes': total,
+            'detected': len(delays),
+            'recall': len(delays) / total if total else None,
+            'median_delay_hours': float(np.median(delays)) if delays else None
+        }
+
+    counted = sum(alert_counts.values())
+    return {
+        'precision': sum(true_alerts.values()) / counted if counted else None,
+        'alerts': counted,
+        'faults': faults,
+        'alert_types': {alert_type: {'alerts': count, 'true_positives': true_alerts.get(alert_type, 0),
+                                     'precision': true_alerts.get(alert_type, 0) / count}
+                        for alert_type, count in sorted(alert_counts.items())},
+        'unscored_alerts': other_alerts
+    }
@@ -0,0 +1,27 @@
+"""Standalone process for periodic jobs.
+
+Run exactly one instance next to the WSGI workers:
+
+    python scheduler_runner.py
+"""
+import logging
+
+from apscheduler.schedulers.blocking import BlockingScheduler
+
+from app import create_app, create_scheduler
+from metrics import MULTIPROC_DIR, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+if __name__ == '__main__':
+    app = create_app()
+    if MULTIPROC_DIR:
+        # Job durations and training counters show up on the workers' /metrics
+        REGISTRY.enable_multiprocess(MULTIPROC_DIR)
+    scheduler = create_scheduler(app, scheduler_class=BlockingScheduler)
+    
+    print("⏰ Solar Energy Scheduler Started!")
+    try:
+        scheduler.start()
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("Scheduler stopped")
@@ -53,6 +53,9 @@ installations = [
     }
 ]
 
+# Index for O(1) lookups by installation id
+installations_by_id = {i['id']: i for i in installations}
+
 telemetry_data = {}
 predictions_data = {}
 alerts_data = {}
@@ -67,8 +70,7 @@ def generate_sample_data(installation_id):
         time_factor = math.sin(math.pi * (hour - 6) / 12)
         irradiation = 800 * time_factor * random.uniform(0.7, 1.0)
         
-        installation = next(i for i in installations if i['id'] == installation_id)
-        capacity = installation['capacity_kw']
+        capacity = installations_by_id[installation_id]['capacity_kw']
         
         efficiency = random.uniform(0.8, 0.95)
         pv_power = (irradiation / 1000) * capacity * efficiency
@@ -242,7 +244,7 @@ def get_alerts(installation_id):
 @app.route('/api/report/<installation_id>', methods=['GET'])
 def generate_report(installation_id):
     try:
-        installation = next((i for i in installations if i['id'] == installation_id), None)
+        installation = installations_by_id.get(installation_id)
         if not installation:
             return jsonify({'error': 'Installation not found'}), 404
         
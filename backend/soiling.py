@@ -0,0 +1,235 @@
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import DateTime, bindparam, delete, insert, text
+
+from analytics import DAYLIGHT_IRRADIATION_WM2, PERFORMANCE_FACTOR, _records
+from models import SoilingEstimate
+
+# A day needs this many daylight readings for its performance ratio to count
+MIN_DAYLIGHT_READINGS = 8
+
+# Fewer valid days than this since the last cleaning gives no estimate
+MIN_FIT_DAYS = 7
+
+# Daily PR rising this much above the median of the previous days marks a
+# cleaning (manual or rain)
+CLEANING_JUMP = 0.05
+
+# One grouped pass over the window: per installation and day, the daylight
+# sums behind the performance ratio plus the reading span used to turn summed
+# power into energy. date() works on both SQLite and PostgreSQL.
+DAILY_PERFORMANCE_SQL = text("""
+    SELECT
+        t.installation_id AS installation_id,
+        date(t.timestamp) AS day,
+        COUNT(t.id) AS readings,
+        MIN(t.timestamp) AS first_reading,
+        MAX(t.timestamp) AS last_reading,
+        SUM(CASE WHEN t.irradiation_wm2 > :daylight THEN 1 ELSE 0 END) AS daylight_readings,
+        SUM(CASE WHEN t.irradiation_wm2 > :daylight THEN t.pv_power_kw ELSE 0 END) AS sum_power_kw,
+        SUM(CASE WHEN t.irradiation_wm2 > :daylight THEN t.irradiation_wm2 ELSE 0 END) AS sum_irradiation_wm2
+    FROM telemetry_data t
+    WHERE t.timestamp >= :since
+    GROUP BY t.installation_id, date(t.timestamp)
+""").bindparams(bindparam('since', type_=DateTime))
+
+DAILY_COLUMNS = ['installation_id', 'day', 'readings', 'first_reading', 'last_reading', 'daylight_readings',
+                 'sum_power_kw', 'sum_irradiation_wm2']
+
+
+def economics_from_env():
+    """Cleaning cost = base + per_kw * capacity; lost energy valued at the tariff"""
+    return {
+        'cleaning_cost_base': float(os.getenv('CLEANING_COST_BASE', '500')),
+        'cleaning_cost_per_kw': float(os.getenv('CLEANING_COST_PER_KW', '20')),
+        'tariff_per_kwh': float(os.getenv('ELECTRICITY_TARIFF_PER_KWH', '6'))
+    }
+
+
+def daily_matrices(daily, capacity_kw, since_day, days):
+    """Pivot daily rows into [installation x day] performance-ratio and summed-power matrices"""
+    ids = np.array(sorted(daily['installation_id'].unique()), dtype=object)
+    row = pd.Index(ids).get_indexer(daily['installation_id'])
+    col = (pd.to_datetime(daily['day']) - pd.Timestamp(since_day)).dt.days.to_numpy()
+    keep = (col >= 0) & (col < days)
+    row, col = row[keep], col[keep]
+
+    capacity = capacity_kw.reindex(ids).to_numpy(dtype=float)
+    theoretical = daily['sum_irradiation_wm2'].to_numpy(dtype=float)[keep] / 1000 * capacity[row] * PERFORMANCE_FACTOR
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(theoretical > 0, daily['sum_power_kw'].to_numpy(dtype=float)[keep] / theoretical, np.nan)
+    ratio[daily['daylight_readings'].to_numpy()[keep] < MIN_DAYLIGHT_READINGS] = np.nan
+
+    pr = np.full((len(ids), days), np.nan)
+    power = np.zeros((len(ids), days))
+    pr[row, col] = ratio
+    power[row, col] = daily['sum_power_kw'].to_numpy(dtype=float)[keep]
+    return ids, pr, power
+
+
+def last_cleaning_index(pr):
+    """Column of the most recent cleaning jump per row (0 when none is seen)"""
+    previous = pd.DataFrame(pr).T.rolling(3, min_periods=1).median().shift(1).T.to_numpy()
+    # Carry the median over invalid days so a gap does not hide a jump
+    previous = pd.DataFrame(previous).T.ffill().T.to_numpy()
+    with np.errstate(invalid='ignore'):
+        jumps = (pr - previous) > CLEANING_JUMP
+    # The days right after a cleaning still see pre-cleaning values in their
+    # median; only the first day of each run of jumps is the cleaning
+    jumps[:, 1:] &= ~jumps[:, :-1]
+    columns = np.where(jumps, np.arange(pr.shape[1]), 0)
+    return columns.max(axis=1)
+
+
+def fit_soiling(pr, start):
+    """Least-squares line through each row's PR from its ``start`` column onwards.
+
+    All rows are fitted at once with masked sums. Returns slope (PR per day),
+    intercept (PR on the start day), r^2 and number of days fitted.
+    """
+    days = np.arange(pr.shape[1])
+    x = (days[None, :] - start[:, None]).astype(float)
+    mask = (x >= 0) & ~np.isnan(pr)
+    n = mask.sum(axis=1)
+    y = np.where(mask, pr, 0.0)
+    x = np.where(mask, x, 0.0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_mean = x.sum(axis=1) / n
+        y_mean = y.sum(axis=1) / n
+        dx = np.where(mask, x - x_mean[:, None], 0.0)
+        dy = np.where(mask, y - y_mean[:, None], 0.0)
+        sxx = (dx * dx).sum(axis=1)
+        slope = np.where(sxx > 0, (dx * dy).sum(axis=1) / sxx, np.nan)
+        intercept = y_mean - slope * x_mean
+        ss_res = (np.where(mask, y - (intercept[:, None] + slope[:, None] * x), 0.0) ** 2).sum(axis=1)
+        ss_tot = (dy * dy).sum(axis=1)
+        r_squared = np.where(ss_tot > 0, 1 - ss_res / ss_tot, np.nan)
+
+    too_short = n < MIN_FIT_DAYS
+    slope[too_short] = np.nan
+    intercept[too_short] = np.nan
+    r_squared[too_short] = np.nan
+    return slope, intercept, r_squared, n
+
+
+def optimal_cleaning_interval(daily_energy_kwh, soiling_rate, cleaning_cost, tariff):
+    """Cleaning interval T* (days) minimising cleaning cost plus the value of soiling losses.
+
+    With losses growing linearly at ``soiling_rate`` of clean output per day,
+    one cycle of T days loses tariff * E * rate * T^2 / 2, so the average cost
+    per day (C + that) / T is minimal at T* = sqrt(2C / (tariff * E * rate)).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        daily_loss_growth = tariff * daily_energy_kwh * soiling_rate
+        return np.where(daily_loss_growth > 0, np.sqrt(2 * cleaning_cost / daily_loss_growth), np.inf)
+
+
+def estimate_soiling(session, installations, window_days=60, now=None, economics=None):
+    """Fit soiling rates and cleaning schedules for every installation with enough history.
+
+    ``installations`` is a DataFrame with ``installation_id`` and
+    ``capacity_kw``. Returns one row per fitted installation.
+    """
+    now = now or datetime.utcnow()
+    economics = economics or economics_from_env()
+    since_day = (now - timedelta(days=window_days - 1)).date()
+    since = datetime.combine(since_day, datetime.min.time())
+
+    daily = pd.DataFrame(session.execute(DAILY_PERFORMANCE_SQL, {
+        'since': since, 'daylight': DAYLIGHT_IRRADIATION_WM2
+    }).fetchall(), columns=DAILY_COLUMNS)
+    columns = ['installation_id', 'computed_at', 'soiling_rate_per_day', 'clean_performance_ratio',
+               'current_performance_ratio', 'r_squared', 'days_fitted', 'last_cleaning_date',
+               'days_since_cleaning', 'daily_energy_kwh', 'current_loss_kwh_per_day', 'cleaning_cost',
+               'optimal_interval_days', 'next_cleaning_date']
+    if daily.empty:
+        return pd.DataFrame(columns=columns)
+
+    capacity_kw = installations.set_index('installation_id')['capacity_kw'].astype(float)
+    daily = daily[daily['installation_id'].isin(capacity_kw.index)]
+    ids, pr, power = daily_matrices(daily, capacity_kw, since_day, window_days)
+
+    start = last_cleaning_index(pr)
+    # Without a cleaning jump the fit runs from the first valid day, which is
+    # not a cleaning: last_cleaning_date stays empty and days_since_cleaning
+    # counts from the start of the fit
+    cleaned = start > 0
+    start = np.where(cleaned, start, np.argmax(~np.isnan(pr), axis=1))
+    slope, intercept, r_squared, n = fit_soiling(pr, start)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        soiling_rate = np.clip(np.where(intercept > 0, -slope / intercept, np.nan), 0, None)
+
+    today = window_days - 1
+    days_since_cleaning = today - start
+    current_pr = intercept + slope * days_since_cleaning
+
+    # Energy: summed daylight power times the sampling interval, scaled up to clean panels.
+    # The interval is total within-day span over total gaps, so overnight breaks do not count.
+    span_hours = (pd.to_datetime(daily['last_reading']) - pd.to_datetime(daily['first_reading'])
+                  ).dt.total_seconds() / 3600
+    gaps = daily['readings'].astype(float) - 1
+    per_installation = pd.DataFrame({'installation_id': daily['installation_id'], 'span_hours': span_hours,
+                                     'gaps': gaps}).groupby('installation_id').sum().reindex(ids)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        interval_hours = np.where(per_installation['gaps'] > 0,
+                                  per_installation['span_hours'] / per_installation['gaps'], np.nan)
+        valid_days = (~np.isnan(pr)).sum(axis=1)
+        daily_energy = np.where(np.isnan(pr), 0.0, power).sum(axis=1) * interval_hours / valid_days
+        mean_pr = np.nansum(pr, axis=1) / valid_days
+        clean_daily_energy = np.where(mean_pr > 0, daily_energy * intercept / mean_pr, daily_energy)
+
+    capacity = capacity_kw.reindex(ids).to_numpy(dtype=float)
+    cleaning_cost = economics['cleaning_cost_base'] + economics['cleaning_cost_per_kw'] * capacity
+    interval = optimal_cleaning_interval(clean_daily_energy, soiling_rate, cleaning_cost,
+                                         economics['tariff_per_kwh'])
+    days_until = np.clip(interval - days_since_cleaning, 0, None)
+
+    result = pd.DataFrame({
+        'installation_id': ids,
+        'computed_at': now,
+        'soiling_rate_per_day': soiling_rate,
+        'clean_performance_ratio': intercept,
+        'current_performance_ratio': current_pr,
+        'r_squared': r_squared,
+        'days_fitted': n,
+        'last_cleaning_date': [since_day + timedelta(days=int(s)) if c else None for s, c in zip(start, cleaned)],
+        'days_since_cleaning': days_since_cleaning,
+        'daily_energy_kwh': clean_daily_energy,
+        'current_loss_kwh_per_day': clean_daily_energy * soiling_rate * days_since_cleaning,
+        'cleaning_cost': cleaning_cost,
+        'optimal_interval_days': np.where(np.isfinite(interval), interval, np.nan),
+        'next_cleaning_date': [now.date() + timedelta(days=int(d)) if np.isfinite(d) else None for d in days_until]
+    })
+    # No fit, or a clean PR of zero (a dead or disconnected site): no rate to store
+    return result[~np.isnan(soiling_rate)][columns].reset_index(drop=True)
+
+
+def store_estimates(session, estimates):
+    """Replace the stored estimates with ``estimates`` in one transaction"""
+    session.execute(delete(SoilingEstimate))
+    if len(estimates):
+        session.execute(insert(SoilingEstimate), _records(estimates))
+    session.commit()
+
+
+def serialize(estimate):
+    return {
+        'installation_id': estimate.installation_id,
+        'computed_at': estimate.computed_at.isoformat(),
+        'soiling_rate_per_day': estimate.soiling_rate_per_day,
+        'clean_performance_ratio': estimate.clean_performance_ratio,
+        'current_performance_ratio': estimate.current_performance_ratio,
+        'r_squared': estimate.r_squared,
+        'days_fitted': estimate.days_fitted,
+        'last_cleaning_date': estimate.last_cleaning_date.isoformat() if estimate.last_cleaning_date else None,
+        'days_since_cleaning': estimate.days_since_cleaning,
+        'daily_energy_kwh': estimate.daily_energy_kwh,
+        'current_loss_kwh_per_day': estimate.current_loss_kwh_per_day,
+        'cleaning_cost': estimate.cleaning_cost,
+        'optimal_interval_days': estimate.optimal_interval_days,
+        'next_cleaning_date': estimate.next_cleaning_date.isoformat() if estimate.next_cleaning_date else None
+    }
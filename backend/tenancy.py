@@ -0,0 +1,31 @@
+from flask import request
+
+from registry import installation_registry
+
+# Requests carrying this header only see and change that tenant's installations
+# and their data; requests without it are operator requests across all tenants.
+# Authentication is expected in front of the API (gateway / reverse proxy).
+TENANT_HEADER = 'X-Tenant-ID'
+
+DEFAULT_TENANT = 'default'
+
+
+def request_tenant():
+    """Tenant named by the request's ``X-Tenant-ID`` header, or None for an unscoped request"""
+    value = request.headers.get(TENANT_HEADER, '').strip()
+    return value or None
+
+
+def tenant_of(installation_id):
+    """Owning tenant of an installation (the default tenant for unknown ids)"""
+    info = installation_registry.get(installation_id)
+    return info.tenant_id if info else DEFAULT_TENANT
+
+
+def can_access(installation_id, tenant=None):
+    """Whether the request's tenant (or ``tenant``) may see ``installation_id``"""
+    tenant = tenant or request_tenant()
+    if tenant is None:
+        return True
+    info = installation_registry.get(installation_id)
+    return info is not None and info.tenant_id == tenant
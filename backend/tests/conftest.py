@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, create_tables
+from ratelimit import rate_limiter
+from registry import installation_registry
+
+
+@pytest.fixture(scope='session')
+def solar_table_dir(tmp_path_factory):
+    return str(tmp_path_factory.mktemp('solar_tables'))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch, solar_table_dir):
+    """App on a fresh SQLite file seeded by create_tables (INST_001..003), inside an app context"""
+    monkeypatch.setenv('SOLAR_TABLE_DIR', solar_table_dir)
+    monkeypatch.setenv('FEATURE_STORE_DIR', str(tmp_path / 'feature_store'))
+    monkeypatch.setenv('MODEL_DIR', str(tmp_path / 'models'))
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', 'false')
+    rate_limiter.reset()
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}"})
+    create_tables(app)
+    with app.app_context():
+        installation_registry.invalidate()
+        yield app
+    rate_limiter.reset()
+    installation_registry.invalidate()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import alert_lifecycle
+from models import db, AlertArchive, AlertData, TelemetryData
+
+START = datetime(2024, 6, 1, 8)
+
+
+def add_reading(installation_id, minutes):
+    db.session.add(TelemetryData(installation_id=installation_id, timestamp=START + timedelta(minutes=minutes),
+                                 pv_power_kw=3.0, irradiation_wm2=800.0, module_temp_c=45.0, ambient_temp_c=30.0))
+
+
+def add_alert(installation_id, minutes, alert_type='LOW_POWER'):
+    alert = AlertData(installation_id=installation_id, timestamp=START + timedelta(minutes=minutes),
+                      created_at=START + timedelta(minutes=minutes), alert_type=alert_type, severity='HIGH',
+                      message='test')
+    db.session.add(alert)
+    return alert
+
+
+def test_cleared_alerts_resolve_but_silent_sites_keep_theirs(app, monkeypatch):
+    monkeypatch.setattr(alert_lifecycle, 'AUTO_RESOLVE_MINUTES', 60)
+    cleared = [add_alert('INST_001', 0), add_alert('INST_001', 15)]
+    silent = add_alert('INST_002', 0)
+    recent = add_alert('INST_003', 0)
+    add_reading('INST_001', 75)
+    add_reading('INST_002', 30)
+    add_reading('INST_003', 90)
+    # Raised again later: the condition has not cleared
+    add_alert('INST_003', 80)
+    db.session.commit()
+
+    assert alert_lifecycle.auto_resolve(db.session, now=START + timedelta(hours=3)) == 2
+    assert [(alert.resolved, alert.resolution) for alert in cleared] == [(True, 'auto')] * 2
+    assert not silent.resolved
+    assert not recent.resolved
+
+
+def test_archive_moves_old_resolved_alerts_only(app):
+    old, fresh, open_alert = add_alert('INST_001', 0), add_alert('INST_001', 15), add_alert('INST_002', 0)
+    db.session.commit()
+    alert_lifecycle.resolve(db.session, [AlertData.id == old.id], now=START)
+    alert_lifecycle.resolve(db.session, [AlertData.id == fresh.id], now=START + timedelta(days=29))
+    old_id, open_id = old.id, open_alert.id
+
+    assert alert_lifecycle.archive_resolved(db.session, older_than_days=30, now=START + timedelta(days=31)) == 1
+    assert sorted(alert.id for alert in AlertData.query) == sorted([fresh.id, open_id])
+    archived = AlertArchive.query.one()
+    assert (archived.id, archived.resolution, archived.created_at) == (old_id, 'manual', START)
+    assert archived.archived_at == START + timedelta(days=31)
@@ -0,0 +1,53 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import anomaly
+from anomaly import AnomalyDetector, InstallationDetector
+from app import AlertSystem
+from models import db, AnomalyState, PredictionData, TelemetryData
+
+INSTALLATION = SimpleNamespace(id='INST_001', capacity_kw=5.0, longitude=77.6)
+
+
+def readings(count, power=3.4):
+    start = datetime(2024, 6, 1, 6)
+    return [SimpleNamespace(timestamp=start + timedelta(minutes=15 * i), pv_power_kw=power, irradiation_wm2=800.0,
+                            inverter_efficiency=96.0) for i in range(count)]
+
+
+def test_state_round_trips_through_json():
+    detector = AnomalyDetector()
+    for telemetry in readings(200):
+        detector.update(INSTALLATION, telemetry)
+    state = detector.state('INST_001')
+
+    restored = InstallationDetector.from_bytes(state.to_bytes(), detector.config)
+    assert restored.to_bytes() == state.to_bytes()
+    assert restored.last_timestamp == readings(200)[-1].timestamp
+
+    # Old pickled states are not unpickled; the detector starts over
+    assert InstallationDetector.from_bytes(b'\x80\x04\x95garbage', detector.config) is None
+
+
+def test_anomaly_failure_keeps_the_prediction(app, monkeypatch):
+    telemetry = TelemetryData(installation_id='INST_001', timestamp=datetime(2024, 6, 1, 12), pv_power_kw=0.1,
+                              irradiation_wm2=800.0, module_temp_c=45.0, ambient_temp_c=30.0)
+    db.session.add(telemetry)
+    db.session.commit()
+
+    def failing_update(session, installation, telemetry):
+        session.add(AnomalyState(installation_id=installation.id, state=b'{}'))
+        session.flush()
+        raise RuntimeError('detector bug')
+
+    monkeypatch.setattr(anomaly.anomaly_detector, 'update_stored', failing_update)
+    db.session.add(PredictionData(installation_id='INST_001', telemetry_id=telemetry.id,
+                                  timestamp=telemetry.timestamp, predicted_power_kw=3.4, actual_power_kw=0.1,
+                                  efficiency_score=0.03, maintenance_score=0.1))
+    prediction = {'predicted_power_kw': 3.4, 'predicted_power_p10_kw': 3.0, 'maintenance_score': 0.1}
+    alerts = AlertSystem.check_performance_alerts('INST_001', telemetry, prediction)
+    db.session.commit()
+
+    assert [alert['type'] for alert in alerts] == ['LOW_POWER']
+    assert PredictionData.query.count() == 1
+    assert AnomalyState.query.count() == 0
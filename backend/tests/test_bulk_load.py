@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from bulk_load import deduplicate_telemetry, rows_to_columns, upsert_telemetry
+from models import db, AlertArchive, AlertData, PredictionData, TelemetryData
+
+START = datetime(2024, 1, 1, 6)
+
+
+def row(minutes, power, installation_id='INST_001'):
+    return (installation_id, START + timedelta(minutes=minutes), power, 800.0, 45.0, 30.0, 0.0, 0.0, 0.0, 95.0)
+
+
+def test_upsert_skips_retries_and_corrects_in_place(app):
+    first = upsert_telemetry(db.session, rows_to_columns([row(0, 1.0), row(15, 2.0), row(0, 1.5)]))
+    db.session.commit()
+    # A key repeated within one batch keeps its last reading
+    assert (first['inserted'], first['updated'], first['duplicates']) == (2, 0, 1)
+    ids = {reading.timestamp: reading.id for reading in TelemetryData.query}
+
+    retry = upsert_telemetry(db.session, rows_to_columns([row(0, 1.5), row(15, 2.0)]))
+    assert (retry['inserted'], retry['updated'], retry['duplicates']) == (0, 0, 2)
+
+    corrected = upsert_telemetry(db.session, rows_to_columns([row(15, 2.5), row(30, 3.0), row(15, 9.0, 'INST_002')]))
+    db.session.commit()
+    assert (corrected['inserted'], corrected['updated'], corrected['duplicates']) == (2, 1, 0)
+    assert corrected['corrected'] == [ids[START + timedelta(minutes=15)]]
+    assert corrected['revised'] == {'INST_001': START + timedelta(minutes=15)}
+    stored = {(reading.installation_id, reading.timestamp): (reading.id, reading.pv_power_kw)
+              for reading in TelemetryData.query}
+    assert stored[('INST_001', START + timedelta(minutes=15))] == (ids[START + timedelta(minutes=15)], 2.5)
+    assert len(stored) == 4
+
+
+def test_deduplicate_keeps_first_row_with_last_values(app):
+    # Databases from before the unique index may hold repeated readings
+    db.session.execute(text('DROP INDEX uq_telemetry_installation_timestamp'))
+    readings = [TelemetryData(**dict(zip(['installation_id', 'timestamp', 'pv_power_kw', 'irradiation_wm2',
+                                          'module_temp_c', 'ambient_temp_c'], values[:6])))
+                for values in (row(0, 1.0), row(0, 1.1), row(0, 1.2), row(15, 2.0))]
+    db.session.add_all(readings)
+    db.session.flush()
+    kept, middle, last = readings[0].id, readings[1].id, readings[2].id
+    for telemetry_id, alert_type in ((kept, 'LOW_POWER'), (middle, 'LOW_POWER'), (last, 'HIGH_TEMPERATURE')):
+        db.session.add(AlertData(installation_id='INST_001', telemetry_id=telemetry_id, timestamp=START,
+                                 alert_type=alert_type, severity='HIGH', message='test'))
+    db.session.add(AlertArchive(id=99, installation_id='INST_001', telemetry_id=last, timestamp=START,
+                                alert_type='DUST_ACCUMULATION', severity='LOW', message='test', resolved=True,
+                                archived_at=START))
+    db.session.add(PredictionData(installation_id='INST_001', telemetry_id=middle, timestamp=START,
+                                  predicted_power_kw=1.0, efficiency_score=0.9, maintenance_score=0.1))
+    db.session.commit()
+
+    removed, revised = deduplicate_telemetry(db.session)
+    db.session.commit()
+
+    assert (removed, revised) == (2, {'INST_001': START})
+    assert [(reading.id, reading.pv_power_kw) for reading in TelemetryData.query.order_by(TelemetryData.id)] == [
+        (kept, 1.2), (readings[3].id, 2.0)]
+    assert sorted((alert.telemetry_id, alert.alert_type) for alert in AlertData.query) == [
+        (kept, 'HIGH_TEMPERATURE'), (kept, 'LOW_POWER')]
+    assert [alert.telemetry_id for alert in AlertArchive.query] == [kept]
+    assert PredictionData.query.count() == 0
+    assert deduplicate_telemetry(db.session) == (0, {})
@@ -0,0 +1,103 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+from gateway import Gateway, Spool
+from models import TelemetryData
+
+START = datetime(2024, 3, 1, 6)
+
+
+class Response:
+    """The parts of ``requests.Response`` the gateway reads, from a Flask test response"""
+
+    def __init__(self, response):
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.text = response.get_data(as_text=True)
+        self._json = response.get_json(silent=True)
+
+    def json(self):
+        if self._json is None:
+            raise ValueError('no JSON body')
+        return self._json
+
+
+@pytest.fixture
+def backend(client, monkeypatch):
+    """Route the gateway's uploads to the test client"""
+    def post(url, data=None, headers=None, timeout=None):
+        return Response(client.post(url.split('localhost:5000', 1)[1], data=data, headers=headers))
+    monkeypatch.setattr(requests, 'post', post)
+    return client
+
+
+def sample(installation_id, timestamp, power=2.0):
+    return {'installation_id': installation_id, 'timestamp': timestamp, 'pv_power_kw': power,
+            'irradiation_wm2': 600.0, 'module_temp_c': 40.0, 'ambient_temp_c': 30.0}
+
+
+def fill(gateway, installation_ids, minutes=30, sample_seconds=60):
+    for step in range(minutes * 60 // sample_seconds):
+        timestamp = START + timedelta(seconds=step * sample_seconds)
+        for installation_id in installation_ids:
+            gateway.add(sample(installation_id, timestamp), timestamp)
+    gateway.poll(START + timedelta(minutes=minutes), upload=False)
+    gateway.spool.seal()
+
+
+def test_window_summary_preserves_energy(tmp_path):
+    gateway = Gateway(str(tmp_path), window_seconds=900, sample_seconds=60)
+    fill(gateway, ['INST_001'])
+    summaries = [summary for path in gateway.spool.batches() for summary in gateway.spool.read(path)]
+    assert [summary['timestamp'] for summary in summaries] == [START.isoformat(),
+                                                               (START + timedelta(minutes=15)).isoformat()]
+    assert all(summary['samples'] == 15 and summary['pv_power_kw'] == 2.0 for summary in summaries)
+    assert sum(summary['energy_kwh'] for summary in summaries) == pytest.approx(1.0)
+
+
+def test_unknown_installation_does_not_block_the_batch(app, backend, tmp_path):
+    gateway = Gateway(str(tmp_path), window_seconds=900, sample_seconds=60)
+    fill(gateway, ['INST_001', 'INST_999'])
+    assert gateway.upload() == 1
+
+    assert TelemetryData.query.filter_by(installation_id='INST_001').count() == 2
+    assert gateway.spool.batches() == []
+    rejected = [name for name in os.listdir(tmp_path) if name.startswith('rejected-')]
+    assert len(rejected) == 1
+    assert {summary['installation_id'] for summary in Spool.read(str(tmp_path / rejected[0]))} == {'INST_999'}
+
+
+def test_offline_backlog_is_replayed_in_order(app, backend, tmp_path, monkeypatch):
+    gateway = Gateway(str(tmp_path), window_seconds=900, sample_seconds=60)
+    fill(gateway, ['INST_001'], minutes=15)
+    online = requests.post
+    monkeypatch.setattr(requests, 'post', lambda *args, **kwargs: (_ for _ in ()).throw(ConnectionError('down')))
+    assert gateway.upload() == 0
+
+    # The failed batch stays spooled; a crash leaves open.jsonl, sealed on restart
+    for step in range(15):
+        timestamp = START + timedelta(minutes=15 + step)
+        gateway.add(sample('INST_001', timestamp, 3.0), timestamp)
+    gateway.poll(START + timedelta(minutes=30), upload=False)
+    restarted = Gateway(str(tmp_path), window_seconds=900, sample_seconds=60)
+    assert len(restarted.spool.batches()) == 2
+
+    monkeypatch.setattr(requests, 'post', online)
+    assert restarted.upload() == 2
+    assert [row.pv_power_kw for row in TelemetryData.query.order_by(TelemetryData.timestamp)] == [2.0, 3.0]
+    # A replay of data already ingested is acknowledged without duplicating it
+    fill(restarted, ['INST_001'], minutes=15)
+    assert restarted.upload() == 1
+    assert TelemetryData.query.count() == 2
+
+
+def test_refused_batch_is_set_aside(app, backend, tmp_path):
+    gateway = Gateway(str(tmp_path), window_seconds=900, sample_seconds=60)
+    fill(gateway, ['INST_999'], minutes=15)
+    assert gateway.upload() == 0
+    assert gateway.stats['rejected_batches'] == 1
+    assert gateway.spool.batches() == []
+    assert [name for name in os.listdir(tmp_path) if name.startswith('rejected-')]
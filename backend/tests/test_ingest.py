@@ -0,0 +1,63 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import wire
+from bulk_load import MAX_FUTURE_SECONDS, telemetry_row
+from models import TelemetryData
+
+
+def reading(timestamp, installation_id='INST_001', power=1.0):
+    return {'installation_id': installation_id, 'timestamp': timestamp.isoformat(), 'pv_power_kw': power,
+            'irradiation_wm2': 500.0, 'module_temp_c': 40.0, 'ambient_temp_c': 30.0}
+
+
+def test_timestamps_are_naive_utc():
+    row = telemetry_row(dict(reading(datetime(2024, 1, 1)), timestamp='2024-01-01T05:30:00+05:30'))
+    assert row[1] == datetime(2024, 1, 1)
+
+    aware = datetime.fromisoformat('2024-01-01T05:30:00+05:30')
+    body = wire.encode([dict(reading(datetime(2024, 1, 1)), timestamp=aware)])
+    columns, errors = wire.telemetry_columns(*wire.decode(body))
+    assert not errors
+    assert columns['timestamp'].tolist() == [datetime(2024, 1, 1)]
+
+
+def test_future_reading_is_refused_on_every_path(client):
+    future = datetime.utcnow() + timedelta(seconds=MAX_FUTURE_SECONDS + 60)
+    assert client.post('/api/telemetry', json=reading(future)).status_code == 400
+    assert client.post('/api/telemetry/batch', json=[reading(future)]).status_code == 400
+    response = client.post('/api/telemetry/batch', data=wire.encode([reading(future)]),
+                           headers={'Content-Type': wire.CONTENT_TYPE})
+    assert response.status_code == 400
+    assert 'ahead of server time' in response.get_json()['details'][0]['error']
+    assert TelemetryData.query.count() == 0
+
+    # Small clock skew is fine
+    assert client.post('/api/telemetry/batch', json=[reading(datetime.utcnow() + timedelta(seconds=30))]
+                       ).status_code == 201
+
+
+@pytest.mark.parametrize('body', ['json', 'binary'])
+def test_batch_is_idempotent_and_corrects(client, body):
+    readings = [reading(datetime(2024, 1, 1) + timedelta(minutes=15 * i), power=float(i)) for i in range(4)]
+
+    def post(readings):
+        if body == 'binary':
+            return client.post('/api/telemetry/batch', data=wire.encode(readings, compress=True),
+                               headers={'Content-Type': wire.CONTENT_TYPE, 'Content-Encoding': 'gzip'})
+        return client.post('/api/telemetry/batch', json=readings)
+
+    assert post(readings).get_json()['inserted'] == 4
+    readings[2]['pv_power_kw'] = 9.5
+    summary = post(readings).get_json()
+    assert (summary['inserted'], summary['updated'], summary['duplicates']) == (0, 1, 3)
+    assert [row.pv_power_kw for row in TelemetryData.query.order_by(TelemetryData.timestamp)] == [0, 1, 9.5, 3]
+
+
+def test_single_reading_retry_and_correction(client):
+    first = reading(datetime(2024, 1, 1, 12))
+    assert client.post('/api/telemetry', json=first).status_code == 201
+    assert client.post('/api/telemetry', json=first).get_json()['duplicate'] is True
+    assert client.post('/api/telemetry', json=dict(first, pv_power_kw=2.0)).get_json()['corrected'] is True
+    assert [row.pv_power_kw for row in TelemetryData.query.all()] == [2.0]
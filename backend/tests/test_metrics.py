@@ -0,0 +1,50 @@
+import json
+import os
+
+from metrics import MetricsRegistry, mark_process_dead
+
+# Stands in for a worker that has exited
+DEAD_PID = 2 ** 22 + 1
+
+
+def worker_snapshot(rows, seconds):
+    registry = MetricsRegistry()
+    registry.counter('rows_total', 'Rows').inc(rows)
+    registry.gauge('pool', 'Pool', ['state']).set(3, state='idle')
+    registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0)).observe(seconds)
+    return registry.snapshot()
+
+
+def scraping_registry(directory):
+    registry = MetricsRegistry()
+    registry.counter('rows_total', 'Rows').inc(1)
+    registry.gauge('pool', 'Pool', ['state']).set(2, state='idle')
+    registry.histogram('latency_seconds', 'Latency', buckets=(0.1, 1.0)).observe(0.05)
+    registry.multiprocess_dir = str(directory)
+    return registry
+
+
+def test_scrape_sums_other_workers_and_labels_gauges(tmp_path):
+    with open(tmp_path / f'{os.getppid()}.json', 'w') as f:
+        json.dump(worker_snapshot(10, 0.5), f)
+    text = scraping_registry(tmp_path).render()
+
+    assert 'rows_total 11.0' in text
+    assert 'latency_seconds_bucket{le="0.1"} 1' in text
+    assert 'latency_seconds_bucket{le="1.0"} 2' in text
+    assert 'latency_seconds_count 2' in text
+    assert f'pool{{state="idle",pid="{os.getpid()}"}} 2.0' in text
+    assert f'pool{{state="idle",pid="{os.getppid()}"}} 3.0' in text
+
+
+def test_exited_workers_keep_counting_but_drop_gauges(tmp_path):
+    for rows in (10, 5):
+        with open(tmp_path / f'{DEAD_PID}.json', 'w') as f:
+            json.dump(worker_snapshot(rows, 0.5), f)
+        mark_process_dead(str(tmp_path), DEAD_PID)
+
+    assert not (tmp_path / f'{DEAD_PID}.json').exists()
+    text = scraping_registry(tmp_path).render()
+    assert 'rows_total 16.0' in text
+    assert 'latency_seconds_count 3' in text
+    assert text.count('pool{') == 1
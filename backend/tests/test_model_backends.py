@@ -0,0 +1,22 @@
+import numpy as np
+import pytest
+
+from feature_store import FEATURE_COLUMNS
+from model_backends import create_backend
+
+
+def sample(rng, n):
+    X = rng.random((n, len(FEATURE_COLUMNS)))
+    return X, 1 + 5 * X[:, 0] + rng.normal(0, 0.3, n)
+
+
+@pytest.mark.parametrize('name', ['hist_gradient_boosting', 'ridge'])
+def test_p10_p90_band_covers_new_readings(name):
+    rng = np.random.default_rng(0)
+    X, y = sample(rng, 2000)
+    backend = create_backend(name).fit(X, y, y)
+
+    X_new, y_new = sample(rng, 2000)
+    quantiles, _ = backend.predict_quantiles(X_new)
+    inside = np.mean((y_new >= quantiles[:, 0]) & (y_new <= quantiles[:, 2]))
+    assert 0.75 <= inside <= 0.85
@@ -0,0 +1,74 @@
+import json
+from datetime import datetime, timedelta
+
+import notifications
+from models import db, AlertData, NotificationOutbox
+
+NOW = datetime(2024, 6, 1, 12)
+
+RECIPIENT = {'name': 'ops', 'sink': 'webhook', 'target': 'http://hooks.local/ops', 'min_rank': 0,
+             'installations': None, 'alert_types': None, 'digest_minutes': 5}
+
+
+class RecordingSink(notifications.Sink):
+    name = 'webhook'
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    def send(self, target, digest):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError('sink down')
+        self.sent.append((target, digest))
+
+
+def alert(timestamp, created_at, alert_type='LOW_POWER', severity='HIGH'):
+    db.session.add(AlertData(installation_id='INST_001', timestamp=timestamp, created_at=created_at,
+                             alert_type=alert_type, severity=severity, message='m'))
+    db.session.commit()
+
+
+def start_cursor():
+    notifications.enqueue_new_alerts(db.session, [RECIPIENT], now=NOW)
+
+
+def queued():
+    return sum(json.loads(entry.payload)['alert_count'] for entry in NotificationOutbox.query.all())
+
+
+def test_future_reading_time_does_not_hold_back_later_alerts(app):
+    start_cursor()
+    alert(NOW + timedelta(days=30), NOW - timedelta(minutes=1))
+    alert(NOW - timedelta(minutes=2), NOW - timedelta(minutes=1))
+    assert notifications.enqueue_new_alerts(db.session, [RECIPIENT], now=NOW) == 2
+    assert queued() == 2
+
+
+def test_unsettled_alerts_wait_and_history_is_skipped(app):
+    start_cursor()
+    alert(NOW - timedelta(days=90), NOW - timedelta(minutes=1), alert_type='PERFORMANCE_DEGRADATION')
+    alert(NOW, NOW)
+    assert notifications.enqueue_new_alerts(db.session, [RECIPIENT], now=NOW) == 1
+    assert queued() == 0
+    assert notifications.enqueue_new_alerts(db.session, [RECIPIENT], now=NOW + timedelta(seconds=10)) == 1
+    assert queued() == 1
+
+
+def test_digest_is_retried_until_delivered(app):
+    start_cursor()
+    for minute in range(3):
+        alert(NOW - timedelta(minutes=minute), NOW - timedelta(minutes=1))
+    notifications.enqueue_new_alerts(db.session, [RECIPIENT], now=NOW)
+    assert NotificationOutbox.query.count() == 1
+
+    sink = RecordingSink(failures=1)
+    due = NOW + timedelta(minutes=5)
+    assert notifications.dispatch_due(db.session, now=due, sinks={'webhook': sink}) == (0, 1)
+    entry = NotificationOutbox.query.one()
+    assert entry.status == 'pending' and entry.attempts == 1 and entry.send_after > due
+
+    assert notifications.dispatch_due(db.session, now=entry.send_after, sinks={'webhook': sink}) == (1, 0)
+    assert NotificationOutbox.query.one().status == 'sent'
+    assert sink.sent[0][1]['alert_count'] == 3
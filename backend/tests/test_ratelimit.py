@@ -0,0 +1,115 @@
+from datetime import datetime, timedelta
+
+import pytest
+import requests
+
+import data_simulator
+import ratelimit
+from models import TelemetryData
+from ratelimit import Limit, MemoryBuckets, RateLimiter, rate_limiter
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ratelimit.time, 'monotonic', clock)
+    return clock
+
+
+@pytest.fixture
+def limited(app, monkeypatch):
+    """Rate limiting on, 1 reading/s and a burst of 10 per installation"""
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', 'true')
+    monkeypatch.setenv('RATE_LIMIT_INSTALLATION', '1:10')
+    rate_limiter.reset()
+    return rate_limiter
+
+
+def reading(installation_id, minute):
+    timestamp = datetime(2024, 1, 1) + timedelta(minutes=minute)
+    return {'installation_id': installation_id, 'timestamp': timestamp.isoformat(), 'pv_power_kw': 1.0,
+            'irradiation_wm2': 500.0, 'module_temp_c': 40.0, 'ambient_temp_c': 30.0}
+
+
+def test_bucket_refills_at_its_rate(clock):
+    buckets = MemoryBuckets()
+    limit = Limit(2.0, 10.0)
+    assert buckets.acquire([('a', limit, 10)]) == (None, 0.0)
+    index, wait = buckets.acquire([('a', limit, 4)])
+    assert index == 0 and wait == pytest.approx(2.0)
+    clock.now += 2
+    assert buckets.acquire([('a', limit, 4)]) == (None, 0.0)
+
+
+def test_take_is_all_or_nothing(clock):
+    buckets = MemoryBuckets()
+    assert buckets.acquire([('a', Limit(1.0, 10.0), 5), ('b', Limit(1.0, 3.0), 5)])[0] == 1
+    # Bucket a was not charged for the refused request
+    assert buckets.acquire([('a', Limit(1.0, 10.0), 10)]) == (None, 0.0)
+
+
+def test_idle_buckets_are_evicted(clock):
+    buckets = MemoryBuckets()
+    for index in range(100):
+        buckets.acquire([(f'installation:{index}', Limit(1.0, 10.0), 5)])
+    buckets.acquire([('busy', Limit(1.0, 1000.0), 1000)])
+    clock.now += ratelimit.SWEEP_SECONDS
+    buckets.acquire([('other', Limit(1.0, 10.0), 1)])
+    assert len(buckets) == 2
+
+
+def test_decisions(clock, monkeypatch):
+    monkeypatch.setenv('RATE_LIMIT_ENABLED', 'true')
+    monkeypatch.setenv('RATE_LIMIT_INSTALLATION', '1:10')
+    limiter = RateLimiter()
+    assert limiter.check_ingest({None: 8}, {'INST_001': 8}).allowed
+    decision = limiter.check_ingest({None: 5}, {'INST_001': 5})
+    assert not decision.allowed and decision.scope == 'installation' and decision.retry_after == pytest.approx(3)
+    # More than the burst can never succeed
+    assert limiter.check_ingest({None: 11}, {'INST_002': 11}) == ratelimit.Decision(False, None, 'installation')
+
+
+def test_ingest_answers_429_and_413(limited, client):
+    response = client.post('/api/telemetry/batch', json=[reading('INST_001', minute) for minute in range(8)])
+    assert response.status_code == 201
+    response = client.post('/api/telemetry/batch', json=[reading('INST_001', minute) for minute in range(8, 16)])
+    assert response.status_code == 429 and int(response.headers['Retry-After']) >= 1
+    response = client.post('/api/telemetry/batch', json=[reading('INST_002', minute) for minute in range(11)])
+    assert response.status_code == 413
+
+
+def test_unknown_installation_takes_no_bucket(limited, client):
+    response = client.post('/api/telemetry', json=reading('NOPE', 0))
+    assert response.status_code == 404
+    assert TelemetryData.query.count() == 0
+    assert len(limited._configure()['buckets']) == 0
+
+
+def test_simulator_backfill_waits_out_the_limiter(limited, client, monkeypatch):
+    class Response:
+        def __init__(self, response):
+            self.status_code = response.status_code
+            self.headers = response.headers
+            self.text = response.get_data(as_text=True)
+            self.json = lambda: response.get_json()
+
+    waits = []
+    monkeypatch.setattr(requests, 'post', lambda url, **kwargs: Response(client.post(
+        url.split('localhost:5000', 1)[1], data=kwargs.get('data'), json=kwargs.get('json'),
+        headers=kwargs.get('headers'))))
+    monkeypatch.setattr(data_simulator.time, 'sleep', lambda seconds: (waits.append(seconds), limited.reset()))
+    simulator = data_simulator.SolarDataSimulator(wire_format='binary')
+    simulator.installations = simulator.installations[:1]
+    simulator.send_historical_data(days_back=1)
+
+    # 96 readings against a burst of 10: split on 413, resent after each 429, none lost
+    assert TelemetryData.query.count() == 96
+    assert waits
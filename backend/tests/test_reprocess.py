@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from models import db, PredictionData, ReprocessCheckpoint, TelemetryData
+from reprocess import reprocess_installation
+
+START = datetime(2024, 6, 1, 6)
+
+
+class ConstantModel:
+    """Predicts 3 kW for every reading; ``fail_after`` batches make it raise, like a crash mid-run"""
+
+    def __init__(self, fail_after=None):
+        self.calls = 0
+        self.fail_after = fail_after
+
+    def predict_matrix(self, X):
+        self.calls += 1
+        if self.fail_after is not None and self.calls > self.fail_after:
+            raise RuntimeError('worker killed')
+        n = len(X)
+        return {'p10': np.full(n, 2.5), 'p50': np.full(n, 3.0), 'p90': np.full(n, 3.5), 'efficiency': np.full(n, 0.9)}
+
+
+def test_interrupted_run_resumes_after_last_batch(app):
+    for i in range(10):
+        db.session.add(TelemetryData(installation_id='INST_001', timestamp=START + timedelta(minutes=15 * i),
+                                     pv_power_kw=3.0, irradiation_wm2=800.0, module_temp_c=45.0,
+                                     ambient_temp_c=30.0))
+    db.session.commit()
+
+    with pytest.raises(RuntimeError):
+        reprocess_installation('INST_001', ConstantModel(fail_after=1), job='test', batch_rows=4)
+    db.session.rollback()
+    checkpoint = db.session.get(ReprocessCheckpoint, ('test', 'INST_001'))
+    assert (checkpoint.rows, checkpoint.completed) == (4, False)
+    assert checkpoint.detector_state.startswith(b'{')
+    assert PredictionData.query.count() == 4
+
+    rows, predictions, _ = reprocess_installation('INST_001', ConstantModel(), job='test', batch_rows=4)
+    assert (rows, predictions) == (6, 6)
+    checkpoint = db.session.get(ReprocessCheckpoint, ('test', 'INST_001'))
+    assert (checkpoint.rows, checkpoint.completed) == (10, True)
+    assert PredictionData.query.count() == 10
+
+    # A completed job is not redone; a new job re-scores without duplicating predictions
+    assert reprocess_installation('INST_001', ConstantModel(), job='test', batch_rows=4) == (0, 0, 0)
+    assert reprocess_installation('INST_001', ConstantModel(), job='again', batch_rows=4)[0] == 10
+    assert PredictionData.query.count() == 10
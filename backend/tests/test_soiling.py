@@ -0,0 +1,52 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from models import db, SoilingEstimate, TelemetryData
+from soiling import estimate_soiling, store_estimates
+
+NOW = datetime(2024, 6, 30, 18)
+
+
+def add_days(installation_id, capacity_kw, days, soiling_rate=0.002, dead=False, cleaned_on=None):
+    """Ten daylight readings a day at 800 W/m2, output falling ``soiling_rate`` of clean per day.
+
+    ``cleaned_on`` (day index) restores clean output from that day on.
+    """
+    for day in range(days):
+        start = datetime.combine((NOW - timedelta(days=days - 1 - day)).date(), datetime.min.time())
+        soiled_days = day - cleaned_on if cleaned_on is not None and day >= cleaned_on else day
+        power = 0.0 if dead else capacity_kw * 0.8 * 0.85 * (1 - soiling_rate * soiled_days)
+        for hour in range(8, 18):
+            db.session.add(TelemetryData(installation_id=installation_id, timestamp=start + timedelta(hours=hour),
+                                         pv_power_kw=power, irradiation_wm2=800.0, module_temp_c=45.0,
+                                         ambient_temp_c=30.0))
+    db.session.commit()
+
+
+def test_zero_output_site_is_skipped(app):
+    add_days('INST_001', 5.0, 20)
+    add_days('INST_002', 50.0, 20, dead=True)
+    installations = pd.DataFrame({'installation_id': ['INST_001', 'INST_002'], 'capacity_kw': [5.0, 50.0]})
+
+    estimates = estimate_soiling(db.session, installations, window_days=20, now=NOW)
+    assert list(estimates['installation_id']) == ['INST_001']
+    assert estimates['soiling_rate_per_day'].iloc[0] == pytest.approx(0.002, rel=0.01)
+    # No cleaning jump in the window: no cleaning date, days counted from the first reading
+    assert estimates['last_cleaning_date'].iloc[0] is None
+    assert estimates['days_since_cleaning'].iloc[0] == 19
+
+    # A dead site must not abort the fleet-wide replace
+    store_estimates(db.session, estimates)
+    assert [e.installation_id for e in SoilingEstimate.query.all()] == ['INST_001']
+
+
+def test_cleaning_jump_restarts_the_fit(app):
+    add_days('INST_001', 5.0, 40, soiling_rate=0.01, cleaned_on=25)
+    installations = pd.DataFrame({'installation_id': ['INST_001'], 'capacity_kw': [5.0]})
+
+    estimate = estimate_soiling(db.session, installations, window_days=60, now=NOW).iloc[0]
+    assert estimate['last_cleaning_date'] == (NOW - timedelta(days=14)).date()
+    assert estimate['days_since_cleaning'] == 14
+    assert estimate['soiling_rate_per_day'] == pytest.approx(0.01, rel=0.01)
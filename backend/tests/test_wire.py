@@ -0,0 +1,52 @@
+import zlib
+from datetime import datetime, timedelta
+
+import pytest
+
+import wire
+
+
+def readings(count):
+    start = datetime(2024, 1, 1, 6)
+    return [{'installation_id': f'INST_00{1 + i % 2}', 'timestamp': start + timedelta(minutes=15 * i),
+             'pv_power_kw': 12.3 + i, 'irradiation_wm2': 812.5, 'module_temp_c': 41.7, 'ambient_temp_c': 29.9,
+             'dust_level': None if i % 2 else 0.25} for i in range(count)]
+
+
+def test_round_trip_keeps_values_and_applies_defaults():
+    body = wire.encode(readings(4), compress=True)
+    assert len(wire.decompress(body, 'gzip')) == wire.HEADER.size + 2 * 9 + 4 * wire.RECORD_DTYPE.itemsize
+
+    columns, errors = wire.telemetry_columns(*wire.decode(wire.decompress(body, 'gzip')))
+    assert not errors
+    assert columns['installation_id'].tolist() == ['INST_001', 'INST_002', 'INST_001', 'INST_002']
+    assert columns['timestamp'].tolist() == [reading['timestamp'] for reading in readings(4)]
+    # float32 on the wire, but the decimal the device sent comes back
+    assert columns['pv_power_kw'].tolist() == [12.3, 13.3, 14.3, 15.3]
+    assert columns['ambient_temp_c'].tolist() == [29.9] * 4
+    assert columns['dust_level'].tolist() == [0.25, 0.0, 0.25, 0.0]
+    assert columns['inverter_efficiency'].tolist() == [95.0] * 4
+
+
+def test_missing_required_value_is_a_row_error():
+    batch = readings(3)
+    batch[1]['irradiation_wm2'] = None
+    columns, errors = wire.telemetry_columns(*wire.decode(wire.encode(batch)))
+    assert errors == [{'row': 1, 'error': 'missing field irradiation_wm2'}]
+    assert len(columns['timestamp']) == 2
+
+
+def test_malformed_and_oversized_bodies_are_refused():
+    body = wire.encode(readings(4))
+    with pytest.raises(ValueError, match='bad magic'):
+        wire.decode(b'XXXX' + body[4:])
+    with pytest.raises(ValueError, match='expected 4 readings'):
+        wire.decode(body[:-1])
+    with pytest.raises(ValueError, match='Content-Encoding'):
+        wire.decompress(body, 'br')
+
+    # A small gzip body must not inflate past the cap
+    bomb = zlib.compress(b'\0' * 100000, wbits=31)
+    with pytest.raises(ValueError, match='exceeds 1000 bytes'):
+        wire.decompress(bomb, 'gzip', limit=1000)
+
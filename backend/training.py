@@ -0,0 +1,119 @@
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+logger = logging.getLogger(__name__)
+
+# Set in each worker process by _init_worker
+_worker_app = None
+_worker_cache = None
+
+
+def worker_app():
+    """The app of the current worker process (inside a map_installations task)"""
+    return _worker_app
+
+
+def worker_cache():
+    """The current worker's ModelCache: backend choices and one model at a time"""
+    return _worker_cache
+
+
+def plan_workers(installation_count, workers=None, cpus=None):
+    """``(processes, threads per process)`` so processes x threads never exceeds the cores.
+
+    Installations are the unit of parallelism; only when there are fewer
+    installations than cores do the leftover cores go to each model's own
+    ``n_jobs`` / BLAS / OpenMP threads.
+    """
+    cpus = cpus or os.cpu_count() or 1
+    processes = max(1, min(workers or cpus, installation_count, cpus))
+    return processes, max(1, cpus // processes)
+
+
+def _init_worker(config, threads):
+    """Per-process setup: its own app and DB engine, and a cap on native threads"""
+    global _worker_app, _worker_cache
+
+    os.environ['MODEL_N_JOBS'] = str(threads)
+    from threadpoolctl import threadpool_limits
+    threadpool_limits(threads)
+
+    from app import create_app
+    from ml import ModelCache
+    _worker_app = create_app(config)
+    # Backend choices plus the one model in use; models are shared via MODEL_DIR
+    _worker_cache = ModelCache(max_models=1)
+
+
+def _train_one(installation_id):
+    """Train and save one installation's model inside a worker; never raises"""
+    from ml import SolarPredictionModel, save_model
+
+    start = time.perf_counter()
+    result = {'installation_id': installation_id, 'ok': False, 'backend': None, 'rows': 0, 'error': None}
+    try:
+        with _worker_app.app_context():
+            model = SolarPredictionModel(_worker_cache.backend_for(installation_id))
+            if model.train_model(installation_id):
+                save_model(installation_id, model)
+            result.update(ok=model.is_trained, backend=model.backend_name, rows=model.training_rows,
+                          error=model.training_error)
+    except Exception as e:
+        result['error'] = str(e)
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
+def map_installations(task, installation_ids, config, workers=None, on_result=None, args=()):
+    """Run ``task(installation_id, *args)`` for every installation across CPU cores.
+
+    Each worker process builds its own app from ``config`` (at least
+    ``SQLALCHEMY_DATABASE_URI``); workers are spawned rather than forked so
+    no database connection or lock is inherited. ``task`` must be a
+    module-level function returning a result dict with ``installation_id``,
+    ``ok`` and ``error`` that never raises. Returns the results in completion
+    order; ``on_result`` is called with each as it completes.
+    """
+    installation_ids = list(installation_ids)
+    if not installation_ids:
+        return []
+    processes, threads = plan_workers(len(installation_ids), workers)
+    logger.info(f"Running {task.__name__} for {len(installation_ids)} installations "
+                f"with {processes} processes x {threads} threads")
+
+    results = []
+    with ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=_init_worker, initargs=(config, threads)) as executor:
+        futures = {executor.submit(task, installation_id, *args): installation_id
+                   for installation_id in installation_ids}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. out of memory)
+                result = {'installation_id': futures[future], 'ok': False, 'error': f'worker failed: {e}',
+                          'seconds': None}
+            results.append(result)
+            if on_result:
+                on_result(result)
+    return results
+
+
+def train_all(installation_ids, config, workers=None, on_result=None):
+    """Train every installation's model in parallel across CPU cores.
+
+    Each worker pulls its installation's training window from the feature
+    store and saves the fitted model under ``MODEL_DIR``, where serving
+    workers pick it up. Returns one result dict per installation (``ok``,
+    ``seconds``, ``rows``, ``backend``, ``error``).
+    """
+    def complete(result):
+        result.setdefault('backend', None)
+        result.setdefault('rows', 0)
+        if on_result:
+            on_result(result)
+
+    return map_installations(_train_one, installation_ids, config, workers, complete)
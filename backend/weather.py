@@ -0,0 +1,71 @@
+import os
+import logging
+from datetime import datetime
+
+from solar_geometry import cloudy_sky_ghi, solar_tables
+
+logger = logging.getLogger(__name__)
+
+# Weather API Configuration (the API key is read per call, after .env is loaded;
+# requests is imported on first use)
+WEATHER_BASE_URL = "http://api.openweathermap.org/data/2.5"
+
+class WeatherService:
+    @staticmethod
+    def get_weather_data(lat, lon):
+        """Get current weather data from OpenWeatherMap"""
+        try:
+            import requests
+            
+            url = f"{WEATHER_BASE_URL}/weather"
+            params = {
+                'lat': lat,
+                'lon': lon,
+                'appid': os.getenv('WEATHER_API_KEY'),
+                'units': 'metric'
+            }
+            
+            response = requests.get(url, params=params, timeout=10)
+            response.raise_for_status()
+            
+            data = response.json()
+            
+            # Clear-sky irradiance for this place and minute, dimmed by the reported cloud cover
+            _, clear_sky = solar_tables.at(lat, lon, datetime.utcnow())
+            cloud_fraction = data.get('clouds', {}).get('all', 0) / 100
+            
+            return {
+                'temperature': data['main']['temp'],
+                'humidity': data['main']['humidity'],
+                'wind_speed': data['wind']['speed'],
+                'irradiation': round(cloudy_sky_ghi(clear_sky, cloud_fraction), 1),
+                'weather_condition': data['weather'][0]['main']
+            }
+            
+        except Exception as e:
+            logger.error(f"Error fetching weather data: {str(e)}")
+            return None
+    
+    @staticmethod
+    def get_forecast_data(lat, lon, days=5):
+        """Get weather forecast data"""
+        try:
+            import requests
+            
+            url = f"{WEATHER_BASE_URL}/forecast"
+            params = {
+                'lat': lat,
+                'lon': lon,
+                'appid': os.getenv('WEATHER_API_KEY'),
+                'units': 'metric',
+                'cnt': days * 8  # 8 forecasts per day (3-hour intervals)
+            }
+            
+            response = requests.get(url, params=params, timeout=10)
+            response.raise_for_status()
+            
+            return response.json()
+            
+        except Exception as e:
+            logger.error(f"Error fetching forecast data: {str(e)}")
+            return None
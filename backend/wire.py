@@ -0,0 +1,155 @@
+import struct
+import zlib
+from datetime import datetime, timezone
+
+import numpy as np
+
+from bulk_load import MAX_FUTURE_SECONDS, OPTIONAL_DEFAULTS, TELEMETRY_COLUMNS
+
+# Binary batch body for POST /api/telemetry/batch, optionally gzip-compressed
+# (Content-Encoding: gzip). Little-endian throughout:
+#
+#   header   magic "SLT1", uint16 id count, uint32 reading count
+#   ids      per installation: uint8 byte length + UTF-8 id
+#   readings fixed 38-byte records (RECORD_DTYPE), one per reading
+#
+# Readings refer to installations by their index in the id table, timestamps
+# are UTC epoch seconds (0 = time of receipt) and a NaN measurement means
+# absent (the JSON defaults apply to optional fields).
+CONTENT_TYPE = 'application/vnd.solar-telemetry'
+
+MAGIC = b'SLT1'
+
+HEADER = struct.Struct('<4sHI')
+
+MEASUREMENTS = TELEMETRY_COLUMNS[2:]
+
+RECORD_DTYPE = np.dtype([('installation', '<u2'), ('timestamp', '<u4')] +
+                        [(name, '<f4') for name in MEASUREMENTS])
+
+# Largest decompressed body accepted, so a small gzip body cannot expand without bound
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def encode(readings, compress=False):
+    """Pack reading dicts (as posted to /api/telemetry) into a binary batch body"""
+    ids = list(dict.fromkeys(str(reading['installation_id']) for reading in readings))
+    if len(ids) > 0xFFFF:
+        raise ValueError('a batch can name at most 65535 installations')
+    index = {installation_id: i for i, installation_id in enumerate(ids)}
+
+    records = np.zeros(len(readings), dtype=RECORD_DTYPE)
+    records['installation'] = [index[str(reading['installation_id'])] for reading in readings]
+    records['timestamp'] = [_epoch_seconds(reading.get('timestamp')) for reading in readings]
+    for name in MEASUREMENTS:
+        records[name] = [np.nan if reading.get(name) is None else reading[name] for reading in readings]
+
+    parts = [HEADER.pack(MAGIC, len(ids), len(readings))]
+    for installation_id in ids:
+        encoded = installation_id.encode('utf-8')
+        if len(encoded) > 0xFF:
+            raise ValueError(f'installation id {installation_id!r} is too long')
+        parts.append(bytes([len(encoded)]) + encoded)
+    parts.append(records.tobytes())
+    body = b''.join(parts)
+    return zlib.compress(body, wbits=31) if compress else body
+
+
+def _epoch_seconds(timestamp):
+    if timestamp is None:
+        return 0
+    if not isinstance(timestamp, datetime):
+        timestamp = datetime.fromisoformat(str(timestamp))
+    if timestamp.tzinfo is not None:
+        # Naive UTC, as bulk_load.telemetry_row stores it
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((timestamp - _EPOCH).total_seconds())
+
+
+def decompress(body, encoding=None, limit=MAX_BODY_BYTES):
+    """Undo a ``gzip`` Content-Encoding (other bodies are returned as is). Raises ValueError."""
+    if not encoding or encoding.lower() == 'identity':
+        return body
+    if encoding.lower() not in ('gzip', 'x-gzip'):
+        raise ValueError(f'unsupported Content-Encoding {encoding!r} (use gzip)')
+    inflater = zlib.decompressobj(wbits=31)
+    try:
+        data = inflater.decompress(body, limit)
+    except zlib.error as e:
+        raise ValueError(f'invalid gzip body: {str(e)}')
+    if inflater.unconsumed_tail:
+        raise ValueError(f'decompressed body exceeds {limit} bytes')
+    return data
+
+
+def decode(body):
+    """``(installation ids, record array)`` from a binary batch body, without copying the records.
+
+    Raises ValueError on a malformed body.
+    """
+    if len(body) < HEADER.size:
+        raise ValueError('body is shorter than the header')
+    magic, id_count, count = HEADER.unpack_from(body)
+    if magic != MAGIC:
+        raise ValueError('not a binary telemetry batch (bad magic)')
+    ids, offset = [], HEADER.size
+    for _ in range(id_count):
+        if offset >= len(body):
+            raise ValueError('truncated installation id table')
+        length = body[offset]
+        ids.append(bytes(body[offset + 1:offset + 1 + length]).decode('utf-8'))
+        offset += 1 + length
+    if len(body) - offset != count * RECORD_DTYPE.itemsize:
+        raise ValueError(f'expected {count} readings of {RECORD_DTYPE.itemsize} bytes after the id table')
+    return ids, np.frombuffer(body, dtype=RECORD_DTYPE, count=count, offset=offset)
+
+
+def _float64(values):
+    """float32 readings as the float64 of their 7-significant-digit decimal (12.3, not 12.300000190734863)"""
+    values = values.astype(np.float64)
+    magnitude = np.floor(np.log10(np.abs(np.where(np.isfinite(values) & (values != 0), values, 1.0))))
+    scale = 10.0 ** (6 - magnitude)
+    return np.round(values * scale) / scale
+
+
+def telemetry_columns(ids, records, now=None):
+    """Column arrays for ``bulk_load`` (see ``bulk_load.rows_to_columns``) plus per-row errors.
+
+    Validation, defaults and timestamp conversion are whole-column numpy
+    operations; no per-reading Python objects are built.
+    """
+    now = now or datetime.utcnow()
+    ok = records['installation'] < len(ids)
+    errors = [{'row': int(row), 'error': 'installation index outside the id table'}
+              for row in np.flatnonzero(~ok)]
+
+    columns = {}
+    for name in MEASUREMENTS:
+        values = records[name]
+        if name in OPTIONAL_DEFAULTS:
+            values = np.where(np.isnan(values), np.float32(OPTIONAL_DEFAULTS[name]), values)
+        else:
+            missing = ok & np.isnan(values)
+            errors.extend({'row': int(row), 'error': f'missing field {name}'} for row in np.flatnonzero(missing))
+            ok &= ~missing
+        bad = ok & np.isinf(values)
+        errors.extend({'row': int(row), 'error': f'{name} must be finite'} for row in np.flatnonzero(bad))
+        ok &= ~bad
+        columns[name] = values
+    latest = int((now - _EPOCH).total_seconds()) + MAX_FUTURE_SECONDS
+    future = ok & (records['timestamp'] > latest)
+    errors.extend({'row': int(row), 'error': f'timestamp is more than {MAX_FUTURE_SECONDS}s ahead of server time'}
+                  for row in np.flatnonzero(future))
+    ok &= ~future
+    errors.sort(key=lambda error: error['row'])
+
+    keep = np.flatnonzero(ok)
+    installation_ids = np.array(ids, dtype=object)[records['installation'][keep]]
+    seconds = records['timestamp'][keep]
+    timestamps = np.where(seconds > 0, seconds.astype('datetime64[s]'), np.datetime64(now, 's'))
+    loaded = {'installation_id': installation_ids, 'timestamp': timestamps.astype('datetime64[us]')}
+    loaded.update((name, _float64(columns[name][keep])) for name in MEASUREMENTS)
+    return loaded, errors
+
@@ -0,0 +1,21 @@
+"""WSGI entry point for production serving.
+
+    gunicorn -c gunicorn.conf.py wsgi:application
+
+Each worker imports this module before it accepts connections, so the
+pre-warm below (DB connection, model training) happens off the request path.
+Tables are created once by the gunicorn master (see gunicorn.conf.py), and the
+scheduler is NOT started here; run scheduler_runner.py as its own process.
+"""
+import os
+
+from app import create_app, prewarm
+from metrics import MULTIPROC_DIR, REGISTRY
+
+application = create_app()
+
+if MULTIPROC_DIR:
+    REGISTRY.enable_multiprocess(MULTIPROC_DIR)
+
+if os.getenv('PREWARM_ON_START', 'true').lower() in ('1', 'true', 'yes'):
+    prewarm(application)
@@ -0,0 +1,157 @@
+"""Shared helpers for the backend benchmarks: app loading, deterministic seeding, timing stats."""
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# Fixed reference time so every run seeds identical timestamps
+SEED_EPOCH = datetime(2025, 3, 1, 0, 0, 0)
+
+ZONES = ['tropical', 'semi-arid', 'arid', 'temperate']
+
+
+def default_database_url():
+    return f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='solar-bench-'), 'bench.db')}"
+
+
+def load_app(database_url, reset=False):
+    """Build the backend app against ``database_url`` and create its tables.
+
+    Returns the backend module (models, ML, pipeline functions) and the app.
+    """
+    os.environ['DATABASE_URL'] = database_url
+    # Benchmark runs materialize features for throwaway data; keep them out of the real store
+    os.environ.setdefault('FEATURE_STORE_DIR', tempfile.mkdtemp(prefix='solar-features-'))
+    # Benchmarks drive ingest far beyond any tenant's quota on purpose
+    os.environ.setdefault('RATE_LIMIT_ENABLED', 'false')
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+    import logging
+    logging.disable(logging.WARNING)
+
+    import app as backend
+    app = backend.create_app({'SQLALCHEMY_DATABASE_URI': database_url})
+    with app.app_context():
+        if reset:
+            backend.db.drop_all()
+        backend.db.create_all()
+    return backend, app
+
+
+def make_installations(count, seed):
+    """Deterministic installations spread over India's latitude/longitude range"""
+    rng = random.Random(seed)
+    installations = []
+    for index in range(count):
+        installations.append({
+            'id': f'BENCH_{index:05d}',
+            'name': f'Benchmark Site {index}',
+            'location': 'Benchmark',
+            'lat': round(rng.uniform(8.0, 32.0), 4),
+            'lon': round(rng.uniform(68.0, 92.0), 4),
+            'capacity_kw': round(rng.choice([5.0, 10.0, 25.0, 50.0, 100.0, 200.0]), 1),
+            'climatic_zone': rng.choice(ZONES)
+        })
+    return installations
+
+
+def simulated_readings(installation, start, count, interval_minutes, seed, fault_rate=0.05):
+    """Readings for one installation generated by the simulator physics.
+
+    Seeds the global ``random`` module because the simulator draws from it.
+    """
+    from data_simulator import SolarDataSimulator
+
+    random.seed(seed)
+    simulator = SolarDataSimulator()
+    readings = []
+    for step in range(count):
+        timestamp = start + timedelta(minutes=interval_minutes * step)
+        data = simulator.get_realistic_solar_data(installation, timestamp)
+        if random.random() < fault_rate:
+            data = simulator.simulate_fault_conditions(data)
+        data['timestamp'] = timestamp
+        readings.append(data)
+    return readings
+
+
+def seed_database(backend, app, installations, readings_per_installation, interval_minutes, seed):
+    """Insert installations and their telemetry; returns the number of telemetry rows"""
+    with app.app_context():
+        db = backend.db
+        for inst in installations:
+            db.session.merge(backend.SolarInstallation(
+                id=inst['id'], name=inst['name'], location=inst['location'],
+                latitude=inst['lat'], longitude=inst['lon'], capacity_kw=inst['capacity_kw'],
+                panel_count=int(inst['capacity_kw'] * 4), climatic_zone=inst['climatic_zone']
+            ))
+        db.session.commit()
+        backend.installation_registry.invalidate()
+
+        total = 0
+        for offset, inst in enumerate(installations):
+            readings = simulated_readings(inst, SEED_EPOCH, readings_per_installation,
+                                          interval_minutes, seed + offset)
+            db.session.add_all([backend.TelemetryData(
+                installation_id=inst['id'],
+                timestamp=r['timestamp'],
+                pv_power_kw=r['pv_power_kw'],
+                irradiation_wm2=r['irradiation_wm2'],
+                module_temp_c=r['module_temp_c'],
+                ambient_temp_c=r['ambient_temp_c'],
+                wind_speed_ms=r['wind_speed_ms'],
+                humidity_percent=r['humidity_percent'],
+                dust_level=r['dust_level'],
+                inverter_efficiency=r['inverter_efficiency']
+            ) for r in readings])
+            db.session.commit()
+            total += len(readings)
+        return total
+
+
+def latency_stats(samples):
+    """Summary statistics (milliseconds) for a list of durations in seconds"""
+    values = np.asarray(samples) * 1000
+    return {
+        'count': int(values.size),
+        'mean_ms': float(values.mean()),
+        'p50_ms': float(np.percentile(values, 50)),
+        'p99_ms': float(np.percentile(values, 99)),
+        'max_ms': float(values.max())
+    }
+
+
+def timed_calls(func, iterations):
+    """Call ``func`` repeatedly and return the individual durations in seconds"""
+    durations = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def run_metadata(database_url, params):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                text=True, cwd=BACKEND_DIR).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': datetime.utcnow().isoformat(),
+        'git_commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'database': database_url.split(':', 1)[0],
+        'params': params
+    }
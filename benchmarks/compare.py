@@ -0,0 +1,57 @@
+"""Compare two benchmark result files and flag regressions.
+
+Usage::
+
+    python benchmarks/compare.py baseline.json candidate.json [--threshold 10]
+
+Exits with status 1 when any metric got worse by more than ``--threshold`` percent.
+"""
+import argparse
+import json
+import sys
+
+
+def compare(baseline, candidate, threshold):
+    rows = []
+    regressions = []
+    for name, base in sorted(baseline['results'].items()):
+        new = candidate['results'].get(name)
+        if new is None or not base['value']:
+            continue
+        change = (new['value'] - base['value']) / abs(base['value']) * 100
+        # Descriptive metrics (better: None) are shown but never flagged
+        if base['better'] == 'higher':
+            worse = change < -threshold
+        else:
+            worse = base['better'] == 'lower' and change > threshold
+        rows.append((name, base['value'], new['value'], base['unit'], change, worse))
+        if worse:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare benchmark results')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--threshold', type=float, default=10.0, help='Allowed change in percent')
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    for name, old, new, unit, change, worse in rows:
+        flag = 'REGRESSION' if worse else ''
+        print(f"{name:45s} {old:12.3f} -> {new:12.3f} {unit:7s} {change:+7.1f}% {flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0f}%")
+        sys.exit(1)
+    print("\nNo regressions")
+
+
+if __name__ == '__main__':
+    main()
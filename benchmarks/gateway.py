@@ -0,0 +1,114 @@
+"""Edge pre-aggregation: ingest volume and energy error of gateway summaries.
+
+Feeds a day of high-frequency simulator samples through ``backend/gateway.py``
+and compares what reaches ``POST /api/telemetry/batch`` with uploading every
+sample: rows and gzip-compressed bytes per sample, gateway CPU per sample and
+the error of the energy the backend derives from the summaries (mean power x
+covered hours, as in analytics.py) against the integral of the samples.
+
+Usage (from the repository root)::
+
+    python benchmarks/gateway.py --installations 10 --sample-seconds 5
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import zlib
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import BACKEND_DIR, RESULTS_DIR, SEED_EPOCH, make_installations, run_metadata, simulated_readings
+
+
+def backend_energy_kwh(readings, interval_hours):
+    """Energy as analytics.py estimates it from evenly spaced readings"""
+    if len(readings) < 2:
+        return 0.0
+    mean_power = sum(reading['pv_power_kw'] for reading in readings) / len(readings)
+    return mean_power * interval_hours * len(readings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gateway pre-aggregation benchmark')
+    parser.add_argument('--installations', type=int, default=10)
+    parser.add_argument('--hours', type=int, default=24)
+    parser.add_argument('--sample-seconds', type=int, default=5)
+    parser.add_argument('--window-seconds', type=int, default=900)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help='Result file (use - for stdout)')
+    args = parser.parse_args()
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    import wire
+    from gateway import Gateway
+
+    count = args.hours * 3600 // args.sample_seconds
+    samples, raw_energy = [], {}
+    for index, inst in enumerate(make_installations(args.installations, args.seed)):
+        readings = simulated_readings(inst, SEED_EPOCH, count, args.sample_seconds / 60, args.seed + index)
+        raw_energy[inst['id']] = sum(reading['pv_power_kw'] for reading in readings) * args.sample_seconds / 3600
+        samples.extend(readings)
+    # A gateway sees all installations' samples for one instant together
+    samples.sort(key=lambda reading: reading['timestamp'])
+
+    spool_dir = tempfile.mkdtemp(prefix='gateway-bench-')
+    try:
+        gateway = Gateway(spool_dir, window_seconds=args.window_seconds, sample_seconds=args.sample_seconds)
+        start = time.perf_counter()
+        for reading in samples:
+            gateway.add(reading)
+        gateway.poll(SEED_EPOCH + timedelta(hours=args.hours), upload=False)
+        gateway.spool.seal()
+        elapsed = time.perf_counter() - start
+        summaries = [summary for path in gateway.spool.batches() for summary in gateway.spool.read(path)]
+    finally:
+        shutil.rmtree(spool_dir, ignore_errors=True)
+
+    raw_body = zlib.compress(json.dumps([dict(reading, timestamp=reading['timestamp'].isoformat())
+                                         for reading in samples]).encode(), wbits=31)
+    bodies = {
+        'json_gzip': zlib.compress(json.dumps(summaries).encode(), wbits=31),
+        'binary_gzip': wire.encode(summaries, compress=True)
+    }
+    by_installation = {}
+    for summary in summaries:
+        by_installation.setdefault(summary['installation_id'], []).append(summary)
+    errors = [abs(backend_energy_kwh(rows, args.window_seconds / 3600) - raw_energy[installation_id])
+              / raw_energy[installation_id] for installation_id, rows in by_installation.items()
+              if raw_energy[installation_id] > 0]
+
+    results = {
+        'gateway.aggregation_factor': {'value': len(samples) / len(summaries), 'unit': 'x', 'better': 'higher'},
+        'gateway.raw.bytes_per_sample': {'value': len(raw_body) / len(samples), 'unit': 'B', 'better': 'lower'},
+        'gateway.cpu_us_per_sample': {'value': elapsed / len(samples) * 1e6, 'unit': 'us', 'better': 'lower'},
+        'gateway.energy_error_pct': {'value': max(errors) * 100, 'unit': '%', 'better': 'lower'}
+    }
+    for name, body in bodies.items():
+        results[f'gateway.{name}.bytes_per_sample'] = {
+            'value': len(body) / len(samples), 'unit': 'B', 'better': 'lower'}
+
+    report = {
+        'meta': run_metadata('none', vars(args)),
+        'results': results
+    }
+    for name, result in results.items():
+        print(f"  {name:55s} {result['value']:14.4f} {result['unit']}")
+
+    if args.output == '-':
+        print(json.dumps(report, indent=2))
+        return
+    output = args.output or os.path.join(RESULTS_DIR, f"gateway-{time.strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
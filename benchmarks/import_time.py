@@ -0,0 +1,109 @@
+"""Backend startup cost: import time, per-package breakdown and resident memory.
+
+Runs ``import app; app.create_app()`` in fresh interpreters under
+``python -X importtime`` and reports the median wall time, peak RSS and the
+packages that dominate import time (self time summed per top-level package).
+Heavy optional subsystems (sklearn, pandas, openai, ...) are reported as
+loaded or not, so lazy-loading regressions show up immediately.
+
+Usage (from the repository root)::
+
+    python benchmarks/import_time.py --output benchmarks/baselines/import_time.json
+    python benchmarks/compare.py benchmarks/baselines/import_time.json new.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import BACKEND_DIR, run_metadata
+
+CHILD = """
+import json, resource, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app()
+t2 = time.perf_counter()
+print(json.dumps({
+    'import_s': t1 - t0,
+    'create_app_s': t2 - t1,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+}))
+"""
+
+HEAVY_PACKAGES = ['sklearn', 'pandas', 'scipy', 'openai', 'requests', 'apscheduler', 'numpy']
+
+
+def parse_importtime(stderr):
+    """Sum ``-X importtime`` self times (microseconds) per top-level package"""
+    per_package = defaultdict(int)
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        try:
+            self_us, _, name = [part.strip() for part in line[len('import time:'):].split('|')]
+            per_package[name.split('.')[0]] += int(self_us)
+        except ValueError:
+            continue
+    return per_package
+
+
+def measure_once(backend_dir):
+    env = dict(os.environ, DATABASE_URL='sqlite://', PYTHONDONTWRITEBYTECODE='1')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], cwd=backend_dir,
+                            env=env, capture_output=True, text=True, check=True)
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    return timings, parse_importtime(result.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure backend import time and memory')
+    parser.add_argument('--backend-dir', default=BACKEND_DIR)
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--output', default=None, help='Result file (default: print only)')
+    args = parser.parse_args()
+
+    measure_once(args.backend_dir)  # populate bytecode/OS caches
+    runs = [measure_once(args.backend_dir) for _ in range(args.runs)]
+
+    import_s = statistics.median(t['import_s'] for t, _ in runs)
+    create_app_s = statistics.median(t['create_app_s'] for t, _ in runs)
+    rss_kb = statistics.median(t['max_rss_kb'] for t, _ in runs)
+    packages = runs[-1][1]
+    top = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:args.top]
+
+    report = {
+        'meta': run_metadata('none', vars(args)),
+        'results': {
+            'startup.import_app_ms': {'value': import_s * 1000, 'unit': 'ms', 'better': 'lower'},
+            'startup.create_app_ms': {'value': create_app_s * 1000, 'unit': 'ms', 'better': 'lower'},
+            'startup.max_rss_mb': {'value': rss_kb / 1024, 'unit': 'MB', 'better': 'lower'}
+        },
+        'heavy_packages_loaded': {name: name in packages for name in HEAVY_PACKAGES},
+        'top_packages_ms': {name: round(us / 1000, 2) for name, us in top}
+    }
+
+    print(f"import app:   {import_s * 1000:8.1f} ms (median of {args.runs})")
+    print(f"create_app(): {create_app_s * 1000:8.1f} ms")
+    print(f"peak RSS:     {rss_kb / 1024:8.1f} MB")
+    print("heavy packages loaded at startup: " +
+          ', '.join(name for name, loaded in report['heavy_packages_loaded'].items() if loaded))
+    for name, ms in report['top_packages_ms'].items():
+        print(f"  {name:30s} {ms:8.2f} ms")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""Synthetic fleet scenarios: generation throughput and cloud correlation by distance.
+
+Generates ``backend/scenarios.py`` scenarios for synthetic installations
+clustered around Indian cities and reports readings generated per second,
+the correlation of cloud cover between site pairs by distance (neighbours
+should share clouds, distant sites should not) and fault episodes per
+installation-year.
+
+Usage (from the repository root)::
+
+    python benchmarks/scenarios.py --installations 1000 --days 365
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import BACKEND_DIR, RESULTS_DIR, SEED_EPOCH, run_metadata
+
+# Distance bins (km) for cloud-cover correlation between site pairs
+DISTANCE_BINS = [(0, 10), (10, 50), (50, 200), (500, 3000)]
+
+# Sites whose cloud series are kept for the correlation estimate
+CORRELATION_SITES = 200
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fleet scenario generator benchmark')
+    parser.add_argument('--installations', type=int, default=1000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--interval', type=int, default=15, help='Minutes between readings')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help='Result file (use - for stdout)')
+    args = parser.parse_args()
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+    from registry import haversine_km
+    from scenarios import Scenario, synthetic_installations
+
+    installations = synthetic_installations(args.installations, args.seed)
+    scenario = Scenario(installations, SEED_EPOCH, SEED_EPOCH + timedelta(days=args.days), args.interval, args.seed)
+    kept = min(CORRELATION_SITES, args.installations)
+
+    readings, clouds = 0, []
+    start = time.perf_counter()
+    for chunk in scenario.chunks():
+        readings += chunk.labels.size
+        # Daytime-agnostic hourly subsample is enough for correlations
+        clouds.append(chunk.cloud_fraction[:kept, ::max(1, 60 // args.interval)])
+    elapsed = time.perf_counter() - start
+
+    results = {
+        'scenarios.readings_per_second': {'value': readings / elapsed, 'unit': 'readings/s', 'better': 'higher'}
+    }
+
+    correlation = np.corrcoef(np.concatenate(clouds, axis=1))
+    latitude = np.array([inst['latitude'] for inst in installations[:kept]])
+    longitude = np.array([inst['longitude'] for inst in installations[:kept]])
+    distances = haversine_km(latitude[:, None], longitude[:, None], latitude[None, :], longitude[None, :])
+    pairs = np.triu(np.ones((kept, kept), dtype=bool), k=1)
+    for low, high in DISTANCE_BINS:
+        mask = pairs & (distances > low) & (distances <= high)
+        if mask.any():
+            results[f'scenarios.cloud_correlation.{low}_{high}km'] = {
+                'value': float(correlation[mask].mean()), 'unit': 'r', 'better': None}
+
+    site_years = args.installations * args.days / 365
+    for fault in ('soiling', 'inverter_degradation', 'string_outage'):
+        count = sum(episode['fault'] == fault for episode in scenario.episodes())
+        results[f'scenarios.{fault}_episodes_per_site_year'] = {
+            'value': count / site_years, 'unit': 'episodes', 'better': None}
+
+    report = {
+        'meta': run_metadata('none', vars(args)),
+        'results': results
+    }
+    for name, result in results.items():
+        print(f"  {name:55s} {result['value']:14.3f} {result['unit']}")
+
+    if args.output == '-':
+        print(json.dumps(report, indent=2))
+        return
+    output = args.output or os.path.join(RESULTS_DIR, f"scenarios-{time.strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
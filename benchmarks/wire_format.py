@@ -0,0 +1,98 @@
+"""Telemetry wire formats: bytes per reading and decode CPU per reading.
+
+Encodes the same simulator readings as a JSON list and in the binary format
+of ``backend/wire.py``, each with and without gzip, then times what
+``POST /api/telemetry/batch`` does with the body before touching the
+database: decompress, parse and turn it into the column arrays ``bulk_load``
+loads.
+
+Usage (from the repository root)::
+
+    python benchmarks/wire_format.py --installations 20 --readings 2000
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from common import BACKEND_DIR, RESULTS_DIR, SEED_EPOCH, make_installations, run_metadata, simulated_readings
+
+FORMATS = ['json', 'json_gzip', 'binary', 'binary_gzip']
+
+
+def encode(readings, name):
+    import wire
+
+    if name.startswith('binary'):
+        return wire.encode(readings, compress=name.endswith('gzip'))
+    body = json.dumps([dict(reading, timestamp=reading['timestamp'].isoformat()) for reading in readings]).encode()
+    return zlib.compress(body, wbits=31) if name.endswith('gzip') else body
+
+
+def decode(body, name):
+    import bulk_load
+    import wire
+
+    body = wire.decompress(body, 'gzip' if name.endswith('gzip') else None)
+    if name.startswith('binary'):
+        return wire.telemetry_columns(*wire.decode(body))
+    rows, errors = bulk_load.telemetry_rows(json.loads(body))
+    return bulk_load.rows_to_columns(rows), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Telemetry wire format benchmark')
+    parser.add_argument('--installations', type=int, default=20)
+    parser.add_argument('--readings', type=int, default=2000, help='Readings per installation')
+    parser.add_argument('--repeat', type=int, default=5, help='Decode runs per format (best is kept)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--output', default=None, help='Result file (use - for stdout)')
+    args = parser.parse_args()
+
+    if BACKEND_DIR not in sys.path:
+        sys.path.insert(0, BACKEND_DIR)
+
+    readings = []
+    for index, inst in enumerate(make_installations(args.installations, args.seed)):
+        readings.extend(simulated_readings(inst, SEED_EPOCH, args.readings, 15, args.seed + index))
+    count = len(readings)
+
+    results = {}
+    for name in FORMATS:
+        body = encode(readings, name)
+        best = float('inf')
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            columns, errors = decode(body, name)
+            best = min(best, time.perf_counter() - start)
+        decoded = len(columns['timestamp'])
+        if decoded != count or errors:
+            raise RuntimeError(f"{name}: decoded {decoded} of {count} readings, {len(errors)} errors")
+        results[f'wire_format.{name}.bytes_per_reading'] = {
+            'value': len(body) / count, 'unit': 'B', 'better': 'lower'}
+        results[f'wire_format.{name}.decode_us_per_reading'] = {
+            'value': best / count * 1e6, 'unit': 'us', 'better': 'lower'}
+
+    report = {
+        'meta': run_metadata('none', vars(args)),
+        'results': results
+    }
+    for name, result in results.items():
+        print(f"  {name:55s} {result['value']:14.2f} {result['unit']}")
+
+    if args.output == '-':
+        print(json.dumps(report, indent=2))
+        return
+    output = args.output or os.path.join(RESULTS_DIR, f"wire_format-{time.strftime('%Y%m%dT%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == '__main__':
+    main()
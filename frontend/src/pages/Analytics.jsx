@@ -10,8 +10,23 @@ const Analytics = () => {
   }, [])
 
   const fetchAnalyticsData = async () => {
-    // This would fetch aggregated analytics data
-    // For demo, we'll create sample data
+    try {
+      const response = await fetch('/api/analytics?hours=24')
+      if (response.ok) {
+        const analytics = await response.json()
+        setAnalyticsData(analytics.installations.map(inst => ({
+          name: inst.name,
+          power: Number((inst.avg_power_kw || 0).toFixed(1)),
+          efficiency: Math.round((inst.performance_ratio || 0) * 100),
+          maintenance: Math.round(inst.avg_maintenance_score || 0)
+        })))
+        return
+      }
+    } catch (error) {
+      console.error('Error fetching analytics data:', error)
+    }
+
+    // Fall back to sample data when the analytics endpoint is unavailable
     const sampleData = [
       { name: 'Mumbai', power: 4.2, efficiency: 85, maintenance: 25 },
       { name: 'Delhi', power: 42.5, efficiency: 78, maintenance: 45 },
@@ -65,6 +65,17 @@ const Dashboard = () => {
     }
   }
 
+  const resolveAlert = async (alertId) => {
+    try {
+      const response = await fetch(`/api/alerts/${alertId}/resolve`, { method: 'POST' })
+      if (response.ok || response.status === 409) {
+        setAlerts(alerts.filter(alert => alert.id !== alertId))
+      }
+    } catch (error) {
+      console.error('Error resolving alert:', error)
+    }
+  }
+
   const generateReport = async () => {
     try {
       setLoading(true)
@@ -268,9 +279,17 @@ const Dashboard = () => {
                       {alert.severity}
                     </span>
                   </div>
-                  <p className="text-xs mt-2 opacity-75">
-                    {new Date(alert.timestamp).toLocaleString()}
-                  </p>
+                  <div className="flex justify-between items-center mt-2">
+                    <p className="text-xs opacity-75">
+                      {new Date(alert.timestamp).toLocaleString()}
+                    </p>
+                    <button
+                      onClick={() => resolveAlert(alert.id)}
+                      className="text-xs font-medium underline opacity-75 hover:opacity-100"
+                    >
+                      Resolve
+                    </button>
+                  </div>
                 </div>
               ))
             )}
@@ -288,6 +307,11 @@ const Dashboard = () => {
                   <p className="text-xl font-bold text-blue-600">
                     {predictions[0]?.predicted_power_kw?.toFixed(2)} kW
                   </p>
+                  {predictions[0]?.predicted_power_p10_kw != null && (
+                    <p className="text-xs text-gray-500">
+                      P10–P90: {predictions[0].predicted_power_p10_kw.toFixed(2)}–{predictions[0].predicted_power_p90_kw.toFixed(2)} kW
+                    </p>
+                  )}
                 </div>
                 <div className="text-center p-3 bg-green-50 rounded-lg">
                   <p className="text-sm text-gray-600">Efficiency Score</p>
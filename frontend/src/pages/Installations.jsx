@@ -1,20 +1,26 @@
 import React, { useState, useEffect } from 'react'
 import { MapPin, Zap, Calendar, Thermometer } from 'lucide-react'
 
+const PAGE_SIZE = 60
+
 const Installations = () => {
   const [installations, setInstallations] = useState([])
+  const [total, setTotal] = useState(0)
+  const [page, setPage] = useState(1)
   const [loading, setLoading] = useState(true)
 
   useEffect(() => {
-    fetchInstallations()
+    fetchInstallations(1)
   }, [])
 
-  const fetchInstallations = async () => {
+  const fetchInstallations = async (pageToLoad) => {
     try {
-      const response = await fetch('/api/installations')
+      const response = await fetch(`/api/installations?page=${pageToLoad}&per_page=${PAGE_SIZE}`)
       if (response.ok) {
         const data = await response.json()
-        setInstallations(data)
+        setInstallations(prev => pageToLoad === 1 ? data : [...prev, ...data])
+        setTotal(Number(response.headers.get('X-Total-Count')) || data.length)
+        setPage(pageToLoad)
       }
     } catch (error) {
       console.error('Error fetching installations:', error)
@@ -32,6 +38,7 @@ const Installations = () => {
       <div>
         <h1 className="text-3xl font-bold text-gray-900">Solar Installations</h1>
         <p className="text-gray-600">Manage and monitor your solar installations across India</p>
+        <p className="text-sm text-gray-500">Showing {installations.length} of {total}</p>
       </div>
 
       <div className="grid grid-cols-1 md:grid-cols-2 lg:grid-cols-3 gap-6">
@@ -73,6 +80,17 @@ const Installations = () => {
           </div>
         ))}
       </div>
+
+      {installations.length < total && (
+        <div className="flex justify-center">
+          <button
+            onClick={() => fetchInstallations(page + 1)}
+            className="bg-white border border-gray-300 text-gray-700 py-2 px-4 rounded-md hover:bg-gray-50"
+          >
+            Load more
+          </button>
+        </div>
+      )}
     </div>
   )
 }
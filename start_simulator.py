@@ -1,4 +1,6 @@
 import requests
+import os
+import sys
 import time
 import random
 import math
@@ -58,6 +60,30 @@ def send_telemetry(data):
         print(f"❌ Connection error: {e}")
         return False
 
+def run_gateway(sample_seconds=5):
+    """Sample every few seconds and upload 15-minute summaries instead of every reading"""
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'backend'))
+    from data_simulator import SolarDataSimulator
+    from gateway import Gateway
+    
+    # The installations create_tables seeds: the batch endpoint skips unknown ones
+    installations = [(inst['id'], inst['capacity_kw']) for inst in SolarDataSimulator().installations]
+    gateway = Gateway(os.getenv('GATEWAY_SPOOL_DIR', 'gateway_spool'), sample_seconds=sample_seconds)
+    print(f"🛰️  Gateway mode: sampling every {sample_seconds}s, uploading one summary per 15 minutes")
+    while True:
+        try:
+            now = datetime.utcnow()
+            for inst_id, capacity in installations:
+                gateway.add(generate_realistic_data(inst_id, capacity), now)
+            gateway.poll()
+            time.sleep(sample_seconds)
+        except KeyboardInterrupt:
+            gateway.flush()
+            print(f"\n🛑 Gateway stopped: {gateway.stats['samples']} samples, "
+                  f"{gateway.stats['uploaded_summaries']} summaries uploaded, "
+                  f"{len(gateway.spool.batches())} batches still spooled")
+            break
+
 def main():
     installations = [
         ('INST_001', 5.0),   # Mumbai Residential
@@ -67,6 +93,10 @@ def main():
         ('INST_005', 200.0)  # Jaipur Solar Farm
     ]
     
+    if '--gateway' in sys.argv:
+        run_gateway()
+        return
+    
     print("🚀 Starting Solar Data Simulator...")
     print("📊 Sending data every 10 seconds")
     print("🌞 Simulating realistic solar conditions")